@@ -1,17 +1,43 @@
 # api/main.py
-from fastapi import FastAPI, HTTPException
+# Run from the project root: uvicorn api.main:app
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import Optional
-import sys, os
-from hashlib import sha256
-
-# Add project root to path to import src
-sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/..")
-from src.logic import ProfileService, TransactionService, BudgetService
+from typing import Optional, List
+from src.async_logic import (
+    AsyncProfileService, AsyncTransactionService, AsyncBudgetService, AsyncRecurringService,
+    insert_queue,
+    drain_budget_checks,
+    user_currency
+)
+from src.services import parse_sort, transaction_filters
+from src.storage import async_backend
+from src.passwords import shutdown as shutdown_password_pool
+from src.importer import read_upload_lines
+from src.cache import cache
+from src.ledger import ledgers
+from src.export import EXPORT_FORMATS, EXPORT_PAGE_ROWS, encoder_for, aexport_chunks
+from src.metrics import MetricsMiddleware, registry
+from src.responses import FastJSONResponse, CompressionMiddleware, conditional, dumps
+from src.sessions import issue_token, verify_token, SESSION_TTL_SECONDS
 
 # ------------------- App Setup -------------------
-app = FastAPI(title="Expense Tracker API", version="1.0")
+# Nothing is opened at startup: database clients, connection pools and worker
+# threads are created on first use, so a new worker serves as soon as it is
+# imported. On shutdown, queued writes and budget checks finish before the
+# pools close.
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await insert_queue.drain()   # write queued inserts before the client goes away
+    await drain_budget_checks()
+    await async_backend().close_client()
+    shutdown_password_pool()
+
+app = FastAPI(title="Expense Tracker API", version="1.0", default_response_class=FastJSONResponse,
+              lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,11 +46,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip/brotli for larger bodies (inside the metrics middleware, so it records bytes sent)
+app.add_middleware(CompressionMiddleware)
+# Per-route latency and payload sizes for /metrics
+app.add_middleware(MetricsMiddleware)
 
 # ------------------- Service Instances -------------------
-profile_service = ProfileService()
-transaction_service = TransactionService()
-budget_service = BudgetService()
+profile_service = AsyncProfileService()
+transaction_service = AsyncTransactionService()
+budget_service = AsyncBudgetService()
+recurring_service = AsyncRecurringService()
+
+# ------------------- Session Dependency -------------------
+# Caller's user id from "Authorization: Bearer <token>": a signature check, no database lookup
+async def current_user(authorization: Optional[str] = Header(None)):
+    scheme, _, token = (authorization or "").partition(" ")
+    user_id = verify_token(token) if scheme.lower() == "bearer" else None
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired session",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return user_id
+
+# The caller's own profile id: a session for another user gets 403
+async def own_profile(profile_id: int, user_id: int = Depends(current_user)):
+    if profile_id != user_id:
+        raise HTTPException(status_code=403, detail="Not your profile")
+    return profile_id
 
 # ------------------- Data Models -------------------
 class ProfileCreate(BaseModel):
@@ -39,13 +86,17 @@ class ProfileLogin(BaseModel):
 class ProfileUpdate(BaseModel):
     username: str
 
+class CurrencyUpdate(BaseModel):
+    currency: str
+
 class TransactionCreate(BaseModel):
-    user_id: int
+    user_id: Optional[int] = None
     category: str
     type_: str
     date: str
     amount: float
     description: Optional[str] = None
+    currency: Optional[str] = None   # ISO 4217 code; omitted means the user's base currency
 
 class TransactionUpdate(BaseModel):
     category: Optional[str] = None
@@ -53,101 +104,294 @@ class TransactionUpdate(BaseModel):
     date: Optional[str] = None
     amount: Optional[float] = None
     description: Optional[str] = None
+    currency: Optional[str] = None
+
+# frequency: "daily", "weekly" or "monthly", repeating every `every` of those
+class RecurringCreate(BaseModel):
+    category: str
+    type_: str
+    amount: float
+    description: Optional[str] = None
+    frequency: str
+    every: int = 1
+    start_date: str
+    end_date: Optional[str] = None
+
+class RecurringUpdate(BaseModel):
+    category: Optional[str] = None
+    type_: Optional[str] = None
+    amount: Optional[float] = None
+    description: Optional[str] = None
+    end_date: Optional[str] = None
 
 class BudgetCreate(BaseModel):
-    user_id: int
+    user_id: Optional[int] = None
     budget: float
 
 class BudgetUpdate(BaseModel):
     budget: float
 
+# One operation of a batch: op is "create", "update" or "delete"; id is required
+# for update/delete, and only the fields that are set are written
+class TransactionOperation(BaseModel):
+    op: str
+    id: Optional[int] = None
+    category: Optional[str] = None
+    type_: Optional[str] = None
+    date: Optional[str] = None
+    amount: Optional[float] = None
+    description: Optional[str] = None
+    currency: Optional[str] = None
+
+class TransactionBatch(BaseModel):
+    operations: List[TransactionOperation]
+
+class BudgetOperation(BaseModel):
+    op: str
+    id: Optional[int] = None
+    budget: Optional[float] = None
+
+class BudgetBatch(BaseModel):
+    operations: List[BudgetOperation]
+
 # ------------------- Authentication Endpoints -------------------
 @app.post("/register")
-def register(profile: ProfileCreate):
+async def register(profile: ProfileCreate):
     if not profile.username or not profile.email or not profile.password:
         return {"Success": False, "Message": "All fields are required"}
-
-    # Hash password before storing
-    hashed_pw = sha256(profile.password.encode()).hexdigest()
-    try:
-        result = profile_service.add_profile_with_credentials(profile.username, profile.email, hashed_pw)
-        return result
-    except Exception as e:
-        return {"Success": False, "Message": f"Error: {str(e)}"}
+    # hashed with bcrypt on the auth worker pool; duplicates are rejected by the insert
+    return await profile_service.add_profile(profile.username, profile.email, profile.password)
 
 @app.post("/login")
-def login(profile: ProfileLogin):
+async def login(profile: ProfileLogin):
     if not profile.username or not profile.password:
         return {"Success": False, "Message": "Username and password required"}
-
-    hashed_pw = sha256(profile.password.encode()).hexdigest()
-    try:
-        user = profile_service.login(profile.username, hashed_pw)
-        if user:
-            return {"Success": True, "Data": user}
-        else:
-            return {"Success": False, "Message": "Invalid credentials or user not registered"}
-    except Exception as e:
-        return {"Success": False, "Message": f"Error: {str(e)}"}
+    result = await profile_service.login(profile.username, profile.password)
+    if result.get("Success"):
+        # send as "Authorization: Bearer <Token>" on every other request
+        result["Token"] = issue_token(result["Data"]["id"])
+        result["ExpiresIn"] = SESSION_TTL_SECONDS
+    return result
 
 # ------------------- Profile Endpoints -------------------
 @app.post("/profiles")
-def add_profile(profile: ProfileCreate):
-    return profile_service.add_profile(profile.username)
+async def add_profile(profile: ProfileCreate):
+    return await profile_service.add_profile(profile.username)
 
+# Only the caller's own profile is listed
 @app.get("/profiles")
-def get_profiles():
-    return profile_service.list_profiles()
+async def get_profiles(user_id: int = Depends(current_user)):
+    result = await profile_service.get_profile(user_id)
+    if result.get("Success"):
+        result["Data"] = [result["Data"]]
+    return result
 
 @app.get("/profiles/{profile_id}")
-def get_profile(profile_id: int):
-    return profile_service.get_profile(profile_id)
+async def get_profile(profile_id: int = Depends(own_profile)):
+    return await profile_service.get_profile(profile_id)
 
 @app.put("/profiles/{profile_id}")
-def update_profile(profile_id: int, profile: ProfileUpdate):
-    return profile_service.update_profile(profile_id, profile.username)
+async def update_profile(profile: ProfileUpdate, profile_id: int = Depends(own_profile)):
+    return await profile_service.update_profile(profile_id, profile.username)
 
 @app.delete("/profiles/{profile_id}")
-def delete_profile(profile_id: int):
-    return profile_service.delete_profile(profile_id)
+async def delete_profile(profile_id: int = Depends(own_profile)):
+    return await profile_service.delete_profile(profile_id)
+
+# ------------------- Currency Endpoints -------------------
+# The caller's base currency and the currencies amounts can be entered in
+@app.get("/currency")
+async def get_currency(user_id: int = Depends(current_user)):
+    return await profile_service.get_currencies(user_id)
+
+# Summaries, budgets and exports are reported in the base currency
+@app.put("/currency")
+async def set_currency(body: CurrencyUpdate, user_id: int = Depends(current_user)):
+    return await profile_service.set_base_currency(user_id, body.currency)
 
 # ------------------- Transaction Endpoints -------------------
+# The owner always comes from the session token; any user_id in the body is ignored
 @app.post("/transactions")
-def add_transaction(transaction: TransactionCreate):
-    return transaction_service.add_transaction(
-        transaction.user_id,
+async def add_transaction(transaction: TransactionCreate, user_id: int = Depends(current_user)):
+    return await transaction_service.add_transaction(
+        user_id,
         transaction.category,
         transaction.type_,
         transaction.date,
         transaction.amount,
         transaction.description,
+        transaction.currency,
+    )
+
+# Bulk CSV import: columns date, category, type, amount[, description, currency]
+@app.post("/transactions/import")
+async def import_transactions(file: UploadFile = File(...), batch_size: int = 500,
+                              user_id: int = Depends(current_user)):
+    return await transaction_service.import_transactions(
+        user_id,
+        read_upload_lines(file),
+        lambda payload: TransactionCreate(**payload),
+        batch_size,
     )
 
-@app.get("/transactions/{user_id}")
-def get_transactions(user_id: int):
-    return transaction_service.list_transactions(user_id)
+# Filters and sort are applied in the database; repeat `category` to match several.
+# Per-user reads below answer If-None-Match with 304 while the user's data is unchanged.
+@app.get("/transactions")
+async def get_transactions(request: Request, cursor: Optional[str] = None, limit: Optional[int] = None,
+                           start_date: Optional[str] = None, end_date: Optional[str] = None,
+                           category: Optional[List[str]] = Query(None),
+                           type_: Optional[str] = Query(None, alias="type"),
+                           min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+                           q: Optional[str] = None, sort: Optional[str] = None,
+                           user_id: int = Depends(current_user)):
+    return await conditional(request, user_id, lambda: transaction_service.list_transactions(
+        user_id, cursor, limit, sort, start_date=start_date, end_date=end_date, categories=category,
+        type_=type_, min_amount=min_amount, max_amount=max_amount, search=q,
+    ))
+
+# NDJSON stream of every matching transaction, read page by page so memory stays flat
+@app.get("/transactions/stream")
+async def stream_transactions(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                              category: Optional[List[str]] = Query(None),
+                              type_: Optional[str] = Query(None, alias="type"),
+                              min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+                              q: Optional[str] = None, sort: Optional[str] = None,
+                              user_id: int = Depends(current_user)):
+    try:
+        column, descending = parse_sort(sort)
+        filters = transaction_filters(start_date, end_date, category, type_, min_amount, max_amount, q)
+    except ValueError as e:
+        return {"Success": False, "Message": str(e)}
+
+    async def rows():
+        async for row in transaction_service.iter_with_recurring(user_id, sort=column, descending=descending,
+                                                                 **filters):
+            yield dumps(row) + b"\n"
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+# Download of every matching transaction as CSV, NDJSON or Parquet, encoded and
+# sent chunk by chunk while the pages are read
+@app.get("/transactions/export")
+async def export_transactions(format: str = "csv", start_date: Optional[str] = None, end_date: Optional[str] = None,
+                              category: Optional[List[str]] = Query(None),
+                              type_: Optional[str] = Query(None, alias="type"),
+                              min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+                              q: Optional[str] = None, sort: Optional[str] = None,
+                              user_id: int = Depends(current_user)):
+    try:
+        column, descending = parse_sort(sort)
+        filters = transaction_filters(start_date, end_date, category, type_, min_amount, max_amount, q)
+        encoder = encoder_for(format)
+    except ValueError as e:
+        return {"Success": False, "Message": str(e)}
+
+    currency = await user_currency(user_id)
+    rows = transaction_service.iter_with_recurring(user_id, EXPORT_PAGE_ROWS, column, descending, **filters)
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(aexport_chunks(rows, encoder, currency=currency), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="transactions.{extension}"'})
+
+# Creates/updates/deletes in a handful of statements; one result per operation
+@app.post("/transactions/batch")
+async def batch_transactions(batch: TransactionBatch, user_id: int = Depends(current_user)):
+    operations = [op.dict(exclude_unset=True) for op in batch.operations]
+    return await transaction_service.apply_batch(user_id, operations)
 
 @app.put("/transactions/{transaction_id}")
-def update_transaction(transaction_id: int, transaction: TransactionUpdate):
-    return transaction_service.update_transaction(transaction_id, transaction.dict(exclude_unset=True))
+async def update_transaction(transaction_id: int, transaction: TransactionUpdate,
+                             user_id: int = Depends(current_user)):
+    return await transaction_service.update_transaction(transaction_id, transaction.dict(exclude_unset=True), user_id)
 
 @app.delete("/transactions/{transaction_id}")
-def delete_transaction(transaction_id: int):
-    return transaction_service.delete_transaction(transaction_id)
+async def delete_transaction(transaction_id: int, user_id: int = Depends(current_user)):
+    return await transaction_service.delete_transaction(transaction_id, user_id)
+
+# ------------------- Recurring Transaction Endpoints -------------------
+# Due occurrences show up in listings, summaries and exports with negative ids;
+# PUT/DELETE /transactions/{id} on one of them stores (or skips) that occurrence
+@app.post("/recurring")
+async def add_recurring(rule: RecurringCreate, user_id: int = Depends(current_user)):
+    return await recurring_service.add_rule(user_id, **rule.dict())
+
+@app.get("/recurring")
+async def list_recurring(request: Request, user_id: int = Depends(current_user)):
+    return await conditional(request, user_id, lambda: recurring_service.list_rules(user_id))
+
+@app.put("/recurring/{rule_id}")
+async def update_recurring(rule_id: int, rule: RecurringUpdate, user_id: int = Depends(current_user)):
+    return await recurring_service.update_rule(rule_id, user_id, **rule.dict(exclude_unset=True))
+
+@app.delete("/recurring/{rule_id}")
+async def delete_recurring(rule_id: int, user_id: int = Depends(current_user)):
+    return await recurring_service.delete_rule(rule_id, user_id)
+
+# ------------------- Summary Endpoints -------------------
+@app.get("/summary")
+async def get_summary(request: Request, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                      granularity: str = "month", user_id: int = Depends(current_user)):
+    return await conditional(request, user_id,
+                             lambda: transaction_service.get_summary(user_id, start_date, end_date, granularity))
+
+# Running balance, top categories and per-period flows from the in-memory ledger
+@app.get("/analytics")
+async def get_analytics(request: Request, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                        granularity: str = "month", top: int = 5, user_id: int = Depends(current_user)):
+    return await conditional(request, user_id,
+                             lambda: transaction_service.get_analytics(user_id, start_date, end_date, granularity, top))
+
+# Precomputed spending anomalies (python -m src.anomalies); refresh=true recomputes now
+@app.get("/anomalies")
+async def get_anomalies(refresh: bool = False, user_id: int = Depends(current_user)):
+    return await transaction_service.get_anomalies(user_id, refresh)
 
 # ------------------- Budget Endpoints -------------------
 @app.post("/budgets")
-def add_budget(budget: BudgetCreate):
-    return budget_service.set_budget(budget.user_id, budget.budget)
+async def add_budget(budget: BudgetCreate, user_id: int = Depends(current_user)):
+    return await budget_service.set_budget(user_id, budget.budget)
 
-@app.get("/budgets/{user_id}")
-def get_budget(user_id: int):
-    return budget_service.get_budget(user_id)
+@app.get("/budgets")
+async def get_budget(request: Request, user_id: int = Depends(current_user)):
+    return await conditional(request, user_id, lambda: budget_service.get_budget(user_id))
+
+@app.get("/budgets/alerts")
+async def get_budget_alerts(user_id: int = Depends(current_user)):
+    return await budget_service.get_alerts(user_id)
 
 @app.put("/budgets/{budget_id}")
-def update_budget(budget_id: int, budget: BudgetUpdate):
-    return budget_service.update_budget(budget_id, budget.budget)
+async def update_budget(budget_id: int, budget: BudgetUpdate, user_id: int = Depends(current_user)):
+    return await budget_service.update_budget(budget_id, budget.budget, user_id)
+
+@app.post("/budgets/batch")
+async def batch_budgets(batch: BudgetBatch, user_id: int = Depends(current_user)):
+    operations = [op.dict(exclude_unset=True) for op in batch.operations]
+    return await budget_service.apply_batch(user_id, operations)
 
 @app.delete("/budgets/{budget_id}")
-def delete_budget(budget_id: int):
-    return budget_service.delete_budget(budget_id)
+async def delete_budget(budget_id: int, user_id: int = Depends(current_user)):
+    return await budget_service.delete_budget(budget_id, user_id)
+
+# ------------------- Cache Endpoints -------------------
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"Success": True, "Data": cache.stats()}
+
+# ------------------- Metrics Endpoint -------------------
+def cache_gauges():
+    return [(f"cache_{name}", (), value) for name, value in cache.stats().items()]
+
+registry.register_collector(cache_gauges)
+
+def ledger_gauges():
+    return [(f"ledger_{name}", (), value) for name, value in ledgers.stats().items()]
+
+registry.register_collector(ledger_gauges)
+
+def write_queue_gauges():
+    return [(f"write_queue_{name}", (), value) for name, value in insert_queue.stats().items()]
+
+registry.register_collector(write_queue_gauges)
+
+# Prometheus text exposition of request, db and error metrics
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
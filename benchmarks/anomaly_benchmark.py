@@ -0,0 +1,155 @@
+# benchmarks/anomaly_benchmark.py
+# Spending-anomaly detection (src/anomalies.py) over N users with M expenses
+# each (default 10k x 100 = 1M transactions) spread over the last 12 months,
+# with a known set of injected spikes. Reports:
+#   batched detect    detect() on in-memory arrays, ANOMALY_BATCH_ROWS rows at a time
+#   full job          run_job(): SQLite keyset scan + detection + persisting flags
+#   per-user numpy    detect() called once per user (the on-demand path), sampled
+#   per-user python   the outlier rule in plain Python per user, sampled
+# plus the precision and recall of the outlier flags against the injected spikes,
+# and the recall over the spikes that can be judged at all (those preceded by
+# ANOMALY_MIN_HISTORY expenses in their user's category).
+#
+#   python -m benchmarks.anomaly_benchmark
+#   python -m benchmarks.anomaly_benchmark --users 1000 --transactions-per-user 50 --sample 100
+import argparse
+import math
+import os
+import statistics
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+
+CATEGORIES = np.array(["Food", "Transport", "Entertainment", "Utilities", "Shopping", "Health", "Travel"])
+SPIKE_RATE = 0.002   # share of expenses multiplied by SPIKE_FACTOR
+SPIKE_FACTOR = 8.0
+
+def generate(users, per_user, today, seed=7):
+    rng = np.random.default_rng(seed)
+    n = users * per_user
+    user_ids = np.repeat(np.arange(1, users + 1, dtype=np.int64), per_user)
+    categories = rng.integers(0, len(CATEGORIES), n).astype(np.int32)
+    last = np.datetime64(today.isoformat(), "D").astype(np.int64)
+    days = (last - rng.integers(0, 365, n)).astype(np.int32)
+    # each user/category has its own typical amount; rows vary around it
+    typical = rng.lognormal(3.0, 0.8, (users + 1, len(CATEGORIES)))
+    amounts = np.round(typical[user_ids, categories] * rng.lognormal(0.0, 0.25, n), 2)
+    spikes = rng.random(n) < SPIKE_RATE
+    amounts[spikes] = np.round(amounts[spikes] * SPIKE_FACTOR, 2)
+    ids = np.arange(1, n + 1, dtype=np.int64)
+    return user_ids, ids, days, categories, amounts, set(ids[spikes].tolist())
+
+def seed_sqlite(user_ids, ids, days, categories, amounts):
+    from src.sqlite_db import get_connection
+    conn = get_connection()
+    dates = days.astype("datetime64[D]").astype(str)
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO profiles (id, username) VALUES (?, ?)",
+                     ((u, f"user{u}") for u in np.unique(user_ids).tolist()))
+    conn.executemany("INSERT INTO transactions (id, user_id, category, type, date, amount) VALUES (?, ?, ?, ?, ?, ?)",
+                     zip(ids.tolist(), user_ids.tolist(), CATEGORIES[categories].tolist(), ["Expense"] * len(ids),
+                         dates.tolist(), amounts.tolist()))
+    conn.execute("COMMIT")
+
+# Plain-Python equivalent of the outlier rule, one user's rows at a time
+def python_outliers(rows, window, min_history, z, first_day):
+    from src.anomalies import MAD_SCALE, OUTLIER_MIN_SPREAD, OUTLIER_MIN_RATIO
+    history, flagged = {}, []
+    for row_id, day, category, amount in sorted(rows, key=lambda r: (r[2], r[1], r[0])):
+        past = history.setdefault(category, [])
+        value = math.log1p(max(amount, 0.0))
+        if len(past) >= min_history and day >= first_day:
+            recent = past[-window:]
+            median = statistics.median(recent)
+            mad = statistics.median(abs(v - median) for v in recent)
+            score = (value - median) / max(MAD_SCALE * mad, OUTLIER_MIN_SPREAD)
+            if score > z and amount >= OUTLIER_MIN_RATIO * math.expm1(median):
+                flagged.append(row_id)
+        past.append(value)
+    return flagged
+
+# Spikes preceded by at least min_history expenses in their user's category
+def judged_spikes(user_ids, ids, days, categories, spikes, min_history):
+    order = np.lexsort((ids, days, categories, user_ids))
+    users, codes = user_ids[order], categories[order]
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (users[1:] != users[:-1]) | (codes[1:] != codes[:-1])
+    position = np.arange(len(order)) - np.maximum.accumulate(np.where(new_group, np.arange(len(order)), 0))
+    return spikes & set(ids[order][position >= min_history].tolist())
+
+def quality(flags, spikes):
+    found = {f["transaction_id"] for f in flags if f["kind"] == "outlier"}
+    hits = len(found & spikes)
+    return hits / len(found) if found else 0.0, hits / len(spikes) if spikes else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched spending-anomaly detection")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--transactions-per-user", type=int, default=100)
+    parser.add_argument("--batch-rows", type=int, default=200000)
+    parser.add_argument("--sample", type=int, default=200, help="users timed one at a time for the baselines")
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["CACHE_ENABLED"] = "0"
+    os.environ["SQLITE_PATH"] = os.path.join(workdir.name, "anomalies_bench.db")
+    from src import anomalies
+    from src.anomalies import AnomalyStore, detect, run_job, _lookback_month
+    from src.storage import sync_backend
+
+    today = date.today()
+    user_ids, ids, days, categories, amounts, spikes = generate(args.users, args.transactions_per_user, today)
+    names = CATEGORIES
+    n = len(ids)
+    per_user = args.transactions_per_user
+    step = max(1, args.batch_rows // per_user) * per_user   # whole users per batch
+
+    start = time.perf_counter()
+    flags = []
+    for lo in range(0, n, step):
+        part = slice(lo, lo + step)
+        flags += detect(user_ids[part], ids[part], days[part], categories[part], amounts[part], names, today)
+    batched = time.perf_counter() - start
+    precision, recall = quality(flags, spikes)
+    judged = judged_spikes(user_ids, ids, days, categories, spikes, anomalies.ANOMALY_MIN_HISTORY)
+    judged_recall = quality(flags, judged)[1]
+
+    seed_sqlite(user_ids, ids, days, categories, amounts)
+    store = AnomalyStore(os.path.join(workdir.name, "flags.db"))
+    stats = run_job(sync_backend(), store, batch_rows=args.batch_rows, today=today)
+
+    sample = min(args.sample, args.users)
+    rows = sample * per_user
+    start = time.perf_counter()
+    for lo in range(0, rows, per_user):
+        part = slice(lo, lo + per_user)
+        detect(user_ids[part], ids[part], days[part], categories[part], amounts[part], names, today)
+    numpy_loop = (time.perf_counter() - start) / sample * args.users
+
+    first_day = int(np.datetime64(_lookback_month(today), "M").astype("datetime64[D]").astype(np.int64))
+    start = time.perf_counter()
+    for lo in range(0, rows, per_user):
+        part = slice(lo, lo + per_user)
+        python_outliers(list(zip(ids[part].tolist(), days[part].tolist(), categories[part].tolist(),
+                                 amounts[part].tolist())),
+                        anomalies.ANOMALY_WINDOW, anomalies.ANOMALY_MIN_HISTORY, anomalies.ANOMALY_Z, first_day)
+    python_loop = (time.perf_counter() - start) / sample * args.users
+
+    print(f"{args.users} users, {n} transactions, {len(spikes)} injected spikes")
+    print(f"{'path':<32}{'seconds':>10}{'rows/s':>12}{'flags':>8}")
+    print(f"{'batched detect':<32}{batched:>10.2f}{n / batched:>12.0f}{len(flags):>8}")
+    print(f"{'full job (sqlite scan + store)':<32}{stats['seconds']:>10.2f}{n / stats['seconds']:>12.0f}"
+          f"{stats['flags']:>8}")
+    print(f"{f'per-user numpy (x{sample}, scaled)':<32}{numpy_loop:>10.2f}{n / numpy_loop:>12.0f}{'-':>8}")
+    print(f"{f'per-user python (x{sample}, scaled)':<32}{python_loop:>10.2f}{n / python_loop:>12.0f}{'-':>8}")
+    shifts = sum(f["kind"] == "category_shift" for f in flags)
+    print(f"outliers {len(flags) - shifts} (precision {precision:.3f}, recall {recall:.3f}, "
+          f"{judged_recall:.3f} of the {len(judged)} judged spikes), category shifts {shifts}")
+    store.close()
+    workdir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# benchmarks/api_benchmark.py
+# End-to-end API benchmark: the FastAPI app is driven in-process (httpx
+# ASGITransport) against the local PostgREST stand-in, seeded with N users x M
+# transactions. Each scenario reports throughput and latency percentiles; the
+# results are written as JSON and can be compared with an earlier run.
+#
+#   python -m benchmarks.api_benchmark --users 200 --transactions-per-user 100 --latency-ms 5
+#   python -m benchmarks.api_benchmark --output after.json --compare before.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import bcrypt
+
+from benchmarks.postgrest_stub import PostgrestStub, FAKE_KEY
+from benchmarks.async_load_test import percentile
+
+PASSWORD = "secret-password"
+CATEGORIES = ["Food", "Travel", "Bills", "Rent", "Shopping", "Health", "Salary"]
+SCENARIOS = ["login", "add_transaction", "list_transactions", "budget_read", "dashboard"]
+# metrics where a larger value is worse
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms")
+
+# ------------------- Data generator -------------------
+def generate_dataset(users, transactions_per_user, seed=42, rounds=4):
+    rng = random.Random(seed)
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=rounds)).decode()
+    profiles, transactions, budgets = [], [], []
+    for user_id in range(1, users + 1):
+        profiles.append({"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@example.com",
+                         "password": hashed})
+        budgets.append({"id": user_id, "user_id": user_id, "budget": rng.choice([500, 1000, 2500, 5000])})
+        for _ in range(transactions_per_user):
+            income = rng.random() < 0.15
+            transactions.append({
+                "user_id": user_id,
+                "category": "Salary" if income else rng.choice(CATEGORIES[:-1]),
+                "type": "Income" if income else "Expense",
+                "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "amount": round(rng.uniform(1, 3000 if income else 300), 2),
+                "description": None,
+            })
+    return profiles, transactions, budgets
+
+def seed_stub(stub, profiles, transactions, budgets):
+    stub.seed("profiles", profiles)
+    stub.seed("budget", budgets)
+    stub.seed("transactions", transactions)   # the rollup trigger fills transaction_rollups
+
+def seed_sqlite(profiles, transactions, budgets):
+    from src.sqlite_db import get_connection
+    conn = get_connection()
+    conn.execute("BEGIN")
+    for table, rows in (("profiles", profiles), ("budget", budgets), ("transactions", transactions)):
+        columns = list(rows[0])
+        conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                         [tuple(row[c] for c in columns) for row in rows])
+    conn.execute("COMMIT")
+
+# ------------------- Scenarios -------------------
+def check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.request.url.path}: HTTP {response.status_code}")
+    body = response.json()
+    if isinstance(body, dict) and body.get("Success") is False:
+        raise RuntimeError(f"{response.request.url.path}: {body.get('Message')}")
+    return body
+
+def scenario_requests(client, tokens, rng):
+    def auth(user_id):
+        return {"Authorization": f"Bearer {tokens[user_id]}"}
+
+    async def login(user_id):
+        check(await client.post("/login", json={"username": f"user{user_id}", "password": PASSWORD}))
+
+    async def add_transaction(user_id):
+        check(await client.post("/transactions", headers=auth(user_id), json={
+            "category": rng.choice(CATEGORIES[:-1]), "type_": "Expense",
+            "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "amount": round(rng.uniform(1, 300), 2),
+        }))
+
+    async def list_transactions(user_id):
+        check(await client.get("/transactions", headers=auth(user_id), params={"limit": 100}))
+
+    async def budget_read(user_id):
+        check(await client.get("/budgets", headers=auth(user_id)))
+
+    # what the Streamlit dashboard loads: the summary for the year and the budget
+    async def dashboard(user_id):
+        summary, budget = await asyncio.gather(
+            client.get("/summary", headers=auth(user_id),
+                       params={"start_date": "2024-01-01", "end_date": "2024-12-31", "granularity": "month"}),
+            client.get("/budgets", headers=auth(user_id)),
+        )
+        check(summary)
+        check(budget)
+
+    return {
+        "login": login,
+        "add_transaction": add_transaction,
+        "list_transactions": list_transactions,
+        "budget_read": budget_read,
+        "dashboard": dashboard,
+    }
+
+async def drive(request, user_ids, concurrency):
+    queue = list(user_ids)
+    latencies, errors = [], []
+
+    async def worker():
+        while queue:
+            user_id = queue.pop()
+            start = time.perf_counter()
+            try:
+                await request(user_id)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(str(e))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+def summarize(name, latencies, errors, elapsed):
+    result = {"scenario": name, "requests": len(latencies), "errors": len(errors),
+              "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0}
+    if latencies:
+        result.update({
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        })
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+async def run(scenarios, users, requests, concurrency, seed):
+    import httpx
+    from api.main import app
+    from src.storage import async_backend
+    from src.sessions import issue_token
+
+    rng = random.Random(seed)
+    tokens = {user_id: issue_token(user_id) for user_id in range(1, users + 1)}
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            handlers = scenario_requests(client, tokens, rng)
+            for name in scenarios:
+                count = requests.get(name, requests["default"])
+                user_ids = [rng.randint(1, users) for _ in range(count)]
+                await handlers[name](user_ids[0])   # warm up connections before timing
+                results.append(summarize(name, *await drive(handlers[name], user_ids, concurrency)))
+    finally:
+        await async_backend().close_client()
+    return results
+
+# ------------------- Results -------------------
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline, current, tolerance):
+    before = {r["scenario"]: r for r in baseline["scenarios"]}
+    workload = ("backend", "users", "transactions_per_user", "requests", "concurrency", "latency_ms", "rounds")
+    old_args, new_args = baseline["meta"]["args"], current["meta"]["args"]
+    changed = [k for k in workload if old_args.get(k) != new_args.get(k)]
+    if changed:
+        print(f"\nnote: workload differs from the baseline ({', '.join(changed)})")
+    regressions = []
+    print(f"\n{'scenario':<20}{'metric':>8}{'before':>10}{'after':>10}{'change':>9}")
+    for result in current["scenarios"]:
+        old = before.get(result["scenario"])
+        if not old:
+            continue
+        for metric in ("rps",) + LOWER_IS_BETTER:
+            if metric not in old or metric not in result or not old[metric]:
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+            flag = "  REGRESSION" if worse else ""
+            print(f"{result['scenario']:<20}{metric:>8}{old[metric]:>10}{result[metric]:>10}{change:>+9.1%}{flag}")
+            if worse:
+                regressions.append((result["scenario"], metric))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end API benchmark against a local Supabase stand-in")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--transactions-per-user", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=200, help="logins are bcrypt-bound, so fewer")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--backend", choices=["supabase", "sqlite"], default="supabase",
+                        help="supabase = the app against the PostgREST stand-in, sqlite = embedded backend")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="injected per-query latency (stand-in only)")
+    parser.add_argument("--rounds", type=int, default=4, help="bcrypt cost factor of the seeded users")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=54324)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["STORAGE_BACKEND"] = args.backend
+    stub = None
+    workdir = tempfile.TemporaryDirectory()
+    if args.backend == "sqlite":
+        os.environ["SQLITE_PATH"] = os.path.join(workdir.name, "bench.db")
+    else:
+        stub = PostgrestStub(latency_ms=args.latency_ms)
+        os.environ["SUPABASE_URL"] = stub.start(port=args.port)
+        os.environ["SUPABASE_KEY"] = FAKE_KEY
+    try:
+        start = time.perf_counter()
+        dataset = generate_dataset(args.users, args.transactions_per_user, args.seed, args.rounds)
+        if stub:
+            seed_stub(stub, *dataset)
+        else:
+            seed_sqlite(*dataset)
+        print(f"seeded {args.users} users x {args.transactions_per_user} transactions "
+              f"in {time.perf_counter() - start:.1f}s")
+        requests = {"default": args.requests, "login": args.login_requests}
+        results = asyncio.run(run(scenarios, args.users, requests, args.concurrency, args.seed))
+    finally:
+        if stub:
+            stub.stop()
+        workdir.cleanup()
+
+    print(f"{'scenario':<20}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}")
+    for r in results:
+        print(f"{r['scenario']:<20}{r['requests']:>9}{r['errors']:>8}{r.get('p50_ms', '-'):>9}"
+              f"{r.get('p95_ms', '-'):>9}{r.get('p99_ms', '-'):>9}{r['rps']:>9}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "scenarios": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
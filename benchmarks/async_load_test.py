@@ -0,0 +1,118 @@
+# benchmarks/async_load_test.py
+# Compares the sync data layer (def endpoints -> threadpool) against the async
+# data layer (async def endpoints -> pooled httpx) on p50/p99 latency and req/s,
+# both talking to the local PostgREST stand-in. The read cache is off: both
+# runs read the same users, so with it on the second run would only measure
+# cache hits.
+#
+#   python -m benchmarks.async_load_test --requests 2000 --concurrency 200 --latency-ms 20
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.postgrest_stub import PostgrestStub, FAKE_KEY
+
+# Starlette runs plain `def` endpoints on an anyio threadpool of this size
+STARLETTE_THREADPOOL = 40
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def report(name, latencies, elapsed):
+    return {
+        "path": name,
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "rps": round(len(latencies) / elapsed, 1),
+    }
+
+async def drive(handler, user_ids, concurrency):
+    # `concurrency` simulated clients issue requests back to back
+    queue = list(user_ids)
+    latencies = []
+
+    async def client():
+        while queue:
+            user_id = queue.pop()
+            start = time.perf_counter()
+            result = await handler(user_id)
+            latencies.append(time.perf_counter() - start)
+            if not result.get("Success"):
+                raise RuntimeError(result.get("Message"))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+async def run_sync(user_ids, concurrency):
+    from src.logic import TransactionService
+    service = TransactionService()
+    pool = ThreadPoolExecutor(max_workers=STARLETTE_THREADPOOL)
+    loop = asyncio.get_running_loop()
+
+    async def handler(user_id):
+        return await loop.run_in_executor(pool, service.list_transactions, user_id)
+
+    try:
+        return await drive(handler, user_ids, concurrency)
+    finally:
+        pool.shutdown()
+
+async def run_async(user_ids, concurrency):
+    from src.async_logic import AsyncTransactionService
+    from src.async_db import close_client
+    service = AsyncTransactionService()
+    try:
+        await service.list_transactions(user_ids[0])  # open the pool before timing
+        return await drive(service.list_transactions, user_ids, concurrency)
+    finally:
+        await close_client()
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async data layer load test")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--transactions-per-user", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="injected per-query latency")
+    parser.add_argument("--port", type=int, default=54321)
+    args = parser.parse_args()
+
+    stub = PostgrestStub(latency_ms=args.latency_ms)
+    for user_id in range(1, args.users + 1):
+        stub.seed("transactions", [{
+            "user_id": user_id,
+            "category": random.choice(["Food", "Travel", "Bills", "Salary"]),
+            "type": random.choice(["Expense", "Income"]),
+            "date": f"2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+            "amount": round(random.uniform(1, 500), 2),
+            "description": None,
+        } for _ in range(args.transactions_per_user)])
+
+    os.environ["SUPABASE_URL"] = stub.start(port=args.port)
+    os.environ["SUPABASE_KEY"] = FAKE_KEY
+    os.environ["CACHE_ENABLED"] = "0"
+    user_ids = [random.randint(1, args.users) for _ in range(args.requests)]
+
+    try:
+        results = [
+            report("sync (threadpool)", *asyncio.run(run_sync(user_ids, args.concurrency))),
+            report("async (pooled)", *asyncio.run(run_async(user_ids, args.concurrency))),
+        ]
+    finally:
+        stub.stop()
+
+    print(f"{'path':<20}{'requests':>10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'req/s':>10}")
+    for r in results:
+        print(f"{r['path']:<20}{r['requests']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['mean_ms']:>10}{r['rps']:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/budget_monitor_benchmark.py
+# One budget-monitoring pass (src/budget_monitor.py) over N users, each with a
+# budget and M expenses this month, against re-checking users one at a time
+# with evaluate_user (measured on a sample and extrapolated). Reports users/s,
+# pages, alerts and whether the pass finished within its time budget. Runs on
+# SQLite or the local PostgREST stand-in.
+#
+#   python -m benchmarks.budget_monitor_benchmark --users 100000 --time-budget 60
+#   python -m benchmarks.budget_monitor_benchmark --backend supabase --users 20000 --latency-ms 5
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.api_benchmark import generate_dataset, seed_sqlite, seed_stub
+from benchmarks.postgrest_stub import PostgrestStub, FAKE_KEY
+
+def bench(args, month):
+    from src.storage import sync_backend
+    from src.budget_monitor import AlertOutbox, run_pass, evaluate_user
+    db = sync_backend()
+
+    outbox = AlertOutbox(":memory:")
+    stats = run_pass(db, outbox, time_budget=args.time_budget, page_size=args.page_size, month=month)
+    rate = stats["users"] / stats["seconds"] if stats["seconds"] else float("inf")
+
+    sample = min(args.sample, args.users)
+    per_user = AlertOutbox(":memory:")
+    start = time.perf_counter()
+    for user_id in range(1, sample + 1):
+        evaluate_user(db, user_id, per_user, month)
+    per_user_seconds = (time.perf_counter() - start) / sample * args.users
+
+    print(f"{'path':<30}{'users':>9}{'seconds':>10}{'users/s':>11}{'pages':>7}{'alerts':>8}")
+    print(f"{'batched pass':<30}{stats['users']:>9}{stats['seconds']:>10.2f}{rate:>11.0f}{stats['pages']:>7}"
+          f"{stats['alerts']:>8}")
+    print(f"{f'per-user (x{sample}, scaled)':<30}{args.users:>9}{per_user_seconds:>10.2f}"
+          f"{args.users / per_user_seconds:>11.0f}{'-':>7}{'-':>8}")
+    print(f"pass complete within {args.time_budget:g} s budget: {stats['complete']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Budget monitoring pass over many users")
+    parser.add_argument("--backend", choices=("sqlite", "supabase"), default="sqlite")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--transactions-per-user", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--time-budget", type=float, default=60.0)
+    parser.add_argument("--sample", type=int, default=1000, help="users re-checked one at a time for the baseline")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated PostgREST round trip")
+    args = parser.parse_args()
+
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["CACHE_ENABLED"] = "0"
+    workdir = tempfile.TemporaryDirectory()
+    profiles, transactions, budgets = generate_dataset(args.users, args.transactions_per_user)
+    # move every expense into one month so budgets are actually under pressure
+    month = "2024-06"
+    for txn in transactions:
+        txn["date"] = month + txn["date"][7:]
+    stub = None
+    if args.backend == "sqlite":
+        os.environ["SQLITE_PATH"] = os.path.join(workdir.name, "budget_monitor.db")
+        seed_sqlite(profiles, transactions, budgets)
+    else:
+        stub = PostgrestStub(latency_ms=args.latency_ms)
+        os.environ["SUPABASE_URL"] = stub.start(port=54331)
+        os.environ["SUPABASE_KEY"] = FAKE_KEY
+        seed_stub(stub, profiles, transactions, budgets)
+    del profiles, transactions, budgets
+    bench(args, month)
+    if stub is not None:
+        stub.stop()
+    workdir.cleanup()
+
+if __name__ == "__main__":
+    main()
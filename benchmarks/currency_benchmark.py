@@ -0,0 +1,119 @@
+# benchmarks/currency_benchmark.py
+# Currency conversion cost for N mixed-currency transactions against a daily
+# rate table (src/currency.py): a per-row Python lookup (dict of currency ->
+# dates, bisect for the rate in force) against the vectorized RateTable, on
+# prepared arrays and from row dicts, plus a converted ledger summary and
+# loading the rate file. Also checks that both paths agree.
+#
+#   python -m benchmarks.currency_benchmark --rows 1000000 --currencies 30
+import argparse
+import bisect
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from src.currency import currency_code, load_rates
+from src.ledger import Ledger
+
+START = date(2020, 1, 1)
+
+def currency_names(count):
+    return ["USD"] + [f"X{chr(65 + i // 26)}{chr(65 + i % 26)}" for i in range(1, count)]
+
+# One rate per currency per day, as a random walk
+def write_rates(path, names, days, seed=7):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        f.write("date,currency,rate\n")
+        for name in names[1:]:
+            rate = rng.uniform(0.01, 5.0)
+            for day in range(days):
+                rate *= 1 + rng.gauss(0, 0.005)
+                f.write(f"{(START + timedelta(days=day)).isoformat()},{name},{rate:.6f}\n")
+
+def generate_rows(count, names, days, seed=7):
+    rng = random.Random(seed)
+    return [{
+        "id": i + 1,
+        "user_id": 1,
+        "category": "Food",
+        "type": "Income" if rng.random() < 0.1 else "Expense",
+        "date": (START + timedelta(days=rng.randrange(days))).isoformat(),
+        "amount": round(rng.uniform(1, 500), 2),
+        "currency": rng.choice(names),
+    } for i in range(count)]
+
+# Per-row conversion as it would be written without the rate table
+def python_convert(rows, path, target):
+    rates = {}
+    with open(path) as f:
+        next(f)
+        for line in f:
+            day, name, rate = line.rstrip().split(",")
+            dates, values = rates.setdefault(name, ([], []))
+            dates.append(day)
+            values.append(float(rate))
+
+    def rate_on(name, day):
+        if name == "USD":
+            return 1.0
+        dates, values = rates[name]
+        return values[max(bisect.bisect_right(dates, day) - 1, 0)]
+
+    return [r["amount"] * rate_on(r["currency"], r["date"]) / rate_on(target, r["date"]) for r in rows]
+
+# Converted ledger summary including the conversion it caches on the ledger
+def cold_summary(ledger, currency, table):
+    ledger._converted = None
+    return ledger.in_currency(currency, table).summary()
+
+def timeit(fn, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized rate table vs per-row currency conversion")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--currencies", type=int, default=30)
+    parser.add_argument("--days", type=int, default=5 * 365, help="days of daily rates per currency")
+    parser.add_argument("--target", default="XAB", help="currency to convert into")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    path = os.path.join(workdir.name, "fx_rates.csv")
+    names = currency_names(args.currencies)
+    write_rates(path, names, args.days)
+    rows = generate_rows(args.rows, names, args.days)
+    amounts = np.array([r["amount"] for r in rows])
+    codes = np.array([currency_code(r["currency"]) for r in rows], np.int64)
+    days = np.array([r["date"] for r in rows], dtype="datetime64[D]").astype(np.int64)
+
+    load_seconds, table = timeit(lambda: load_rates(path, "USD"), args.repeat)
+    ledger = Ledger.from_rows(rows)
+    results = [
+        ("python per-row lookup", timeit(lambda: python_convert(rows, path, args.target), 1)),
+        ("rate table, row dicts", timeit(lambda: table.convert_rows(rows, args.target), args.repeat)),
+        ("rate table, arrays", timeit(lambda: table.convert(amounts, codes, days, args.target), args.repeat)),
+        ("ledger convert + summary", timeit(lambda: cold_summary(ledger, args.target, table), args.repeat)),
+    ]
+    expected = np.array(results[0][1][1])
+    print(f"{args.rows} rows, {args.currencies} currencies, {len(table.rates)} rates "
+          f"(loaded in {load_seconds * 1e3:.1f} ms)")
+    print(f"{'path':<28}{'ms':>11}{'rows/s':>14}")
+    for name, (seconds, _) in results:
+        print(f"{name:<28}{seconds * 1e3:>11.1f}{args.rows / seconds:>14,.0f}")
+    for name, (_, converted) in results[1:3]:
+        print(f"max abs difference, {name}: {np.abs(np.asarray(converted) - expected).max():.2e}")
+    workdir.cleanup()
+
+if __name__ == "__main__":
+    main()
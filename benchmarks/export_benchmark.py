@@ -0,0 +1,89 @@
+# benchmarks/export_benchmark.py
+# Export throughput on the embedded SQLite backend: one user with N
+# transactions exported through the same path as GET /transactions/export
+# (paged reads + chunked encoding) for each format, against building the whole
+# CSV from a single get_transactions list. Reports MB/s, rows/s and, with
+# --memory, the peak Python memory of each run (tracemalloc, slower).
+#
+#   python -m benchmarks.export_benchmark --rows 100000 --memory
+import argparse
+import asyncio
+import csv
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.api_benchmark import generate_dataset, seed_sqlite
+
+FORMATS = ("csv", "ndjson", "parquet")
+
+async def in_memory_csv(db, user_id):
+    rows = (await db.get_transactions(user_id)).data
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["id", "date", "category", "type", "amount", "description"])
+    writer.writerows([r["id"], r["date"], r["category"], r["type"], r["amount"], r["description"]] for r in rows)
+    return len(buffer.getvalue().encode())
+
+async def streamed(service, user_id, fmt, chunk_rows):
+    from src.export import EXPORT_PAGE_ROWS, encoder_for, aexport_chunks
+    size = 0
+    rows = service.iter_transactions(user_id, EXPORT_PAGE_ROWS)
+    async for chunk in aexport_chunks(rows, encoder_for(fmt), chunk_rows):
+        size += len(chunk)
+    return size
+
+async def measure(run, memory):
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    size = await run()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return size, elapsed, peak
+
+async def bench(rows, chunk_rows, memory):
+    from src.storage import async_backend
+    from src.async_logic import AsyncTransactionService
+    from src.export import encoder_for, export_chunks
+    # load pyarrow (and the modules it imports lazily) outside the measured runs
+    list(export_chunks(iter([{"id": 0, "date": "2024-01-01"}]), encoder_for("parquet")))
+    db = async_backend()
+    service = AsyncTransactionService()
+    runs = [("csv (one list, in memory)", lambda: in_memory_csv(db, 1))]
+    runs += [(f"{fmt} (streamed)", lambda fmt=fmt: streamed(service, 1, fmt, chunk_rows)) for fmt in FORMATS]
+
+    print(f"{'export':<28}{'MB':>9}{'seconds':>10}{'MB/s':>9}{'rows/s':>11}{'peak MB':>10}")
+    for name, run in runs:
+        size, elapsed, peak = await measure(run, memory)
+        peak_text = f"{peak / 1e6:>10.1f}" if peak is not None else f"{'-':>10}"
+        print(f"{name:<28}{size / 1e6:>9.2f}{elapsed:>10.2f}{size / 1e6 / elapsed:>9.2f}"
+              f"{rows / elapsed:>11.0f}{peak_text}")
+    await db.close_client()
+
+def main():
+    parser = argparse.ArgumentParser(description="Transaction export throughput")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--chunk-rows", type=int, default=5000, help="rows per encoded chunk / Parquet row group")
+    parser.add_argument("--memory", action="store_true", help="also report peak Python memory (slower)")
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = os.path.join(workdir.name, "export.db")
+    os.environ["CACHE_ENABLED"] = "0"
+    profiles, transactions, budgets = generate_dataset(1, args.rows)
+    for i, txn in enumerate(transactions):
+        txn["description"] = f"card payment {i}"
+    seed_sqlite(profiles, transactions, budgets)
+    del profiles, transactions, budgets
+    asyncio.run(bench(args.rows, args.chunk_rows, args.memory))
+    workdir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/import_benchmark.py
+# Rows/second of the CSV import pipeline by batch size, against the local
+# PostgREST stand-in.
+#
+#   python -m benchmarks.import_benchmark --rows 100000 --batch-sizes 1,100,500,2000
+import argparse
+import asyncio
+import io
+import os
+import random
+import time
+
+from benchmarks.postgrest_stub import PostgrestStub, FAKE_KEY
+
+class MemoryUpload:
+    def __init__(self, data):
+        self.buffer = io.BytesIO(data)
+
+    async def read(self, size=-1):
+        return self.buffer.read(size)
+
+def make_csv(rows):
+    out = io.StringIO()
+    out.write("date,category,type,amount,description\n")
+    for i in range(rows):
+        out.write(f"2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d},"
+                  f"{random.choice(['Food', 'Travel', 'Bills', 'Salary'])},"
+                  f"{random.choice(['Expense', 'Income'])},"
+                  f"{random.uniform(1, 500):.2f},\"row {i}\"\n")
+    return out.getvalue().encode()
+
+async def run(data, batch_size):
+    from src.async_logic import AsyncTransactionService
+    from src.async_db import close_client
+    from src.importer import read_upload_lines
+    from api.main import TransactionCreate
+
+    service = AsyncTransactionService()
+    try:
+        start = time.perf_counter()
+        result = await service.import_transactions(
+            1, read_upload_lines(MemoryUpload(data)), lambda payload: TransactionCreate(**payload), batch_size
+        )
+        return result, time.perf_counter() - start
+    finally:
+        await close_client()
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV import throughput by batch size")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch-sizes", default="1,100,500,2000")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="injected per-query latency")
+    parser.add_argument("--port", type=int, default=54322)
+    args = parser.parse_args()
+
+    stub = PostgrestStub(latency_ms=args.latency_ms)
+    os.environ["SUPABASE_URL"] = stub.start(port=args.port)
+    os.environ["SUPABASE_KEY"] = FAKE_KEY
+    data = make_csv(args.rows)
+
+    print(f"{'batch size':>10}{'rows':>10}{'failed':>10}{'seconds':>10}{'rows/s':>12}")
+    try:
+        for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+            stub.tables.clear()
+            # user 1 owns every imported row; rows without a currency get its base currency
+            stub.seed("profiles", [{"id": 1, "username": "bench", "email": "bench@example.com",
+                                    "base_currency": "USD"}])
+            result, elapsed = asyncio.run(run(data, batch_size))
+            if not result["Success"]:
+                raise RuntimeError(result["Message"])
+            imported = result["Data"]["imported"]
+            print(f"{batch_size:>10}{imported:>10}{result['Data']['failed']:>10}"
+                  f"{elapsed:>10.2f}{imported / elapsed:>12.0f}")
+    finally:
+        stub.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/ledger_benchmark.py
+# Dashboard aggregation cost: the original pandas path (JSON payload ->
+# DataFrame -> to_datetime -> groupby category / month) against the columnar
+# ledger in src/ledger.py. The ledger is built once per user and then kept
+# current, so its build cost and its per-query cost are reported separately,
+# along with the cost of applying one new transaction.
+#
+#   python -m benchmarks.ledger_benchmark --rows 10000,100000,1000000
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+
+from src.ledger import Ledger
+from src.services import summarize_transactions
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+CATEGORIES = ["Food", "Rent", "Travel", "Utilities", "Fun", "Health", "Shopping", "Salary", None]
+
+def generate_rows(count, seed=7):
+    rng = random.Random(seed)
+    start = date(2020, 1, 1)
+    return [{
+        "id": i + 1,
+        "user_id": 1,
+        "category": rng.choice(CATEGORIES),
+        "type": "Income" if rng.random() < 0.1 else "Expense",
+        "date": (start + timedelta(days=rng.randrange(1500))).isoformat(),
+        "amount": round(rng.uniform(1, 500), 2),
+        "description": "generated",
+    } for i in range(count)]
+
+# The dashboard as originally written against the /transactions JSON
+def pandas_dashboard(payload):
+    df = pd.DataFrame(json.loads(payload))
+    df["date"] = pd.to_datetime(df["date"])
+    expenses = df[df["type"] == "Expense"].copy()
+    by_category = expenses.groupby("category")["amount"].sum()
+    expenses["month"] = expenses["date"].dt.to_period("M")
+    by_month = expenses.groupby("month")["amount"].sum()
+    return by_category, by_month
+
+# Running balance including the prefix-sum build it caches on the ledger
+def cold_balance(ledger):
+    ledger._balance = None
+    return ledger.running_balance()
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar ledger vs pandas dashboard aggregation")
+    parser.add_argument("--rows", default="10000,100000,1000000", help="comma separated dataset sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9}  {'operation':<34}{'ms':>11}")
+    for count in (int(n) for n in args.rows.split(",")):
+        rows = generate_rows(count)
+        ledger = Ledger.from_rows(rows)
+        month_start, month_end = "2022-03-10", "2022-06-20"
+        new_row = {**rows[0], "id": count + 1, "date": "2021-05-05"}
+        results = []
+        if pd is not None:
+            payload = json.dumps(rows)
+            results.append(("pandas from JSON (dashboard)", timeit(lambda: pandas_dashboard(payload), args.repeat)))
+        results += [
+            ("numpy summarize_transactions", timeit(lambda: summarize_transactions(rows), args.repeat)),
+            ("ledger build (once per user)", timeit(lambda: Ledger.from_rows(rows), args.repeat)),
+            ("ledger summary (all rows)", timeit(lambda: ledger.summary(), args.repeat)),
+            ("ledger summary (date range)", timeit(lambda: ledger.summary(month_start, month_end), args.repeat)),
+            ("ledger top 5 categories", timeit(lambda: ledger.by_category(top=5), args.repeat)),
+            ("ledger running balance (cold)", timeit(lambda: cold_balance(ledger), args.repeat)),
+            ("ledger apply one insert", timeit(lambda: ledger.with_rows([new_row]), args.repeat)),
+        ]
+        for name, seconds in results:
+            print(f"{count:>9}  {name:<34}{seconds * 1e3:>11.2f}")
+        if pd is None:
+            print(f"{count:>9}  pandas not installed, baseline skipped")
+
+if __name__ == "__main__":
+    main()
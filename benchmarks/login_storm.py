@@ -0,0 +1,100 @@
+# benchmarks/login_storm.py
+# Login storm against the local PostgREST stand-in: login latency/throughput and
+# event-loop lag (how long other requests would be stalled) with bcrypt run
+# inline on the loop vs on the bounded auth worker pool.
+#
+#   python -m benchmarks.login_storm --users 50 --logins 500 --concurrency 100 --rounds 12
+import argparse
+import asyncio
+import os
+import time
+
+import bcrypt
+
+from benchmarks.postgrest_stub import PostgrestStub, FAKE_KEY
+from benchmarks.async_load_test import percentile
+
+HEARTBEAT_INTERVAL = 0.01
+
+async def heartbeat(lags, stop):
+    # a cheap request that should run every 10ms; the overshoot is loop lag
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        lags.append(time.perf_counter() - start - HEARTBEAT_INTERVAL)
+
+async def storm(login, users, total, concurrency):
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    pending = [users[i % len(users)] for i in range(total)]
+
+    async def client():
+        while pending:
+            username = pending.pop()
+            start = time.perf_counter()
+            result = await login(username, "secret-password")
+            latencies.append(time.perf_counter() - start)
+            if not result.get("Success"):
+                raise RuntimeError(result.get("Message"))
+
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+    return latencies, lags, elapsed
+
+async def run(users, total, concurrency):
+    from src.async_logic import AsyncProfileService
+    from src.async_db import close_client, get_profile_by_login
+    service = AsyncProfileService()
+
+    # what the old handler did: bcrypt on the event loop
+    async def inline_login(username, password):
+        user = (await get_profile_by_login(username)).data[0]
+        ok = bcrypt.checkpw(password.encode(), user["password"].encode())
+        return {"Success": ok}
+
+    try:
+        for username in users:
+            result = await service.add_profile(username, f"{username}@example.com", "secret-password")
+            if not result["Success"]:
+                raise RuntimeError(result["Message"])
+        return [
+            ("inline bcrypt", *await storm(inline_login, users, total, concurrency)),
+            ("worker pool", *await storm(service.login, users, total, concurrency)),
+        ]
+    finally:
+        await close_client()
+
+def main():
+    parser = argparse.ArgumentParser(description="Login storm benchmark")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="injected per-query latency")
+    parser.add_argument("--port", type=int, default=54323)
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    stub = PostgrestStub(latency_ms=args.latency_ms)
+    os.environ["SUPABASE_URL"] = stub.start(port=args.port)
+    os.environ["SUPABASE_KEY"] = FAKE_KEY
+    users = [f"user{i}" for i in range(args.users)]
+
+    try:
+        results = asyncio.run(run(users, args.logins, args.concurrency))
+    finally:
+        stub.stop()
+
+    print(f"{'mode':<16}{'logins':>8}{'p50 ms':>10}{'p99 ms':>10}{'logins/s':>10}{'loop lag p99 ms':>17}{'max ms':>9}")
+    for mode, latencies, lags, elapsed in results:
+        print(f"{mode:<16}{len(latencies):>8}"
+              f"{percentile(latencies, 50) * 1000:>10.1f}{percentile(latencies, 99) * 1000:>10.1f}"
+              f"{len(latencies) / elapsed:>10.1f}"
+              f"{percentile(lags, 99) * 1000:>17.1f}{max(lags) * 1000:>9.1f}")
+
+if __name__ == "__main__":
+    main()
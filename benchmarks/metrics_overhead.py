@@ -0,0 +1,76 @@
+# benchmarks/metrics_overhead.py
+# Cost of the instrumentation in src/metrics.py: a no-op db function and a
+# minimal ASGI app timed bare vs instrumented, plus the raw counter/histogram
+# operations. Overhead is reported per call.
+#
+#   python -m benchmarks.metrics_overhead --calls 200000
+import argparse
+import asyncio
+import time
+
+from src.metrics import Registry, timed, MetricsMiddleware
+
+class Result:
+    data = [{"id": 1}]
+
+RESULT = Result()
+
+def query():
+    return RESULT
+
+async def aquery():
+    return RESULT
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+async def aper_call(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        await fn()
+    return (time.perf_counter() - start) / calls
+
+async def asgi_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-length", b"2")]})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+async def asgi_per_call(app, calls):
+    scope = {"type": "http", "method": "GET", "path": "/bench", "headers": [(b"content-length", b"0")]}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / calls
+
+def main():
+    parser = argparse.ArgumentParser(description="Metrics instrumentation overhead")
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+    calls = args.calls
+
+    registry = Registry()
+    labels = (("function", "query"),)
+    rows = [
+        ("sync db call", per_call(query, calls), per_call(timed(query), calls)),
+        ("async db call", asyncio.run(aper_call(aquery, calls)), asyncio.run(aper_call(timed(aquery), calls))),
+        ("asgi request", asyncio.run(asgi_per_call(asgi_app, calls)),
+         asyncio.run(asgi_per_call(MetricsMiddleware(asgi_app), calls))),
+        ("counter inc", 0.0, per_call(lambda: registry.inc("c", labels), calls)),
+        ("histogram observe", 0.0, per_call(lambda: registry.observe("h", labels, 0.003), calls)),
+    ]
+
+    print(f"{'operation':<20}{'bare ns':>10}{'timed ns':>10}{'overhead ns':>13}")
+    for name, bare, instrumented in rows:
+        print(f"{name:<20}{bare * 1e9:>10.0f}{instrumented * 1e9:>10.0f}{(instrumented - bare) * 1e9:>13.0f}")
+
+if __name__ == "__main__":
+    main()
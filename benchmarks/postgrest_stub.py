@@ -0,0 +1,323 @@
+# benchmarks/postgrest_stub.py
+# Local PostgREST-compatible stand-in for load testing. Serves /rest/v1/{table}
+# from in-memory lists so the real supabase clients (sync and async) can be
+# pointed at it with SUPABASE_URL=http://127.0.0.1:<port>.
+import asyncio
+import json
+import re
+import threading
+import time
+from datetime import datetime
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+FAKE_KEY = "bench.bench.bench"
+
+# ------------------- Filters -------------------
+def _coerce(current, raw):
+    if isinstance(current, bool):
+        return raw == "true"
+    if isinstance(current, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+def _unquote(raw):
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        return raw[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    return raw
+
+# SQL LIKE pattern (% or * any run, _ any char, backslash escapes) -> regex
+def _like_regex(pattern):
+    out, chars = [], iter(pattern)
+    for ch in chars:
+        if ch == "\\":
+            out.append(re.escape(next(chars, "\\")))
+        elif ch in "%*":
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        else:
+            out.append(re.escape(ch))
+    return "".join(out)
+
+def _match(row, column, expr):
+    op, _, raw = expr.partition(".")
+    raw = _unquote(raw)
+    current = row.get(column)
+    if op == "is":
+        return current is None if raw == "null" else str(current).lower() == raw
+    if current is None:
+        return False
+    if op == "in":
+        values = [v.strip().strip('"') for v in raw.strip("()").split(",")]
+        return any(current == _coerce(current, v) or str(current) == v for v in values)
+    if op in ("like", "ilike"):
+        flags = re.IGNORECASE | re.DOTALL if op == "ilike" else re.DOTALL
+        return re.fullmatch(_like_regex(raw), str(current), flags) is not None
+    value = _coerce(current, raw)
+    if isinstance(current, (int, float)) and isinstance(value, float):
+        current = float(current)
+    else:
+        current, value = str(current), str(value)
+    return {
+        "eq": current == value,
+        "neq": current != value,
+        "gt": current > value,
+        "gte": current >= value,
+        "lt": current < value,
+        "lte": current <= value,
+    }.get(op, False)
+
+def _split_top(body):
+    parts, depth, current, quoted, escaped = [], 0, "", False, False
+    for ch in body:
+        if escaped:
+            escaped = False
+        elif ch == "\\" and quoted:
+            escaped = True
+        elif ch == '"':
+            quoted = not quoted
+        elif ch == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+            continue
+        elif not quoted:
+            depth += ch == "("
+            depth -= ch == ")"
+        current += ch
+    return parts + [current] if current else parts
+
+# or=(a.eq.1,and(b.gt.2,c.lt.3)) style logical trees
+def _match_logic(row, op, body):
+    results = []
+    for cond in _split_top(body.strip()[1:-1]):
+        if cond.startswith(("and(", "or(")):
+            name, _, rest = cond.partition("(")
+            results.append(_match_logic(row, name, "(" + rest))
+        else:
+            column, _, expr = cond.partition(".")
+            results.append(_match(row, column, expr))
+    return all(results) if op == "and" else any(results)
+
+def _filter(rows, params):
+    for column, expr in params.multi_items():
+        if column in ("select", "order", "limit", "offset", "columns", "on_conflict"):
+            continue
+        if column in ("or", "and"):
+            rows = [r for r in rows if _match_logic(r, column, expr)]
+        else:
+            rows = [r for r in rows if _match(r, column, expr)]
+    return rows
+
+def _order(rows, params):
+    order = params.get("order")
+    if not order:
+        return rows
+    for part in reversed(order.split(",")):
+        column, *mods = part.split(".")
+        desc = "desc" in mods
+        rows = sorted(rows, key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+    return rows
+
+# ------------------- Stub Server -------------------
+class PostgrestStub:
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000.0
+        self.tables = {}
+        self.next_id = {}
+        self.by_user = {}   # table -> user_id -> rows, so user_id=eq.N lookups skip the full scan
+        # UNIQUE columns from the README schema
+        self.unique = {"profiles": ["username", "email"]}
+        # Python stand-ins for the SQL functions and triggers documented in README.md
+        self.functions = {
+            "budget_status_page": self._budget_status_page,
+        }
+        self.triggers = {"transactions": self._transactions_rollup_trigger}  # table -> fn(removed, added)
+        self.app = Starlette(routes=[
+            Route("/rest/v1/rpc/{fn}", self.handle_rpc, methods=["GET", "POST"]),
+            Route("/rest/v1/{table}", self.handle, methods=["GET", "POST", "PATCH", "DELETE"]),
+        ])
+        self._server = None
+        self._thread = None
+
+    def seed(self, table, rows):
+        added = [self._insert_row(table, dict(row)) for row in rows]
+        self._fire(table, (), added)
+
+    def _fire(self, table, removed, added):
+        trigger = self.triggers.get(table)
+        if trigger is not None:
+            trigger(removed, added)
+
+    def _insert_row(self, table, row):
+        store = self.tables.setdefault(table, [])
+        if row.get("id") is None:
+            self.next_id[table] = self.next_id.get(table, 0) + 1
+            row["id"] = self.next_id[table]
+        else:
+            self.next_id[table] = max(self.next_id.get(table, 0), row["id"])
+        row.setdefault("created_at", datetime.utcnow().isoformat())
+        store.append(row)
+        if row.get("user_id") is not None:
+            self.by_user.setdefault(table, {}).setdefault(row["user_id"], []).append(row)
+        return row
+
+    def _reindex(self, table):
+        index = self.by_user[table] = {}
+        for row in self.tables.get(table, []):
+            if row.get("user_id") is not None:
+                index.setdefault(row["user_id"], []).append(row)
+
+    def _candidates(self, table, store, params):
+        raw = params.get("user_id", "")
+        if raw.startswith("eq."):
+            try:
+                return self.by_user.get(table, {}).get(int(raw[3:]), [])
+            except ValueError:
+                pass
+        return store
+
+    def _find_duplicate(self, table, rows):
+        for column in self.unique.get(table, []):
+            seen = {r.get(column) for r in self.tables.get(table, []) if r.get(column) is not None}
+            for row in rows:
+                value = row.get(column)
+                if value is not None and value in seen:
+                    return column
+                seen.add(value)
+        return None
+
+    def _upsert_row(self, table, row, columns):
+        for existing in self.tables.setdefault(table, []):
+            if all(existing.get(c) == row.get(c) for c in columns):
+                existing.update(row)
+                return existing
+        return self._insert_row(table, row)
+
+    async def handle(self, request: Request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        table = request.path_params["table"]
+        params = request.query_params
+        store = self.tables.setdefault(table, [])
+
+        if request.method == "POST":
+            body = json.loads(await request.body() or b"[]")
+            rows = body if isinstance(body, list) else [body]
+            conflict = params.get("on_conflict")
+            if conflict:
+                data = [self._upsert_row(table, dict(r), conflict.split(",")) for r in rows]
+            else:
+                duplicate = self._find_duplicate(table, rows)
+                if duplicate:
+                    message = f"duplicate key value violates unique constraint on {duplicate}"
+                    return Response(json.dumps({"message": message, "code": "23505", "details": None, "hint": None}),
+                                    status_code=409, media_type="application/json")
+                data = [self._insert_row(table, dict(r)) for r in rows]
+                self._fire(table, (), data)
+            return self._respond(request, data, status=201)
+
+        matched = _filter(self._candidates(table, store, params), params)
+        if request.method == "PATCH":
+            updates = json.loads(await request.body() or b"{}")
+            before = [dict(row) for row in matched]
+            for row in matched:
+                row.update(updates)
+            self._fire(table, before, matched)
+            return self._respond(request, matched)
+        if request.method == "DELETE":
+            ids = {id(r) for r in matched}
+            self.tables[table] = [r for r in store if id(r) not in ids]
+            if matched:
+                self._reindex(table)
+            self._fire(table, matched, ())
+            return self._respond(request, matched)
+
+        data = _order(matched, params)
+        offset = int(params.get("offset", 0))
+        if "limit" in params:
+            data = data[offset:offset + int(params["limit"])]
+        elif offset:
+            data = data[offset:]
+        return self._respond(request, data)
+
+    async def handle_rpc(self, request: Request):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        fn = self.functions.get(request.path_params["fn"])
+        if fn is None:
+            return Response(json.dumps({"message": "function not found", "code": "PGRST202"}),
+                            status_code=404, media_type="application/json")
+        params = json.loads(await request.body() or b"{}") if request.method == "POST" else dict(request.query_params)
+        return self._respond(request, fn(**params))
+
+    # transactions_rollups trigger: removed rows leave their buckets, added rows join theirs
+    def _transactions_rollup_trigger(self, removed, added):
+        store = self.tables.setdefault("transaction_rollups", [])
+        by_user = self.by_user.setdefault("transaction_rollups", {})
+        touched = []
+        for sign, changed in ((-1, removed), (1, added)):
+            for t in changed:
+                rows = by_user.setdefault(t["user_id"], [])
+                key = (str(t["date"])[:7], t.get("category") or "", t.get("type") or "", t.get("currency") or "")
+                row = next((r for r in rows if (r["month"], r["category"], r["type"], r["currency"]) == key), None)
+                if row is None:
+                    row = {"user_id": t["user_id"], "month": key[0], "category": key[1], "type": key[2],
+                           "currency": key[3], "total": 0.0, "count": 0}
+                    store.append(row)
+                    rows.append(row)
+                row["total"] += sign * (t.get("amount") or 0.0)
+                row["count"] += sign
+                touched.append(row)
+        if any(r["count"] <= 0 for r in touched):
+            self.tables["transaction_rollups"] = [r for r in store if r["count"] > 0]
+            self._reindex("transaction_rollups")
+        return None
+
+    def _budget_status_page(self, p_month, p_after_user_id, p_limit, p_base_currency):
+        budgets = self.by_user.get("budget", {})
+        rollups = self.by_user.get("transaction_rollups", {})
+        profiles = {p["id"]: p for p in self.tables.get("profiles", [])}
+        users = sorted(u for u, rows in budgets.items() if rows and u > p_after_user_id)[:p_limit]
+        page = []
+        for user_id in users:
+            first = min(budgets[user_id], key=lambda r: r.get("created_at") or "")
+            expenses = [r for r in rollups.get(user_id, [])
+                        if r["month"] == p_month and (r["type"] or "").lower() == "expense"]
+            base = profiles.get(user_id, {}).get("base_currency") or p_base_currency
+            page.append({"user_id": user_id, "budget": first["budget"],
+                         "spent": sum(r["total"] for r in expenses if r["currency"] in ("", base)),
+                         "currency_rows": sum(r["count"] for r in expenses if r["currency"] not in ("", base)),
+                         "base_currency": base})
+        return page
+
+    def _respond(self, request, data, status=200):
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            if len(data) != 1:
+                return Response(json.dumps({"message": "JSON object requested, multiple (or no) rows returned",
+                                            "code": "PGRST116", "details": None, "hint": None}),
+                                status_code=406, media_type="application/json")
+            data = data[0]
+        return Response(json.dumps(data), status_code=status, media_type="application/json")
+
+    # Run uvicorn in a background thread and wait until it accepts requests
+    def start(self, host="127.0.0.1", port=54321):
+        config = uvicorn.Config(self.app, host=host, port=port, log_level="warning", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server:
+            self._server.should_exit = True
+            self._thread.join()
@@ -0,0 +1,83 @@
+# benchmarks/response_benchmark.py
+# Cost of answering the dashboard's repeated reads, on SQLite through the ASGI
+# app in-process (no network):
+#   - encoding one transaction page: FastAPI's default path (jsonable_encoder +
+#     json.dumps) against FastJSONResponse (src/responses.py)
+#   - bytes on the wire per encoding (identity, gzip, br when installed)
+#   - a refresh loop over /transactions, /summary and /budgets with and without
+#     If-None-Match: requests/s and bytes per request
+#
+#   python -m benchmarks.response_benchmark --transactions 5000 --page 200 --refreshes 200
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.api_benchmark import generate_dataset, seed_sqlite, PASSWORD
+
+def per_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+async def bench(args):
+    import httpx
+    from fastapi.encoders import jsonable_encoder
+    from api.main import app
+    from src.responses import dumps, brotli
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        login = await client.post("/login", json={"username": "user1", "password": PASSWORD})
+        auth = {"Authorization": f"Bearer {login.json()['Token']}"}
+        page = {"limit": args.page}
+
+        body = (await client.get("/transactions", params=page, headers=auth)).json()
+        stdlib = per_call(lambda: json.dumps(jsonable_encoder(body)).encode(), args.repeat)
+        fast = per_call(lambda: dumps(body), args.repeat)
+        print(f"encode one page of {args.page} rows: default {stdlib * 1e3:.3f} ms, "
+              f"fast {fast * 1e3:.3f} ms ({stdlib / fast:.1f}x)")
+
+        print(f"{'encoding':<10}{'bytes':>10}")
+        for encoding in ("identity", "gzip") + (("br",) if brotli is not None else ()):
+            r = await client.get("/transactions", params=page, headers={**auth, "Accept-Encoding": encoding})
+            print(f"{encoding:<10}{int(r.headers.get('content-length', len(r.content))):>10}")
+
+        paths = (("/transactions", page), ("/summary", {}), ("/budgets", {}))
+        print(f"{'refresh loop':<24}{'req/s':>10}{'bytes/req':>11}{'304s':>7}")
+        for label, revalidate in (("full responses", False), ("If-None-Match", True)):
+            tags, sent, not_modified = {}, 0, 0
+            start = time.perf_counter()
+            for _ in range(args.refreshes):
+                for path, params in paths:
+                    headers = {**auth, "Accept-Encoding": "gzip"}
+                    if revalidate and path in tags:
+                        headers["If-None-Match"] = tags[path]
+                    r = await client.get(path, params=params, headers=headers)
+                    tags[path] = r.headers.get("etag", "")
+                    sent += int(r.headers.get("content-length", 0))
+                    not_modified += r.status_code == 304
+            seconds = time.perf_counter() - start
+            calls = args.refreshes * len(paths)
+            print(f"{label:<24}{calls / seconds:>10.0f}{sent / calls:>11.0f}{not_modified:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON encoding, compression and conditional reads")
+    parser.add_argument("--transactions", type=int, default=5000, help="transactions of the measured user")
+    parser.add_argument("--page", type=int, default=200)
+    parser.add_argument("--refreshes", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200, help="encodings timed per path")
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = os.path.join(workdir.name, "responses.db")
+    os.environ["BUDGET_ALERTS_PATH"] = os.path.join(workdir.name, "alerts.db")
+    seed_sqlite(*generate_dataset(1, args.transactions))
+    asyncio.run(bench(args))
+    workdir.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/startup_benchmark.py
+# Process startup cost, each sample in a fresh interpreter:
+#   - import time of the data layers, the services, the API app and the
+#     frontend client, plus plotly.express (which the frontend now defers to
+#     the dashboard)
+#   - cold start of a uvicorn worker: time until it answers a request that
+#     touches no data, then until its first database-backed request (which
+#     creates the client/connection lazily)
+# On the supabase backend the worker talks to the local PostgREST stand-in.
+#
+#   python -m benchmarks.startup_benchmark --runs 5
+#   python -m benchmarks.startup_benchmark --backend supabase --runs 5
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.postgrest_stub import PostgrestStub, FAKE_KEY
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = (
+    ("src.db", "src.db"),
+    ("src.async_db", "src.async_db"),
+    ("src.logic", "src.logic"),
+    ("src.async_logic", "src.async_logic"),
+    ("api.main", "api.main"),
+    ("frontend api_client", "api_client"),
+    ("plotly.express", "plotly.express"),
+)
+
+def import_seconds(module, env):
+    code = (f"import sys, time; sys.path.insert(0, {os.path.join(ROOT, 'frontend')!r}); "
+            f"start = time.perf_counter(); import {module}; print(time.perf_counter() - start)")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_for(url, deadline, **kwargs):
+    while time.perf_counter() < deadline:
+        try:
+            response = httpx.get(url, timeout=1.0, **kwargs)
+            if response.status_code == 200:
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} did not answer in time")
+
+# (seconds until /cache/stats answers, seconds until /profiles answers for `token`)
+def cold_start(env, token):
+    port = free_port()
+    start = time.perf_counter()
+    worker = subprocess.Popen([sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port),
+                               "--log-level", "warning"], cwd=ROOT, env=env)
+    try:
+        deadline = start + 60
+        ready = wait_for(f"http://127.0.0.1:{port}/cache/stats", deadline)
+        first_read = wait_for(f"http://127.0.0.1:{port}/profiles", deadline,
+                              headers={"Authorization": f"Bearer {token}"})
+        return ready - start, first_read - start
+    finally:
+        worker.terminate()
+        worker.wait()
+
+def describe(samples):
+    return f"{statistics.median(samples) * 1000:>10.1f}{min(samples) * 1000:>10.1f}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and worker cold start")
+    parser.add_argument("--backend", choices=("sqlite", "supabase"), default="sqlite")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    env = {**os.environ, "STORAGE_BACKEND": args.backend, "PYTHONPATH": ROOT,
+           "SQLITE_PATH": os.path.join(workdir.name, "startup.db"),
+           "BUDGET_ALERTS_PATH": os.path.join(workdir.name, "alerts.db"),
+           "ANOMALY_FLAGS_PATH": os.path.join(workdir.name, "anomalies.db"),
+           "SESSION_SECRET": "startup-benchmark"}
+    os.environ["SESSION_SECRET"] = env["SESSION_SECRET"]
+    from src.sessions import issue_token   # signs with the workers' secret
+    token = issue_token(1)
+    stub = None
+    if args.backend == "supabase":
+        stub = PostgrestStub()
+        env["SUPABASE_URL"] = stub.start(port=free_port())
+        env["SUPABASE_KEY"] = FAKE_KEY
+
+    print(f"{'import (ms)':<24}{'median':>10}{'min':>10}")
+    for label, module in MODULES:
+        print(f"{label:<24}{describe([import_seconds(module, env) for _ in range(args.runs)])}")
+
+    runs = [cold_start(env, token) for _ in range(args.runs)]
+    print(f"{'uvicorn cold start (ms)':<24}{'median':>10}{'min':>10}")
+    print(f"{'first response':<24}{describe([r[0] for r in runs])}")
+    print(f"{'first data response':<24}{describe([r[1] for r in runs])}")
+    if stub is not None:
+        stub.stop()
+    workdir.cleanup()
+
+if __name__ == "__main__":
+    main()
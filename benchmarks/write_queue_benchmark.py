@@ -0,0 +1,84 @@
+# benchmarks/write_queue_benchmark.py
+# Insert throughput and per-call latency of concurrent single-transaction
+# inserts: one create_transaction per call against the write-coalescing
+# InsertQueue (src/write_queue.py) at a few max-wait settings. Runs against the
+# local PostgREST stand-in (with simulated round-trip latency) or SQLite.
+#
+#   python -m benchmarks.write_queue_benchmark --inserts 5000 --concurrency 200 --latency-ms 5
+#   python -m benchmarks.write_queue_benchmark --backend sqlite
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.postgrest_stub import PostgrestStub, FAKE_KEY
+from benchmarks.async_load_test import percentile
+
+def make_row(i):
+    return {"user_id": 1, "category": "Food", "type": "Expense",
+            "date": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "amount": float(i % 300 + 1), "description": None,
+            "currency": "USD"}
+
+async def drive(insert, inserts, concurrency):
+    counter = iter(range(inserts))
+    latencies = []
+
+    async def client():
+        for i in counter:
+            start = time.perf_counter()
+            await insert(make_row(i))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+async def bench(args):
+    from src.async_logic import db, _insert_rows, _insert_row
+    from src.write_queue import InsertQueue
+    await db.create_profile("bench", "bench@example.com", "pw")  # user 1, owner of every row
+
+    runs = [("per-row create_transaction", _insert_row, None)]
+    for wait_ms in args.wait_ms:
+        queue = InsertQueue(_insert_rows, _insert_row, args.max_batch, wait_ms)
+        runs.append((f"queue (batch {args.max_batch}, wait {wait_ms:g} ms)", queue.submit, queue))
+
+    print(f"{'path':<34}{'rows/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'batches':>9}")
+    for name, insert, queue in runs:
+        latencies, elapsed = await drive(insert, args.inserts, args.concurrency)
+        if queue is not None:
+            await queue.drain()
+        batches = queue.stats()["batches"] if queue is not None else len(latencies)
+        print(f"{name:<34}{len(latencies) / elapsed:>9.0f}{percentile(latencies, 50) * 1e3:>9.2f}"
+              f"{percentile(latencies, 95) * 1e3:>9.2f}{percentile(latencies, 99) * 1e3:>9.2f}{batches:>9}")
+    await db.close_client()
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-row inserts vs the write-coalescing queue")
+    parser.add_argument("--backend", choices=("supabase", "sqlite"), default="supabase")
+    parser.add_argument("--inserts", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="simulated PostgREST round trip")
+    parser.add_argument("--max-batch", type=int, default=200)
+    parser.add_argument("--wait-ms", type=float, nargs="+", default=[2.0, 5.0, 10.0])
+    args = parser.parse_args()
+
+    os.environ["STORAGE_BACKEND"] = args.backend
+    os.environ["CACHE_ENABLED"] = "0"
+    os.environ["BCRYPT_ROUNDS"] = "4"
+    workdir = tempfile.TemporaryDirectory()
+    stub = None
+    if args.backend == "sqlite":
+        os.environ["SQLITE_PATH"] = os.path.join(workdir.name, "write_queue.db")
+    else:
+        stub = PostgrestStub(latency_ms=args.latency_ms)
+        os.environ["SUPABASE_URL"] = stub.start(port=54330)
+        os.environ["SUPABASE_KEY"] = FAKE_KEY
+    asyncio.run(bench(args))
+    if stub is not None:
+        stub.stop()
+    workdir.cleanup()
+
+if __name__ == "__main__":
+    main()
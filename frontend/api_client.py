@@ -0,0 +1,177 @@
+# frontend/api_client.py
+# HTTP client for the Streamlit app. Every call goes through one keep-alive
+# requests.Session, shared by all browser sessions of this Streamlit server,
+# with connect/read timeouts. Reads are cached with st.cache_data for
+# FRONTEND_CACHE_TTL seconds, keyed by user, path and query, so reruns do not
+# refetch. A write moves the user's generation for the data it changes, which
+# makes the affected cached reads miss. An expired read is revalidated with the
+# ETag of the last response, so unchanged data comes back as an empty 304.
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+FRONTEND_CONNECT_TIMEOUT = float(os.getenv("FRONTEND_CONNECT_TIMEOUT", "3.05"))
+FRONTEND_READ_TIMEOUT = float(os.getenv("FRONTEND_READ_TIMEOUT", "30"))
+FRONTEND_CACHE_TTL = float(os.getenv("FRONTEND_CACHE_TTL", "30"))
+FRONTEND_POOL_SIZE = int(os.getenv("FRONTEND_POOL_SIZE", "10"))
+VALIDATED_ENTRIES = 1000   # last ETag'd responses kept for revalidation
+
+# What a write makes stale
+TRANSACTIONS, BUDGET, PROFILES, CURRENCY = "transactions", "budget", "profiles", "currency"
+
+class ApiUnavailable(Exception):
+    pass
+
+# Carries an error response out of _cached_get, so st.cache_data does not keep it
+class _Uncached(Exception):
+    def __init__(self, body):
+        super().__init__(body)
+        self.body = body
+
+@st.cache_resource
+def _session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=FRONTEND_POOL_SIZE, pool_maxsize=FRONTEND_POOL_SIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# Generations and revalidation entries, shared by all browser sessions
+class _SharedState:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generations = {}           # (user_id, kind) -> bumped by writes
+        self._validated = OrderedDict()  # (path, user_id, query) -> (etag, body)
+
+    def generation(self, user_id, kinds):
+        return tuple(self._generations.get((user_id, kind), 0) for kind in kinds)
+
+    def bump(self, user_id, *kinds):
+        with self._lock:
+            for kind in kinds:
+                self._generations[(user_id, kind)] = self._generations.get((user_id, kind), 0) + 1
+
+    def validated(self, key):
+        with self._lock:
+            return self._validated.get(key)
+
+    def remember(self, key, etag, body):
+        with self._lock:
+            self._validated[key] = (etag, body)
+            self._validated.move_to_end(key)
+            while len(self._validated) > VALIDATED_ENTRIES:
+                self._validated.popitem(last=False)
+
+@st.cache_resource
+def _shared():
+    return _SharedState()
+
+def _request(method, path, token=None, headers=None, **kwargs):
+    headers = dict(headers or {})
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        resp = _session().request(method, f"{API_URL}{path}", headers=headers,
+                                  timeout=(FRONTEND_CONNECT_TIMEOUT, FRONTEND_READ_TIMEOUT), **kwargs)
+        return resp, (None if resp.status_code == 304 else resp.json())
+    except (requests.RequestException, ValueError) as e:
+        raise ApiUnavailable(f"API request failed: {e}") from e
+
+# Query parameters as a hashable, order-independent tuple of pairs
+def _query(params):
+    pairs = []
+    for name, value in sorted((params or {}).items()):
+        for item in value if isinstance(value, (list, tuple)) else [value]:
+            if item is not None:
+                pairs.append((name, str(item)))
+    return tuple(pairs)
+
+# Cached per (path, user, generation, query); the token is not part of the key,
+# so only successful responses are cached: an error such as a 401 for an
+# expired token raises instead, and the next read after logging in refetches.
+@st.cache_data(ttl=FRONTEND_CACHE_TTL, max_entries=1000, show_spinner=False)
+def _cached_get(path, user_id, generation, query, _token):
+    key = (path, user_id, query)
+    last = _shared().validated(key)
+    resp, body = _request("GET", path, _token, headers={"If-None-Match": last[0]} if last else None,
+                          params=list(query))
+    if resp.status_code == 304 and last:
+        return last[1]
+    if body is None:
+        raise ApiUnavailable(f"API request failed: HTTP {resp.status_code}")
+    if resp.status_code >= 400 or not isinstance(body, dict) or body.get("Success") is False:
+        raise _Uncached(body)
+    if resp.headers.get("ETag"):
+        _shared().remember(key, resp.headers["ETag"], body)
+    return body
+
+class ApiClient:
+    def __init__(self, user_id=None, token=None):
+        self.user_id = user_id
+        self.token = token
+
+    def _get(self, path, kinds, params=None, user_id=None):
+        user_id = self.user_id if user_id is None else user_id
+        generation = _shared().generation(user_id, kinds)
+        try:
+            return _cached_get(path, user_id, generation, _query(params), self.token)
+        except _Uncached as e:
+            return e.body
+        except ApiUnavailable as e:
+            return {"Success": False, "Message": str(e)}
+
+    def _send(self, method, path, kinds=(), user_id=None, **kwargs):
+        try:
+            _, body = _request(method, path, self.token, **kwargs)
+        except ApiUnavailable as e:
+            return {"Success": False, "Message": str(e)}
+        _shared().bump(self.user_id if user_id is None else user_id, *kinds)
+        return body
+
+    # -------------------- Auth --------------------
+    def login(self, username, password):
+        return self._send("POST", "/login", json={"username": username, "password": password})
+
+    def register(self, username, email, password):
+        return self._send("POST", "/register", json={"username": username, "email": email, "password": password})
+
+    # -------------------- Reads (cached) --------------------
+    def profiles(self):
+        return self._get("/profiles", (PROFILES,))
+
+    def transactions(self, params):
+        return self._get("/transactions", (TRANSACTIONS,), params)
+
+    def summary(self, params):
+        return self._get("/summary", (TRANSACTIONS,), params)
+
+    def analytics(self, params):
+        return self._get("/analytics", (TRANSACTIONS,), params)
+
+    def anomalies(self):
+        return self._get("/anomalies", (TRANSACTIONS,))
+
+    def budgets(self):
+        return self._get("/budgets", (BUDGET,))
+
+    def currency(self):
+        return self._get("/currency", (CURRENCY,))
+
+    # -------------------- Writes --------------------
+    def add_profile(self, username):
+        return self._send("POST", "/profiles", (PROFILES,), json={"username": username})
+
+    def add_transaction(self, data):
+        return self._send("POST", "/transactions", (TRANSACTIONS,), json=data)
+
+    def set_budget(self, amount):
+        return self._send("POST", "/budgets", (BUDGET,), json={"budget": amount})
+
+    # Every report is in the base currency, so all of them go stale
+    def set_currency(self, currency):
+        return self._send("PUT", "/currency", (CURRENCY, TRANSACTIONS, BUDGET), json={"currency": currency})
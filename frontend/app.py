@@ -1,11 +1,8 @@
 # frontend/app.py
 import streamlit as st
-import requests
 from datetime import date
-import pandas as pd
-import plotly.express as px
 
-API_URL = "http://localhost:8000"
+from api_client import ApiClient
 
 st.set_page_config(page_title="💰 Expense Tracker", layout="wide")
 st.title("💰 Expense Tracker Web App")
@@ -15,6 +12,10 @@ if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
     st.session_state.user_id = None
     st.session_state.username = None
+    st.session_state.token = None
+
+# API client for this browser session; the token from /login goes with every request
+api = ApiClient(st.session_state.user_id, st.session_state.token)
 
 # -------------------- Sidebar --------------------
 with st.sidebar:
@@ -26,6 +27,8 @@ with st.sidebar:
             st.session_state.logged_in = False
             st.session_state.user_id = None
             st.session_state.username = None
+            st.session_state.token = None
+            st.session_state.show_dashboard = False
             st.success("Logged out successfully!")
             st.rerun()
 
@@ -40,11 +43,11 @@ with st.sidebar:
                 if not login_user or not login_pass:
                     st.warning("Please fill both fields!")
                 else:
-                    resp = requests.post(f"{API_URL}/login", json={"username": login_user, "password": login_pass})
-                    result = resp.json()
-                    if resp.status_code == 200 and result.get("Success"):
+                    result = api.login(login_user, login_pass)
+                    if result.get("Success"):
                         st.session_state.logged_in = True
                         st.session_state.user_id = result.get("Data", {}).get("id")
+                        st.session_state.token = result.get("Token")
                         st.session_state.username = (
                             result.get("Data", {}).get("username")
                             or result.get("Data", {}).get("name")
@@ -64,15 +67,11 @@ with st.sidebar:
                 if not reg_user or not reg_email or not reg_pass:
                     st.warning("Please fill all fields!")
                 else:
-                    resp = requests.post(f"{API_URL}/register", json={
-                        "username": reg_user,
-                        "email": reg_email,
-                        "password": reg_pass
-                    })
-                    if resp.status_code == 200 and resp.json().get("Success"):
+                    result = api.register(reg_user, reg_email, reg_pass)
+                    if result.get("Success"):
                         st.success("Registration successful! Please login.")
                     else:
-                        st.error(resp.json().get("Message", "Registration failed."))
+                        st.error(result.get("Message", "Registration failed."))
 
 # -------------------- Main Page --------------------
 if st.session_state.logged_in:
@@ -88,16 +87,28 @@ if st.session_state.logged_in:
             with col2:
                 if st.button("Add Profile"):
                     if username:
-                        resp = requests.post(f"{API_URL}/profiles", json={"username": username})
-                        st.success(resp.json().get("Message"))
+                        st.success(api.add_profile(username).get("Message"))
                     else:
                         st.warning("Please enter a username!")
 
-        st.subheader("All Profiles")
+        with st.expander("💱 Base Currency"):
+            currency_info = api.currency().get("Data") or {}
+            known = currency_info.get("currencies") or []
+            base = currency_info.get("base_currency")
+            st.write(f"Summaries, budgets and exports are shown in **{base or '-'}**.")
+            new_base = st.selectbox("Currency", known, index=known.index(base) if base in known else 0,
+                                    key="base_currency")
+            if st.button("Set Base Currency") and new_base:
+                result = api.set_currency(new_base)
+                if result.get("Success"):
+                    st.success(result.get("Message"))
+                else:
+                    st.error(result.get("Message"))
+
+        st.subheader("My Profile")
         if st.button("Load Profiles", key="load_profiles"):
-            resp = requests.get(f"{API_URL}/profiles")
-            profiles = resp.json().get("Data", [])
-            st.table(profiles if profiles else [])
+            profiles = api.profiles().get("Data") or []
+            st.dataframe(profiles, hide_index=True)
 
     # -------------------- Transactions Tab --------------------
     with tab2:
@@ -105,90 +116,172 @@ if st.session_state.logged_in:
         with st.expander("➕ Add Transaction"):
             col1, col2 = st.columns(2)
             with col1:
-                user_id_txn = st.number_input("User ID", min_value=1, key="txn_user")
                 category = st.text_input("Category", key="txn_category")
                 type_ = st.selectbox("Type", ["Expense", "Income"], key="txn_type")
             with col2:
                 txn_date = st.date_input("Date", value=date.today(), key="txn_date")
                 amount = st.number_input("Amount", min_value=0.0, key="txn_amount")
+                currency = st.text_input("Currency (blank = base currency)", max_chars=3, key="txn_currency")
                 description = st.text_input("Description", key="txn_desc")
             if st.button("Add Transaction"):
                 data = {
-                    "user_id": user_id_txn,
                     "category": category,
                     "type_": type_,  # fixed key
                     "date": str(txn_date),
                     "amount": amount,
-                    "description": description
+                    "description": description,
+                    "currency": currency.strip().upper() or None
                 }
-                resp = requests.post(f"{API_URL}/transactions", json=data)
-                st.success(resp.json().get("Message"))
+                result = api.add_transaction(data)
+                if result.get("Success"):
+                    st.success(result.get("Message"))
+                else:
+                    st.error(result.get("Message"))
 
         st.subheader("View Transactions")
-        view_user_id = st.number_input("User ID to View Transactions", min_value=1, key="view_txn_user")
-        if st.button("Load Transactions", key="load_txns"):
-            resp = requests.get(f"{API_URL}/transactions/{view_user_id}")
-            transactions = resp.json().get("Data", [])
-            if transactions:
-                st.table(transactions)
+        with st.expander("🔎 Filter and sort"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                use_dates = st.checkbox("Filter by date", key="flt_use_dates")
+                flt_start = st.date_input("From", value=date.today().replace(day=1), key="flt_start")
+                flt_end = st.date_input("To", value=date.today(), key="flt_end")
+            with col2:
+                flt_categories = st.text_input("Categories (comma separated)", key="flt_categories")
+                flt_type = st.selectbox("Type", ["All", "Expense", "Income"], key="flt_type")
+                flt_search = st.text_input("Description contains", key="flt_search")
+            with col3:
+                flt_min = st.number_input("Min amount", min_value=0.0, value=0.0, key="flt_min")
+                flt_max = st.number_input("Max amount (0 = no limit)", min_value=0.0, value=0.0, key="flt_max")
+                flt_sort = st.selectbox("Sort by", ["date", "-date", "amount", "-amount"], key="flt_sort")
+                flt_limit = st.selectbox("Rows per page", [50, 100, 200, 500], key="flt_limit")
+        filters = {"sort": flt_sort, "limit": flt_limit}
+        if use_dates:
+            filters.update({"start_date": str(flt_start), "end_date": str(flt_end)})
+        categories = [c.strip() for c in flt_categories.split(",") if c.strip()]
+        if categories:
+            filters["category"] = categories
+        if flt_type != "All":
+            filters["type"] = flt_type
+        if flt_search.strip():
+            filters["q"] = flt_search.strip()
+        if flt_min > 0:
+            filters["min_amount"] = flt_min
+        if flt_max > 0:
+            filters["max_amount"] = flt_max
+
+        # changed filters start again from the first page
+        if st.button("Load Transactions", key="load_txns") or \
+                (st.session_state.get("txn_cursors") and st.session_state.get("txn_filters") != filters):
+            st.session_state.txn_cursors = [None]  # one cursor per visited page
+            st.session_state.txn_filters = filters
+        if st.session_state.get("txn_cursors"):
+            cursor = st.session_state.txn_cursors[-1]
+            params = {**filters, "cursor": cursor} if cursor else dict(filters)
+            result = api.transactions(params)
+            transactions = result.get("Data") or []
+            if result.get("Success") is False:
+                st.error(result.get("Message"))
+            elif transactions:
+                # scrollable grid that only draws the visible rows
+                st.dataframe(transactions, hide_index=True)
             else:
                 st.info("No transactions found.")
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                if len(st.session_state.txn_cursors) > 1 and st.button("⬅️ Previous", key="txn_prev"):
+                    st.session_state.txn_cursors.pop()
+                    st.rerun()
+            with col_next:
+                if result.get("NextCursor") and st.button("Next ➡️", key="txn_next"):
+                    st.session_state.txn_cursors.append(result["NextCursor"])
+                    st.rerun()
 
     # -------------------- Budget Tab --------------------
     with tab3:
         st.header("📊 Budget Management")
         with st.expander("➕ Set Budget"):
-            col1, col2 = st.columns(2)
-            with col1:
-                budget_user_id = st.number_input("User ID", min_value=1, key="budget_user")
-            with col2:
-                budget_amount = st.number_input("Budget Amount", min_value=0.0, key="budget_amount")
+            budget_amount = st.number_input("Budget Amount", min_value=0.0, key="budget_amount")
             if st.button("Set Budget"):
-                resp = requests.post(f"{API_URL}/budgets", json={"user_id": budget_user_id, "budget": budget_amount})
-                st.success(resp.json().get("Message"))
+                st.success(api.set_budget(budget_amount).get("Message"))
 
         st.subheader("View Budget")
-        view_budget_user = st.number_input("User ID to View Budget", min_value=1, key="view_budget_user")
         if st.button("Load Budget", key="load_budget"):
-            resp = requests.get(f"{API_URL}/budgets/{view_budget_user}")
-            budgets = resp.json().get("Data", [])
-            st.table(budgets if budgets else [])
+            budgets = api.budgets().get("Data") or []
+            st.dataframe(budgets, hide_index=True)
 
     # -------------------- Dashboard Tab --------------------
     with tab4:
         st.header("📈 Dashboard - Spending Insights")
-        dashboard_user_id = st.number_input("Select User ID for Dashboard", min_value=1, key="dashboard_user")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            dash_start = st.date_input("From", value=None, key="dash_start")
+        with col2:
+            dash_end = st.date_input("To", value=None, key="dash_end")
+        with col3:
+            granularity = st.selectbox("Group by", ["month", "week", "day"], key="dash_granularity")
+        # once loaded, the dashboard stays up across reruns, drawn from the cached summaries
         if st.button("Load Dashboard"):
-            resp = requests.get(f"{API_URL}/transactions/{dashboard_user_id}")
-            transactions = resp.json().get("Data", [])
-            if not transactions:
+            st.session_state.show_dashboard = True
+        if st.session_state.get("show_dashboard"):
+            import plotly.express as px   # imported on first use: only the dashboard draws charts
+            params = {"granularity": granularity}
+            if dash_start:
+                params["start_date"] = str(dash_start)
+            if dash_end:
+                params["end_date"] = str(dash_end)
+            result = api.summary(params)
+            summary = result.get("Data") or {}
+            if not result.get("Success"):
+                st.error(result.get("Message", "Failed to load dashboard."))
+            elif not summary.get("count"):
                 st.info("No transactions available for this user.")
             else:
-                df = pd.DataFrame(transactions)
-                df['date'] = pd.to_datetime(df['date'])
-                expenses = df[df['type'] == 'Expense']  # <-- use 'type', not 'type_'
-
+                m1, m2, m3 = st.columns(3)
+                unit = summary.get("currency", "")
+                m1.metric(f"Income ({unit})", f"{summary['income']:,.2f}")
+                m2.metric(f"Expenses ({unit})", f"{summary['expense']:,.2f}")
+                m3.metric(f"Net ({unit})", f"{summary['net']:,.2f}")
 
                 # Category Breakdown Chart
-                category_totals = expenses.groupby('category')['amount'].sum().reset_index()
-                fig_cat = px.pie(category_totals, values='amount', names='category', title="Expenses by Category")
+                categories = summary["categories"]
+                fig_cat = px.pie(
+                    names=[c["category"] for c in categories],
+                    values=[c["amount"] for c in categories],
+                    title="Expenses by Category"
+                )
                 st.plotly_chart(fig_cat, use_container_width=True)
 
+                # Spending per period Chart
+                periods = summary["periods"]
+                fig_period = px.bar(
+                    x=[p["period"] for p in periods],
+                    y=[p["expense"] for p in periods],
+                    title=f"Expenses per {granularity.capitalize()}",
+                    color=[p["expense"] for p in periods],
+                    labels={"x": granularity.capitalize(), "y": "Total Spent", "color": "Total Spent"}
+                )
+                st.plotly_chart(fig_period, use_container_width=True)
 
-                # Monthly Spending Chart
-                expenses['month'] = expenses['date'].dt.to_period('M')  # get year-month period
-                monthly_totals = expenses.groupby('month')['amount'].sum().reset_index()
-                monthly_totals['month'] = monthly_totals['month'].astype(str)  # convert to 'YYYY-MM' string
+                # Running balance and top categories from the analytics endpoint
+                analytics = api.analytics(params).get("Data") or {}
+                if analytics.get("balance"):
+                    balance = analytics["balance"]
+                    fig_balance = px.line(
+                        x=[b["date"] for b in balance],
+                        y=[b["balance"] for b in balance],
+                        title="Running Balance",
+                        labels={"x": "Date", "y": "Balance"}
+                    )
+                    st.plotly_chart(fig_balance, use_container_width=True)
+                if analytics.get("top_categories"):
+                    st.subheader("Top Spending Categories")
+                    st.dataframe(analytics["top_categories"], hide_index=True)
 
-                fig_month = px.bar(
-                    monthly_totals,
-                    x='month',
-                    y='amount',
-                    title="Monthly Expenses",
-                    color='amount',
-                    labels={'month': 'Month', 'amount': 'Total Spent'}
-                )
-                st.plotly_chart(fig_month, use_container_width=True)
+                # Flags precomputed by the anomaly job
+                anomalies = api.anomalies().get("Data") or {}
+                if anomalies.get("flags"):
+                    st.subheader("Unusual Spending")
+                    st.dataframe(anomalies["flags"], hide_index=True)
 
 else:
     st.write("🔑 Please click Login or Register in the sidebar to access the Expense Tracker.")
@@ -0,0 +1,280 @@
+# src/anomalies.py
+# Spending-anomaly detection over every user's expenses, computed as array
+# operations over batches of users rather than a Python loop per user:
+#   outlier          an expense far above the median of the previous
+#                    ANOMALY_WINDOW expenses in the same category, by robust
+#                    z-score (x - median) / (1.4826 * MAD) on x = log(1 + amount),
+#                    since spending varies by ratios rather than fixed amounts;
+#                    the first ANOMALY_MIN_HISTORY expenses of a category are
+#                    never judged
+#   category_shift   a month whose category total is ANOMALY_SHIFT_Z spreads
+#                    above the EWMA of that category's earlier months
+# Amounts are compared in the owner's base currency (src/currency.py), so a
+# trip abroad is not an outlier just because its amounts are in another unit.
+# Flags go to a local SQLite store (ANOMALY_FLAGS_PATH) that the API and the
+# dashboard read. The offline job scans all transactions in (user_id, date, id)
+# order and evaluates about ANOMALY_BATCH_ROWS rows (whole users) at a time:
+#
+#   python -m src.anomalies
+#
+# GET /anomalies?refresh=true recomputes one user from their ledger.
+import os
+import time
+import argparse
+from datetime import date, datetime
+import numpy as np
+from src.ledger import to_days, EXPENSE, UNCATEGORIZED
+from src.currency import BASE_CURRENCY, fx_rates
+from src.local_store import LocalStore
+
+ANOMALY_FLAGS_PATH = os.getenv("ANOMALY_FLAGS_PATH", "anomalies.db")
+ANOMALY_BATCH_ROWS = int(os.getenv("ANOMALY_BATCH_ROWS", "200000"))
+ANOMALY_WINDOW = int(os.getenv("ANOMALY_WINDOW", "20"))
+ANOMALY_MIN_HISTORY = int(os.getenv("ANOMALY_MIN_HISTORY", "5"))
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", "3.5"))
+ANOMALY_SHIFT_Z = float(os.getenv("ANOMALY_SHIFT_Z", "3"))
+ANOMALY_LOOKBACK_MONTHS = int(os.getenv("ANOMALY_LOOKBACK_MONTHS", "24"))
+SHIFT_ALPHA = 0.3           # EWMA weight of the newest month
+SHIFT_MIN_MONTHS = 6        # months of category history before shifts are flagged
+MAD_SCALE = 1.4826          # MAD -> standard deviation for normally distributed values
+# Spread floors (log units for outliers, a fraction of the EWMA mean for
+# shifts) so near-constant series such as rent do not flag every small change.
+# At ANOMALY_Z = 3.5 the outlier floor puts the bar at about 2.9x the median;
+# lower floors flag ordinary variation between a few recent expenses about as
+# often as real spikes (see benchmarks/anomaly_benchmark.py).
+OUTLIER_MIN_SPREAD = 0.3
+OUTLIER_MIN_RATIO = 1.5     # and an outlier is at least this multiple of the median
+SHIFT_MIN_SPREAD = 0.25
+SHIFT_MIN_RATIO = 2.0       # and a shifted month is at least this multiple of the EWMA
+SCAN_PAGE_ROWS = 1000
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS anomaly_flags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    transaction_id INTEGER,
+    category TEXT,
+    period TEXT,
+    amount REAL,
+    expected REAL,
+    score REAL
+);
+CREATE INDEX IF NOT EXISTS anomaly_flags_user ON anomaly_flags (user_id, period);
+CREATE TABLE IF NOT EXISTS anomaly_runs (
+    user_id INTEGER PRIMARY KEY,
+    computed_at TEXT
+);
+"""
+
+# =========================
+# FLAG STORE
+# =========================
+# Latest flags per user; each run replaces a user's flags as a whole
+class AnomalyStore(LocalStore):
+    SCHEMA = STORE_SCHEMA
+
+    def __init__(self, path=ANOMALY_FLAGS_PATH):
+        super().__init__(path)
+
+    def replace(self, user_ids, flags):
+        user_ids = list(user_ids)
+        now = datetime.utcnow().isoformat()
+
+        def run(conn):
+            conn.executemany("DELETE FROM anomaly_flags WHERE user_id = ?", [(u,) for u in user_ids])
+            conn.executemany(
+                "INSERT INTO anomaly_flags (user_id, kind, transaction_id, category, period, amount, expected, score) "
+                "VALUES (:user_id, :kind, :transaction_id, :category, :period, :amount, :expected, :score)", flags)
+            conn.executemany("INSERT INTO anomaly_runs (user_id, computed_at) VALUES (?, ?) "
+                             "ON CONFLICT (user_id) DO UPDATE SET computed_at = excluded.computed_at",
+                             [(u, now) for u in user_ids])
+        self._write(run)
+
+    def computed_at(self, user_id):
+        rows = self._select("SELECT computed_at FROM anomaly_runs WHERE user_id = ?", (user_id,))
+        return rows[0]["computed_at"] if rows else None
+
+    # Newest first: {"computed_at", "flags"}
+    def for_user(self, user_id, limit=100):
+        flags = self._select("SELECT kind, transaction_id, category, period, amount, expected, score "
+                             "FROM anomaly_flags WHERE user_id = ? ORDER BY period DESC, score DESC LIMIT ?",
+                             (user_id, limit))
+        return {"computed_at": self.computed_at(user_id), "flags": flags}
+
+anomaly_store = AnomalyStore()
+
+# =========================
+# DETECTION
+# =========================
+# Per-row median of the first `counts` values of each row (NaN-padded rows)
+def _row_median(values, counts):
+    ordered = np.sort(values, axis=1)   # NaN padding sorts last
+    lo = np.take_along_axis(ordered, ((counts - 1) // 2)[:, None], axis=1)[:, 0]
+    hi = np.take_along_axis(ordered, (counts // 2)[:, None], axis=1)[:, 0]
+    return (lo + hi) / 2
+
+def _month_index(days):
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+def _lookback_month(today=None):
+    today = today or date.today()
+    return int(np.datetime64(today.isoformat()[:7], "M").astype(np.int64)) - ANOMALY_LOOKBACK_MONTHS + 1
+
+def _outliers(order, group_start, users, ids, days, categories, amounts, names, first_day):
+    position = np.arange(len(order)) - group_start      # earlier expenses in the same user/category
+    rows = np.flatnonzero((position >= ANOMALY_MIN_HISTORY) & (days >= first_day))
+    if not len(rows):
+        return []
+    lags = np.arange(1, ANOMALY_WINDOW + 1)
+    counts = np.minimum(position[rows], ANOMALY_WINDOW)
+    values = np.log1p(np.maximum(amounts, 0.0))
+    history = np.where(lags[None, :] <= counts[:, None], values[np.maximum(rows[:, None] - lags, 0)], np.nan)
+    median = _row_median(history, counts)
+    mad = _row_median(np.abs(history - median[:, None]), counts)
+    score = (values[rows] - median) / np.maximum(MAD_SCALE * mad, OUTLIER_MIN_SPREAD)
+    median = np.expm1(median)
+    hits = np.flatnonzero((score > ANOMALY_Z) & (amounts[rows] >= OUTLIER_MIN_RATIO * median))
+    rows, median, score = rows[hits], median[hits], score[hits]
+    dates = days[rows].astype("datetime64[D]").astype(str)
+    return [{"user_id": int(users[r]), "kind": "outlier", "transaction_id": int(ids[r]),
+             "category": str(names[categories[r]]), "period": str(d), "amount": float(amounts[r]),
+             "expected": round(float(m), 2), "score": round(float(s), 2)}
+            for r, d, m, s in zip(rows, dates, median, score)]
+
+def _shifts(group, starts, users, days, categories, amounts, names, first_month):
+    months = _month_index(days)
+    keep = months >= first_month
+    if not keep.any():
+        return []
+    span = int(months[keep].max()) - first_month + 1
+    pairs = len(starts)
+    totals = np.bincount(group[keep] * span + (months[keep] - first_month), weights=amounts[keep],
+                         minlength=pairs * span).reshape(pairs, span)
+    active = totals > 0
+    first_active = np.where(active.any(axis=1), active.argmax(axis=1), span)
+    # the first month with spending is usually partial, so the EWMA starts after it
+    mean, var = np.zeros(pairs), np.zeros(pairs)
+    seen = np.zeros(pairs, dtype=np.int64)
+    flags = []
+    # one vectorized step per month, across every user/category pair at once
+    for month in range(span):
+        x = totals[:, month]
+        started = first_active < month
+        spread = np.maximum(np.sqrt(var), SHIFT_MIN_SPREAD * mean)
+        eligible = started & (seen >= SHIFT_MIN_MONTHS) & (spread > 0)
+        score = np.zeros(pairs)
+        score[eligible] = (x[eligible] - mean[eligible]) / spread[eligible]
+        label = str(np.datetime64(first_month + month, "M"))
+        for p in np.flatnonzero((score > ANOMALY_SHIFT_Z) & (x >= SHIFT_MIN_RATIO * mean)):
+            first = starts[p]
+            flags.append({"user_id": int(users[first]), "kind": "category_shift", "transaction_id": None,
+                          "category": str(names[categories[first]]), "period": label, "amount": round(float(x[p]), 2),
+                          "expected": round(float(mean[p]), 2), "score": round(float(score[p]), 2)})
+        delta = x - mean
+        new = started & (seen == 0)
+        mean = np.where(new, x, np.where(started, mean + SHIFT_ALPHA * delta, mean))
+        var = np.where(new, 0.0, np.where(started, (1 - SHIFT_ALPHA) * (var + SHIFT_ALPHA * delta * delta), var))
+        seen += started
+    return flags
+
+# Flags for a batch of expenses given as parallel arrays (any order); categories
+# are codes into `names`. Only periods in the last ANOMALY_LOOKBACK_MONTHS are flagged.
+def detect(users, ids, days, categories, amounts, names, today=None):
+    if not len(ids):
+        return []
+    order = np.lexsort((ids, days, categories, users))
+    users, ids, days = users[order], ids[order], days[order]
+    categories, amounts = categories[order], amounts[order].astype(np.float64)
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (users[1:] != users[:-1]) | (categories[1:] != categories[:-1])
+    group = np.cumsum(new_group) - 1
+    starts = np.flatnonzero(new_group)
+    first_month = _lookback_month(today)
+    first_day = int(np.datetime64(first_month, "M").astype("datetime64[D]").astype(np.int64))
+    return (_outliers(order, starts[group], users, ids, days, categories, amounts, names, first_day)
+            + _shifts(group, starts, users, days, categories, amounts, names, first_month))
+
+# Amounts of scanned rows in their owners' currencies (`currencies`: user_id ->
+# code), one conversion per distinct target currency
+def owner_amounts(rows, currencies, table):
+    positions = {}
+    for i, r in enumerate(rows):
+        positions.setdefault(currencies.get(r["user_id"], BASE_CURRENCY), []).append(i)
+    amounts = np.empty(len(rows))
+    for currency, at in positions.items():
+        amounts[at] = table.convert_rows([rows[i] for i in at], currency)
+    return amounts
+
+# Expense columns of scanned transaction rows, amounts in the owners' currencies
+def expense_columns(rows, currencies, table):
+    rows = [r for r in rows if (r["type"] or "").lower() == "expense"]
+    names, categories = np.unique(np.array([r["category"] or UNCATEGORIZED for r in rows], dtype=object).astype(str),
+                                  return_inverse=True)
+    return (np.fromiter((r["user_id"] for r in rows), np.int64, len(rows)),
+            np.fromiter((r["id"] for r in rows), np.int64, len(rows)),
+            to_days([r["date"] for r in rows]),
+            categories.astype(np.int32),
+            owner_amounts(rows, currencies, table),
+            names)
+
+# One user's flags from their columnar ledger (see src/ledger.py), which should
+# already be in their base currency (Ledger.in_currency)
+def detect_ledger(user_id, ledger, today=None):
+    expense = ledger.types == EXPENSE
+    count = int(expense.sum())
+    return detect(np.full(count, user_id, dtype=np.int64), ledger.ids[expense], ledger.days[expense],
+                  ledger.categories[expense], ledger.amounts[expense], ledger.names, today)
+
+# =========================
+# OFFLINE JOB
+# =========================
+# Scanned rows in lists of about batch_rows that always hold whole users
+def scan_batches(db, batch_rows=ANOMALY_BATCH_ROWS, page_rows=SCAN_PAGE_ROWS):
+    buffer, after = [], (None, None, None)
+    while True:
+        rows = db.get_transaction_scan_page(*after, page_rows).data
+        buffer.extend(rows)
+        if len(rows) < page_rows:
+            if buffer:
+                yield buffer
+            return
+        last = rows[-1]
+        after = (last["user_id"], last["date"], last["id"])
+        if len(buffer) >= batch_rows:
+            cut = len(buffer)
+            while cut and buffer[cut - 1]["user_id"] == last["user_id"]:
+                cut -= 1
+            if cut:
+                yield buffer[:cut]
+                buffer = buffer[cut:]
+
+def run_job(db, store=anomaly_store, batch_rows=ANOMALY_BATCH_ROWS, today=None):
+    stats = {"users": 0, "transactions": 0, "flags": 0, "batches": 0}
+    start = time.monotonic()
+    for rows in scan_batches(db, batch_rows):
+        users = sorted({r["user_id"] for r in rows})
+        bases = db.get_base_currencies(users)
+        currencies = {u: bases.get(u) or BASE_CURRENCY for u in users}
+        flags = detect(*expense_columns(rows, currencies, fx_rates.table()), today=today)
+        store.replace(users, flags)
+        stats["batches"] += 1
+        stats["users"] += len(users)
+        stats["transactions"] += len(rows)
+        stats["flags"] += len(flags)
+    stats["seconds"] = round(time.monotonic() - start, 3)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag unusual spending for every user")
+    parser.add_argument("--batch-rows", type=int, default=ANOMALY_BATCH_ROWS, help="transactions per evaluated batch")
+    args = parser.parse_args()
+
+    from src.storage import sync_backend
+    stats = run_job(sync_backend(), batch_rows=args.batch_rows)
+    print(f"users={stats['users']} transactions={stats['transactions']} flags={stats['flags']} "
+          f"batches={stats['batches']} seconds={stats['seconds']}", flush=True)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
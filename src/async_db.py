@@ -0,0 +1,365 @@
+import os
+import asyncio
+from datetime import datetime
+from dotenv import load_dotenv
+from src.passwords import ahash_password
+from src.cache import acached, invalidate_user, invalidate_rows
+from src.metrics import timed
+from src.currency import BASE_CURRENCY
+from src.db import (
+    quote_filter_value, owned, is_unique_violation,
+    filter_transactions, keyset_after, id_chunks, SCAN_COLUMNS
+)
+
+# Connection pool settings (shared by every request in the worker)
+POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30"))
+REQUEST_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+
+_client = None
+_client_lock = asyncio.Lock()
+
+# =================
+# CLIENT / POOL
+# =================
+
+# Get the shared async client, creating it (and its connection pool) on first
+# use, so importing this module needs neither credentials nor the supabase package
+async def get_client():
+    global _client
+    if _client is None:
+        async with _client_lock:
+            if _client is None:
+                import httpx
+                from supabase import acreate_client
+                load_dotenv()
+                url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+                if not url or not key:
+                    raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set for the supabase backend")
+                client = await acreate_client(url, key)
+                # swap postgrest's default session for a bounded keep-alive pool
+                postgrest = client.postgrest
+                default_session = postgrest.session
+                postgrest.session = httpx.AsyncClient(
+                    base_url=default_session.base_url,
+                    headers=default_session.headers,
+                    timeout=REQUEST_TIMEOUT,
+                    follow_redirects=True,
+                    limits=httpx.Limits(
+                        max_connections=POOL_MAX_CONNECTIONS,
+                        max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                        keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+                    ),
+                )
+                await default_session.aclose()
+                _client = client
+    return _client
+
+# Close the pool (call on application shutdown)
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.postgrest.session.aclose()
+        _client = None
+
+# =================
+# PROFILES TABLE
+# =================
+
+# Create Profile
+@timed
+async def create_profile(username, email=None, password=None):
+    hashed_pw = await ahash_password(password) if password else None
+    client = await get_client()
+    return await client.table("profiles").insert({
+        "username": username,
+        "email": email,
+        "password": hashed_pw,
+        "created_at": datetime.utcnow().isoformat()
+    }).execute()
+
+# Get all profiles
+@timed
+async def get_all_profiles():
+    client = await get_client()
+    return await client.table("profiles").select("*").order("created_at").execute()
+
+# Get a single profile by id
+@acached("profile")
+@timed
+async def get_profile(profile_id):
+    client = await get_client()
+    return await client.table("profiles").select("*").eq("id", profile_id).single().execute()
+
+# Get profile by username or email
+@timed
+async def get_profile_by_username(username):
+    client = await get_client()
+    return await client.table("profiles").select("*").eq("username", username).execute()
+
+@timed
+async def get_profile_by_email(email):
+    client = await get_client()
+    return await client.table("profiles").select("*").eq("email", email).execute()
+
+@timed
+async def get_profile_by_login(username_or_email):
+    value = quote_filter_value(username_or_email)
+    client = await get_client()
+    return await client.table("profiles").select("*").or_(f"username.eq.{value},email.eq.{value}").limit(2).execute()
+
+# Update profile
+@timed
+async def update_profile(profile_id, updates: dict):
+    updates["created_at"] = datetime.utcnow().isoformat()
+    client = await get_client()
+    result = await client.table("profiles").update(updates).eq("id", profile_id).execute()
+    invalidate_user(profile_id, "profile")
+    return result
+
+# Delete profile
+@timed
+async def delete_profile(profile_id):
+    client = await get_client()
+    result = await client.table("profiles").delete().eq("id", profile_id).execute()
+    invalidate_user(profile_id, "profile", "transactions", "budget")
+    return result
+
+# =====================
+# TRANSACTIONS TABLE
+# =====================
+@timed
+async def create_transaction(user_id, category, type_, date, amount, description=None, currency=None):
+    client = await get_client()
+    result = await client.table("transactions").insert({
+        "user_id": user_id,
+        "category": category,
+        "type": type_,        # <-- DB column is 'type', not 'type_'
+        "date": date,
+        "amount": amount,
+        "description": description,
+        "created_at": datetime.utcnow().isoformat(),
+        "currency": currency
+    }).execute()
+    invalidate_rows(result.data, "transactions")
+    return result
+
+# Multi-row insert; rows are dicts with the transactions table's column names.
+# returning=True gives back the inserted rows, in input order.
+@timed
+async def create_transactions(rows, returning=False):
+    now = datetime.utcnow().isoformat()
+    rows = [{**row, "created_at": now} for row in rows]
+    from postgrest.types import ReturnMethod
+    client = await get_client()
+    result = await client.table("transactions").insert(
+        rows, returning=ReturnMethod.representation if returning else ReturnMethod.minimal).execute()
+    invalidate_rows(rows, "transactions")
+    return result
+
+@acached("transactions")
+@timed
+async def get_transactions(user_id):
+    client = await get_client()
+    return await client.table("transactions").select("*").eq("user_id", user_id).order("date").execute()
+
+# Keyset page of a user's transactions, filtered and ordered by (sort, id)
+@acached("transactions")
+@timed
+async def get_transactions_page(user_id, after_value=None, after_id=None, limit=100, sort="date", descending=False,
+                                **filters):
+    client = await get_client()
+    query = filter_transactions(client.table("transactions").select("*").eq("user_id", user_id), **filters)
+    query = keyset_after(query, sort, descending, after_value, after_id)
+    return await query.order(sort, desc=descending).order("id", desc=descending).limit(limit).execute()
+
+# Only the columns the summary needs, with the date range applied in the database
+@acached("transactions")
+@timed
+async def get_transaction_totals(user_id, start_date=None, end_date=None):
+    client = await get_client()
+    query = client.table("transactions").select("date,category,type,amount,currency").eq("user_id", user_id)
+    if start_date:
+        query = query.gte("date", start_date)
+    if end_date:
+        query = query.lte("date", end_date)
+    return await query.execute()
+
+@timed
+async def update_transaction(transaction_id, updates: dict, user_id=None):
+    # map type_ to type before updating DB
+    if "type_" in updates:
+        updates["type"] = updates.pop("type_")
+    updates["created_at"] = datetime.utcnow().isoformat()
+    client = await get_client()
+    result = await owned(client.table("transactions").update(updates).eq("id", transaction_id), user_id).execute()
+    invalidate_rows(result.data, "transactions")
+    return result
+
+@timed
+async def delete_transaction(transaction_id, user_id=None):
+    client = await get_client()
+    result = await owned(client.table("transactions").delete().eq("id", transaction_id), user_id).execute()
+    invalidate_rows(result.data, "transactions")
+    return result
+
+# Batched creates/updates/deletes for one user; see src/db.py (not atomic)
+@timed
+async def apply_transaction_batch(user_id, creates=(), updates=(), deletes=()):
+    now = datetime.utcnow().isoformat()
+    client = await get_client()
+    table = lambda: client.table("transactions")
+    created, updated, deleted = [], [], []
+    if creates:
+        created = (await table().insert([{**row, "user_id": user_id, "created_at": now}
+                                         for row in creates]).execute()).data
+    for changes, ids in updates:
+        for chunk in id_chunks(ids):
+            updated += (await table().update({**changes, "created_at": now}).eq("user_id", user_id)
+                        .in_("id", chunk).execute()).data
+    for chunk in id_chunks(deletes):
+        deleted += (await table().delete().eq("user_id", user_id).in_("id", chunk).execute()).data
+    invalidate_user(user_id, "transactions")
+    return {"created": created, "updated": updated, "deleted": deleted}
+
+# =====================
+# TRANSACTION ROLLUPS
+# =====================
+@acached("transactions")
+@timed
+async def get_rollups(user_id, start_month=None, end_month=None):
+    client = await get_client()
+    query = client.table("transaction_rollups").select("*").eq("user_id", user_id)
+    if start_month:
+        query = query.gte("month", start_month)
+    if end_month:
+        query = query.lte("month", end_month)
+    return await query.order("month").execute()
+
+# ====================
+# BUDGET TABLE CRUD
+# ====================
+@timed
+async def create_budget(user_id, budget):
+    client = await get_client()
+    result = await client.table("budget").insert({
+        "user_id": user_id,
+        "budget": budget,
+        "created_at": datetime.utcnow().isoformat()
+    }).execute()
+    invalidate_user(user_id, "budget")
+    return result
+
+@acached("budget")
+@timed
+async def get_budget(user_id):
+    client = await get_client()
+    return await client.table("budget").select("*").eq("user_id", user_id).order("created_at").limit(1).execute()
+
+@timed
+async def update_budget(budget_id, new_budget, user_id=None):
+    client = await get_client()
+    result = await owned(client.table("budget").update({
+        "budget": new_budget,
+        "created_at": datetime.utcnow().isoformat()
+    }).eq("id", budget_id), user_id).execute()
+    invalidate_rows(result.data, "budget")
+    return result
+
+@timed
+async def delete_budget(budget_id, user_id=None):
+    client = await get_client()
+    result = await owned(client.table("budget").delete().eq("id", budget_id), user_id).execute()
+    invalidate_rows(result.data, "budget")
+    return result
+
+@timed
+async def apply_budget_batch(user_id, creates=(), updates=(), deletes=()):
+    now = datetime.utcnow().isoformat()
+    client = await get_client()
+    table = lambda: client.table("budget")
+    created, updated, deleted = [], [], []
+    if creates:
+        created = (await table().insert([{"user_id": user_id, "budget": b, "created_at": now}
+                                         for b in creates]).execute()).data
+    for new_budget, ids in updates:
+        for chunk in id_chunks(ids):
+            updated += (await table().update({"budget": new_budget, "created_at": now}).eq("user_id", user_id)
+                        .in_("id", chunk).execute()).data
+    for chunk in id_chunks(deletes):
+        deleted += (await table().delete().eq("user_id", user_id).in_("id", chunk).execute()).data
+    invalidate_user(user_id, "budget")
+    return {"created": created, "updated": updated, "deleted": deleted}
+
+# =====================
+# BUDGET MONITORING
+# =====================
+@timed
+async def get_budget_status_page(month, after_user_id=0, limit=1000):
+    client = await get_client()
+    return await client.rpc("budget_status_page", {
+        "p_month": month, "p_after_user_id": after_user_id, "p_limit": limit,
+        "p_base_currency": BASE_CURRENCY
+    }).execute()
+
+# =========================
+# RECURRING TRANSACTIONS
+# =========================
+@timed
+async def create_recurring(user_id, rule: dict):
+    client = await get_client()
+    result = await client.table("recurring_transactions").insert({
+        **rule,
+        "user_id": user_id,
+        "created_at": datetime.utcnow().isoformat()
+    }).execute()
+    invalidate_user(user_id, "recurring")
+    return result
+
+@acached("recurring")
+@timed
+async def get_recurring(user_id):
+    client = await get_client()
+    return await client.table("recurring_transactions").select("*").eq("user_id", user_id).order("id").execute()
+
+# expected: compare-and-set columns, see src/db.py
+@timed
+async def update_recurring(rule_id, updates: dict, user_id=None, expected=None):
+    client = await get_client()
+    query = owned(client.table("recurring_transactions").update(updates).eq("id", rule_id), user_id)
+    for column, value in (expected or {}).items():
+        query = query.eq(column, value)
+    result = await query.execute()
+    invalidate_rows(result.data, "recurring")
+    return result
+
+@timed
+async def delete_recurring(rule_id, user_id=None):
+    client = await get_client()
+    result = await owned(client.table("recurring_transactions").delete().eq("id", rule_id), user_id).execute()
+    invalidate_rows(result.data, "recurring")
+    return result
+
+# =====================
+# BATCH SCANS
+# =====================
+@timed
+async def get_transaction_scan_page(after_user_id=None, after_date=None, after_id=None, limit=1000):
+    client = await get_client()
+    query = client.table("transactions").select(SCAN_COLUMNS)
+    if after_user_id is not None:
+        day = quote_filter_value(after_date)
+        query = query.or_(f"user_id.gt.{after_user_id},and(user_id.eq.{after_user_id},"
+                          f"or(date.gt.{day},and(date.eq.{day},id.gt.{after_id})))")
+    return await query.order("user_id").order("date").order("id").limit(limit).execute()
+
+# {profile id: base_currency or None} for the given profiles (the owners of a scanned batch)
+@timed
+async def get_base_currencies(user_ids):
+    client = await get_client()
+    currencies = {}
+    for chunk in id_chunks(user_ids):
+        rows = (await client.table("profiles").select("id,base_currency").in_("id", chunk).execute()).data
+        currencies.update((r["id"], r.get("base_currency")) for r in rows)
+    return currencies
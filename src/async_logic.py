@@ -0,0 +1,544 @@
+from src.storage import async_backend
+from src.services import (
+    GRANULARITIES, MAX_PAGE_SIZE, public_profile, login_user, currencies_data, summarize_transactions,
+    rollup_summary, rollup_months, reporting_ledger, cursor_key, decode_cursor, page_size, merged_page, error_result,
+    parse_sort, transaction_filters, analytics_params, analytics, plan_batch, transaction_fields, transaction_updates,
+    budget_fields, batch_arguments, fill_currency, budget_batch_arguments, has_work, finish_batch, EMPTY_BATCH,
+    pending_after
+)
+from src.recurring import (
+    rule_fields, pending_rows, closing_rules, detach_target, claim, occurrence_row, is_virtual
+)
+from src.ledger import Ledger, ledgers, LEDGER_ENABLED
+from src.importer import iter_csv_records, normalize_header, record_to_payload, describe_error
+from src.passwords import averify_password
+from src.metrics import record_service_error
+from src.write_queue import InsertQueue, WRITE_QUEUE_ENABLED
+from src.budget_monitor import alert_outbox, aevaluate_user, affects_current_month, BUDGET_ALERTS_ENABLED
+from src.anomalies import anomaly_store, detect_ledger
+from src.currency import base_currency, normalize_currency, with_currency
+import asyncio
+
+# Async data-access functions of the configured storage backend (see src/storage.py)
+db = async_backend()
+
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+
+async def _insert_rows(rows):
+    return (await db.create_transactions(rows, returning=True)).data
+
+async def _insert_row(row):
+    result = await db.create_transaction(row["user_id"], row["category"], row["type"], row["date"], row["amount"],
+                                         row.get("description"), row.get("currency"))
+    return result.data[0]
+
+# Coalesces concurrent single inserts into multi-row inserts when WRITE_QUEUE_ENABLED
+# (see src/write_queue.py); drained by the API on shutdown
+insert_queue = InsertQueue(_insert_rows, _insert_row)
+
+# =========================
+# RECURRING TRANSACTIONS
+# =========================
+# Async counterparts of the helpers in src/logic.py
+async def recurring_rules(user_id):
+    rules = (await db.get_recurring(user_id)).data
+    closing = closing_rules(rules)
+    for rule, (updates, rows) in closing:
+        await store_occurrences(rule, updates, rows)
+    return (await db.get_recurring(user_id)).data if closing else rules
+
+async def store_occurrences(rule, updates, rows):
+    if not (await db.update_recurring(rule["id"], updates, rule["user_id"], claim(rule))).data:
+        return []
+    if not rows:
+        return []
+    try:
+        rows = with_currency(rows, await user_currency(rule["user_id"]))
+        inserted = (await db.create_transactions(rows, returning=True)).data
+    except Exception:
+        await db.update_recurring(rule["id"], claim(rule), rule["user_id"])
+        raise
+    ledgers.inserted(inserted)
+    return inserted
+
+async def pending_transactions(user_id, start_date=None, end_date=None):
+    return pending_rows(await recurring_rules(user_id), start_date, end_date)
+
+async def detach_occurrence(transaction_id, user_id, changes=None):
+    target = detach_target(await recurring_rules(user_id) if user_id is not None else [], transaction_id)
+    if target is None:
+        return None
+    rule, n, day, updates = target
+    if changes is None:
+        claimed = (await db.update_recurring(rule["id"], updates, user_id, claim(rule))).data
+        return occurrence_row(rule, n, day) if claimed else None
+    stored = await store_occurrences(rule, updates, [{**occurrence_row(rule, n, day, stored=True), **changes}])
+    return stored[0] if stored else None
+
+# The currency the user's summaries, budgets and exports are reported in
+async def user_currency(user_id):
+    return base_currency((await db.get_profile(user_id)).data)
+
+# Budget re-checks run after the response, as background tasks
+_budget_checks = set()
+
+async def _check_budget(user_id):
+    try:
+        await aevaluate_user(db, user_id)
+    except Exception as e:
+        record_service_error("BudgetMonitor", "evaluate_user", e)
+
+# Re-check the user's budget alerts after a write that can raise this month's
+# spend (rows=None: the budget itself changed). A failed check never fails the write.
+def check_budget(user_id, rows=None):
+    if not BUDGET_ALERTS_ENABLED or (rows is not None and not affects_current_month(rows)):
+        return
+    task = asyncio.create_task(_check_budget(user_id))
+    _budget_checks.add(task)
+    task.add_done_callback(_budget_checks.discard)
+
+# Wait for pending budget re-checks (call on shutdown)
+async def drain_budget_checks():
+    if _budget_checks:
+        await asyncio.gather(*_budget_checks, return_exceptions=True)
+
+# =========================
+# ASYNC PROFILE SERVICE
+# =========================
+class AsyncProfileService:
+
+    async def add_profile(self, username, email=None, password=None):
+        if not username or not password:
+            return {"Success": False, "Message": "Username and password required"}
+        try:
+            # the unique constraints on username/email decide, no check-then-insert race
+            result = await db.create_profile(username, email, password)
+            if result.data:
+                return {"Success": True, "Message": "Profile added successfully"}
+            else:
+                return {"Success": False, "Message": "Failed to add profile"}
+        except Exception as e:
+            if db.is_unique_violation(e):
+                return {"Success": False, "Message": "User already exists"}
+            return error_result("AsyncProfileService", "add_profile", e)
+
+    async def list_profiles(self):
+        try:
+            result = await db.get_all_profiles()
+            return {"Success": True, "Data": [public_profile(p) for p in result.data]}
+        except Exception as e:
+            return error_result("AsyncProfileService", "list_profiles", e)
+
+    async def get_profile(self, profile_id):
+        try:
+            result = await db.get_profile(profile_id)
+            return {"Success": True, "Data": public_profile(result.data)}
+        except Exception as e:
+            return error_result("AsyncProfileService", "get_profile", e)
+
+    async def update_profile(self, profile_id, username):
+        try:
+            result = await db.update_profile(profile_id, {"username": username})
+            return {"Success": True, "Message": "Profile updated successfully"}
+        except Exception as e:
+            return error_result("AsyncProfileService", "update_profile", e)
+
+    # Base currency and the currencies the exchange-rate table knows
+    async def get_currencies(self, profile_id):
+        try:
+            return {"Success": True, "Data": currencies_data(await user_currency(profile_id))}
+        except Exception as e:
+            return error_result("AsyncProfileService", "get_currencies", e)
+
+    # Currency the user's summaries, budgets and exports are reported in
+    async def set_base_currency(self, profile_id, currency):
+        try:
+            currency = normalize_currency(currency)
+            if currency is None:
+                return {"Success": False, "Message": "Currency required"}
+            result = await db.update_profile(profile_id, {"base_currency": currency})
+            if not result.data:
+                return {"Success": False, "Message": "Profile not found"}
+            check_budget(profile_id)
+            return {"Success": True, "Message": f"Base currency set to {currency}"}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("AsyncProfileService", "set_base_currency", e)
+
+    async def delete_profile(self, profile_id):
+        try:
+            result = await db.delete_profile(profile_id)
+            ledgers.drop(profile_id)
+            return {"Success": True, "Message": "Profile deleted successfully"}
+        except Exception as e:
+            return error_result("AsyncProfileService", "delete_profile", e)
+
+    async def login(self, username_or_email, password):
+        try:
+            result = (await db.get_profile_by_login(username_or_email)).data
+            if not result:
+                return {"Success": False, "Message": "User not found. Please register first."}
+            user = login_user(result, username_or_email)
+            if await averify_password(password, user.get("password")):
+                return {"Success": True, "Message": "Login successful", "Data": public_profile(user)}
+            else:
+                return {"Success": False, "Message": "Incorrect password"}
+        except Exception as e:
+            return error_result("AsyncProfileService", "login", e)
+
+# =========================
+# ASYNC TRANSACTION SERVICE
+# =========================
+class AsyncTransactionService:
+    async def add_transaction(self, user_id, category, type_, date, amount, description=None, currency=None):
+        try:
+            currency = normalize_currency(currency) or await user_currency(user_id)
+            if WRITE_QUEUE_ENABLED:
+                row = await insert_queue.submit({"user_id": user_id, "category": category, "type": type_,
+                                                 "date": date, "amount": amount, "description": description,
+                                                 "currency": currency})
+                ledgers.inserted([row])
+                check_budget(user_id, [row])
+                return {"Success": True, "Message": "Transaction added successfully"}
+            result = await db.create_transaction(user_id, category, type_, date, amount, description, currency)
+            ledgers.inserted(result.data)
+            check_budget(user_id, result.data)
+            return {"Success": True, "Message": "Transaction added successfully"}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("AsyncTransactionService", "add_transaction", e)
+
+    # Validate CSV lines and insert them in multi-row batches. Bad rows are
+    # reported by line number instead of aborting the file; the next batch is
+    # parsed while the previous insert is in flight.
+    async def import_transactions(self, user_id, lines, validate, batch_size=IMPORT_BATCH_SIZE):
+        batch_size = max(1, min(int(batch_size or IMPORT_BATCH_SIZE), MAX_IMPORT_BATCH_SIZE))
+        stats = {"imported": 0, "total": 0, "current_month": False}
+        errors = []
+        batch, batch_lines = [], []
+        in_flight = None
+
+        async def insert(rows, row_numbers):
+            try:
+                await db.create_transactions(rows)
+                stats["imported"] += len(rows)
+                stats["current_month"] = stats["current_month"] or affects_current_month(rows)
+            except Exception as e:
+                record_service_error("AsyncTransactionService", "import_transactions", e)
+                errors.extend({"Row": n, "Error": f"Batch insert failed: {str(e)}"} for n in row_numbers)
+
+        try:
+            base = await user_currency(user_id)
+            header = None
+            async for line_no, record in iter_csv_records(lines):
+                if header is None:
+                    header = normalize_header(record)
+                    continue
+                stats["total"] += 1
+                try:
+                    txn = validate(record_to_payload(header, record, user_id))
+                    currency = normalize_currency(txn.currency) or base
+                except Exception as e:
+                    errors.append({"Row": line_no, "Error": describe_error(e)})
+                    continue
+                batch.append({
+                    "user_id": user_id,
+                    "category": txn.category,
+                    "type": txn.type_,
+                    "date": txn.date,
+                    "amount": txn.amount,
+                    "description": txn.description,
+                    "currency": currency
+                })
+                batch_lines.append(line_no)
+                if len(batch) >= batch_size:
+                    if in_flight:
+                        await in_flight
+                    in_flight = asyncio.create_task(insert(batch, batch_lines))
+                    batch, batch_lines = [], []
+            if in_flight:
+                await in_flight
+            if batch:
+                await insert(batch, batch_lines)
+        except Exception as e:
+            return error_result("AsyncTransactionService", "import_transactions", e)
+        finally:
+            # bulk inserts do not return the new rows; reload on next use
+            ledgers.drop(user_id)
+            if stats["current_month"]:
+                check_budget(user_id)
+
+        errors.sort(key=lambda err: err["Row"])
+        return {
+            "Success": True,
+            "Message": f"Imported {stats['imported']} of {stats['total']} rows",
+            "Data": {
+                "imported": stats["imported"],
+                "failed": len(errors),
+                "errors": errors[:MAX_REPORTED_ERRORS]
+            }
+        }
+
+    async def list_transactions(self, user_id, cursor=None, limit=None, sort=None, **filters):
+        try:
+            limit = page_size(limit)
+            column, descending = parse_sort(sort)
+            filters = transaction_filters(**filters)
+            after_value, after_id = decode_cursor(cursor, column)
+            # closing a month stores its occurrences, so generate them before the read
+            pending = pending_after(await pending_transactions(user_id, filters.get("start_date"),
+                                                               filters.get("end_date")),
+                                    column, descending, after_value, after_id, **filters)
+            # fetch one extra row to know whether another page exists
+            result = await db.get_transactions_page(user_id, after_value, after_id, limit + 1, column, descending,
+                                                    **filters)
+            return merged_page(result.data, pending, limit, column, descending)
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("AsyncTransactionService", "list_transactions", e)
+
+    # Every matching row for a user, read from the database one page at a time.
+    # sort/filters are validated by the caller (parse_sort, transaction_filters).
+    async def iter_transactions(self, user_id, limit=MAX_PAGE_SIZE, sort="date", descending=False, **filters):
+        after_value = after_id = None
+        while True:
+            rows = (await db.get_transactions_page.uncached(user_id, after_value, after_id, limit, sort, descending,
+                                                            **filters)).data
+            for row in rows:
+                yield row
+            if len(rows) < limit:
+                return
+            after_value, after_id = cursor_key(rows[-1], sort)
+
+    # iter_transactions with the due recurring occurrences merged in, in the same order
+    async def iter_with_recurring(self, user_id, limit=MAX_PAGE_SIZE, sort="date", descending=False, **filters):
+        pending = pending_after(await pending_transactions(user_id, filters.get("start_date"), filters.get("end_date")),
+                                sort, descending, None, None, **filters)
+        i = 0
+        async for row in self.iter_transactions(user_id, limit, sort, descending, **filters):
+            key = cursor_key(row, sort)
+            while i < len(pending) and (cursor_key(pending[i], sort) > key if descending
+                                        else cursor_key(pending[i], sort) < key):
+                yield pending[i]
+                i += 1
+            yield row
+        for row in pending[i:]:
+            yield row
+
+    # Columnar ledger of all the user's transactions (see src/ledger.py). It is
+    # loaded once, then kept current by this service's writes.
+    async def ledger(self, user_id):
+        ledger = ledgers.get(user_id) if LEDGER_ENABLED else None
+        if ledger is None:
+            generation = ledgers.generation(user_id)
+            rows = [row async for row in self.iter_transactions(user_id)]
+            ledger = await asyncio.to_thread(Ledger.from_rows, rows)
+            if LEDGER_ENABLED:
+                ledgers.install(user_id, ledger, generation)
+        return ledger
+
+    async def get_summary(self, user_id, start_date=None, end_date=None, granularity="month"):
+        if granularity not in GRANULARITIES:
+            return {"Success": False, "Message": f"Granularity must be one of {', '.join(GRANULARITIES)}"}
+        try:
+            currency = await user_currency(user_id)
+            months = rollup_months(start_date, end_date) if granularity == "month" else None
+            pending = await pending_transactions(user_id, start_date, end_date)
+            summary = None
+            if months:
+                summary = rollup_summary((await db.get_rollups(user_id, *months)).data, pending, currency)
+            if summary is None and LEDGER_ENABLED:
+                ledger = reporting_ledger(await self.ledger(user_id), currency, pending)
+                summary = ledger.summary(start_date, end_date, granularity)
+            if summary is None:
+                result = await db.get_transaction_totals(user_id, start_date, end_date)
+                summary = summarize_transactions(result.data + pending, granularity, currency)
+            return {"Success": True, "Data": {**summary, "currency": currency}}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("AsyncTransactionService", "get_summary", e)
+
+    # Totals, per-period flows, top expense categories and the daily running balance
+    async def get_analytics(self, user_id, start_date=None, end_date=None, granularity="month", top=5):
+        try:
+            start_date, end_date, granularity, top = analytics_params(start_date, end_date, granularity, top)
+            currency = await user_currency(user_id)
+            pending = await pending_transactions(user_id, start_date, end_date)
+            ledger = reporting_ledger(await self.ledger(user_id), currency, pending)
+            data = analytics(ledger, start_date, end_date, granularity, top)
+            return {"Success": True, "Data": {**data, "currency": currency}}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("AsyncTransactionService", "get_analytics", e)
+
+    # Spending anomalies flagged for the user (see src/anomalies.py): the offline
+    # job's latest flags, recomputed from the ledger on refresh or first request
+    async def get_anomalies(self, user_id, refresh=False):
+        try:
+            if refresh or await asyncio.to_thread(anomaly_store.computed_at, user_id) is None:
+                ledger = reporting_ledger(await self.ledger(user_id), await user_currency(user_id))
+                flags = await asyncio.to_thread(detect_ledger, user_id, ledger)
+                await asyncio.to_thread(anomaly_store.replace, [user_id], flags)
+            return {"Success": True, "Data": await asyncio.to_thread(anomaly_store.for_user, user_id)}
+        except Exception as e:
+            return error_result("AsyncTransactionService", "get_anomalies", e)
+
+    async def update_transaction(self, transaction_id, updates: dict, user_id=None):
+        try:
+            updates = transaction_updates(updates)
+            if "currency" in updates and updates["currency"] is None:
+                updates["currency"] = await user_currency(user_id)
+            if is_virtual(transaction_id):
+                # a generated occurrence: store it with the changes applied
+                row = await detach_occurrence(transaction_id, user_id, updates)
+                if row is None:
+                    return {"Success": False, "Message": "Transaction not found"}
+                check_budget(user_id, [row])
+                return {"Success": True, "Message": "Transaction updated successfully", "Data": {"id": row["id"]}}
+            result = await db.update_transaction(transaction_id, updates, user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Transaction not found"}
+            ledgers.updated(result.data)
+            check_budget(result.data[0]["user_id"], result.data)
+            return {"Success": True, "Message": "Transaction updated successfully"}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("AsyncTransactionService", "update_transaction", e)
+
+
+    async def delete_transaction(self, transaction_id, user_id=None):
+        try:
+            if is_virtual(transaction_id):
+                if await detach_occurrence(transaction_id, user_id) is None:
+                    return {"Success": False, "Message": "Transaction not found"}
+                return {"Success": True, "Message": "Transaction deleted successfully"}
+            result = await db.delete_transaction(transaction_id, user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Transaction not found"}
+            ledgers.deleted(result.data)
+            return {"Success": True, "Message": "Transaction deleted successfully"}
+        except Exception as e:
+            return error_result("AsyncTransactionService", "delete_transaction", e)
+
+    # Many creates/updates/deletes in a few statements, with a result per operation
+    async def apply_batch(self, user_id, operations):
+        try:
+            plan, results = plan_batch(operations, transaction_fields)
+            outcome = EMPTY_BATCH
+            if plan["creates"]:
+                fill_currency(plan, await user_currency(user_id))
+            if has_work(plan):
+                outcome = await db.apply_transaction_batch(user_id, *batch_arguments(plan))
+            ledgers.applied(outcome)
+            check_budget(user_id, outcome["created"] + outcome["updated"])
+            return finish_batch(plan, results, outcome, "Transaction")
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("AsyncTransactionService", "apply_batch", e)
+
+# =========================
+# ASYNC RECURRING SERVICE
+# =========================
+class AsyncRecurringService:
+    async def add_rule(self, user_id, **fields):
+        try:
+            result = await db.create_recurring(user_id, rule_fields(True, **fields))
+            return {"Success": True, "Message": "Recurring transaction added successfully", "Data": result.data}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("AsyncRecurringService", "add_rule", e)
+
+    async def list_rules(self, user_id):
+        try:
+            return {"Success": True, "Data": await recurring_rules(user_id)}
+        except Exception as e:
+            return error_result("AsyncRecurringService", "list_rules", e)
+
+    async def update_rule(self, rule_id, user_id=None, **fields):
+        try:
+            result = await db.update_recurring(rule_id, rule_fields(False, **fields), user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Recurring transaction not found"}
+            return {"Success": True, "Message": "Recurring transaction updated successfully"}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("AsyncRecurringService", "update_rule", e)
+
+    async def delete_rule(self, rule_id, user_id=None):
+        try:
+            result = await db.delete_recurring(rule_id, user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Recurring transaction not found"}
+            return {"Success": True, "Message": "Recurring transaction deleted successfully"}
+        except Exception as e:
+            return error_result("AsyncRecurringService", "delete_rule", e)
+
+# =========================
+# ASYNC BUDGET SERVICE
+# =========================
+class AsyncBudgetService:
+    async def set_budget(self, user_id, budget):
+        try:
+            result = await db.create_budget(user_id, budget)
+            check_budget(user_id)
+            return {"Success": True, "Message": "Budget set successfully"}
+        except Exception as e:
+            return error_result("AsyncBudgetService", "set_budget", e)
+
+    async def get_budget(self, user_id):
+        try:
+            result = await db.get_budget(user_id)
+            return {"Success": True, "Data": result.data}
+        except Exception as e:
+            return error_result("AsyncBudgetService", "get_budget", e)
+
+    async def update_budget(self, budget_id, new_budget, user_id=None):
+        try:
+            result = await db.update_budget(budget_id, new_budget, user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Budget not found"}
+            check_budget(result.data[0]["user_id"])
+            return {"Success": True, "Message": "Budget updated successfully"}
+        except Exception as e:
+            return error_result("AsyncBudgetService", "update_budget", e)
+
+    async def delete_budget(self, budget_id, user_id=None):
+        try:
+            result = await db.delete_budget(budget_id, user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Budget not found"}
+            check_budget(result.data[0]["user_id"])
+            return {"Success": True, "Message": "Budget deleted successfully"}
+        except Exception as e:
+            return error_result("AsyncBudgetService", "delete_budget", e)
+
+    # Alerts raised for the user, newest first (see src/budget_monitor.py)
+    async def get_alerts(self, user_id):
+        try:
+            return {"Success": True, "Data": await asyncio.to_thread(alert_outbox.for_user, user_id)}
+        except Exception as e:
+            return error_result("AsyncBudgetService", "get_alerts", e)
+
+    async def apply_batch(self, user_id, operations):
+        try:
+            plan, results = plan_batch(operations, budget_fields)
+            outcome = EMPTY_BATCH
+            if has_work(plan):
+                outcome = await db.apply_budget_batch(user_id, *budget_batch_arguments(plan))
+                check_budget(user_id)
+            return finish_batch(plan, results, outcome, "Budget")
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("AsyncBudgetService", "apply_batch", e)
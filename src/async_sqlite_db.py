@@ -0,0 +1,95 @@
+# src/async_sqlite_db.py
+# Async face of src/sqlite_db.py for the API's async services. SQLite calls are
+# short but blocking, so they run on a small dedicated thread pool (each worker
+# keeps its own connection; WAL lets them read concurrently) instead of on the
+# event loop.
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from src import sqlite_db
+from src.sqlite_db import is_unique_violation
+
+SQLITE_WORKERS = int(os.getenv("SQLITE_WORKERS", "4"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=SQLITE_WORKERS, thread_name_prefix="sqlite")
+    return _pool
+
+def _in_thread(fn):
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(_get_pool(), partial(fn, *args, **kwargs))
+    if hasattr(fn, "uncached"):
+        wrapper.uncached = _in_thread(fn.uncached)
+    return wrapper
+
+# Close the worker pool and its connections (call on application shutdown)
+async def close_client():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        await asyncio.get_running_loop().run_in_executor(None, partial(pool.shutdown, wait=True))
+    sqlite_db.close_connections()
+
+# =================
+# PROFILES TABLE
+# =================
+create_profile = _in_thread(sqlite_db.create_profile)
+get_all_profiles = _in_thread(sqlite_db.get_all_profiles)
+get_profile = _in_thread(sqlite_db.get_profile)
+get_profile_by_username = _in_thread(sqlite_db.get_profile_by_username)
+get_profile_by_email = _in_thread(sqlite_db.get_profile_by_email)
+get_profile_by_login = _in_thread(sqlite_db.get_profile_by_login)
+update_profile = _in_thread(sqlite_db.update_profile)
+delete_profile = _in_thread(sqlite_db.delete_profile)
+
+# =====================
+# TRANSACTIONS TABLE
+# =====================
+create_transaction = _in_thread(sqlite_db.create_transaction)
+create_transactions = _in_thread(sqlite_db.create_transactions)
+get_transactions = _in_thread(sqlite_db.get_transactions)
+get_transactions_page = _in_thread(sqlite_db.get_transactions_page)
+get_transaction_totals = _in_thread(sqlite_db.get_transaction_totals)
+update_transaction = _in_thread(sqlite_db.update_transaction)
+delete_transaction = _in_thread(sqlite_db.delete_transaction)
+apply_transaction_batch = _in_thread(sqlite_db.apply_transaction_batch)
+get_rollups = _in_thread(sqlite_db.get_rollups)
+
+# ====================
+# BUDGET TABLE
+# ====================
+create_budget = _in_thread(sqlite_db.create_budget)
+get_budget = _in_thread(sqlite_db.get_budget)
+update_budget = _in_thread(sqlite_db.update_budget)
+delete_budget = _in_thread(sqlite_db.delete_budget)
+apply_budget_batch = _in_thread(sqlite_db.apply_budget_batch)
+
+# =====================
+# BUDGET MONITORING
+# =====================
+get_budget_status_page = _in_thread(sqlite_db.get_budget_status_page)
+
+# =========================
+# RECURRING TRANSACTIONS
+# =========================
+create_recurring = _in_thread(sqlite_db.create_recurring)
+get_recurring = _in_thread(sqlite_db.get_recurring)
+update_recurring = _in_thread(sqlite_db.update_recurring)
+delete_recurring = _in_thread(sqlite_db.delete_recurring)
+
+# =====================
+# BATCH SCANS
+# =====================
+get_transaction_scan_page = _in_thread(sqlite_db.get_transaction_scan_page)
+get_base_currencies = _in_thread(sqlite_db.get_base_currencies)
@@ -0,0 +1,248 @@
+# src/budget_monitor.py
+# Budget monitoring: each user's month-to-date expense total against their
+# budget. The first time in a month that spend crosses one of
+# BUDGET_ALERT_THRESHOLDS (fractions of the budget), an alert is recorded in a
+# local SQLite outbox for a notifier to pick up.
+#
+#   python -m src.budget_monitor --once           # one pass over every user
+#   python -m src.budget_monitor --interval 300   # a pass every 5 minutes
+#
+# A pass reads pages of (user, budget, spend) with one aggregated query per
+# page (db.get_budget_status_page) and evaluates each page with NumPy. A pass
+# that reaches its time budget saves its cursor, and the next pass resumes
+# there. Transaction and budget writes re-evaluate only the writing user
+# (evaluate_user / aevaluate_user), counting the month's due recurring
+# occurrences as well; the paged pass sees them once they are stored.
+#
+# Budgets and spend are in the user's base currency. Users whose month has
+# expenses in other currencies are summed from that month's rows instead,
+# converted in one vectorized pass (src/currency.py).
+import os
+import time
+import asyncio
+import argparse
+import calendar
+from datetime import date, datetime
+import numpy as np
+from src.recurring import pending_rows
+from src.local_store import LocalStore
+from src.currency import convert_rows, base_currency, all_in
+
+BUDGET_ALERTS_ENABLED = os.getenv("BUDGET_ALERTS_ENABLED", "1") == "1"
+BUDGET_ALERT_THRESHOLDS = tuple(sorted(
+    float(t) for t in os.getenv("BUDGET_ALERT_THRESHOLDS", "0.8,1.0").split(",") if t.strip()))
+BUDGET_ALERTS_PATH = os.getenv("BUDGET_ALERTS_PATH", "budget_alerts.db")
+BUDGET_MONITOR_PAGE_SIZE = int(os.getenv("BUDGET_MONITOR_PAGE_SIZE", "1000"))
+BUDGET_MONITOR_TIME_BUDGET = float(os.getenv("BUDGET_MONITOR_TIME_BUDGET", "60"))
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS budget_alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    budget REAL,
+    spent REAL,
+    created_at TEXT,
+    delivered_at TEXT,
+    UNIQUE (user_id, month, threshold)
+);
+CREATE INDEX IF NOT EXISTS budget_alerts_undelivered ON budget_alerts (delivered_at, id);
+CREATE TABLE IF NOT EXISTS budget_monitor_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def current_month():
+    return date.today().isoformat()[:7]
+
+# First and last day of a 'YYYY-MM' month
+def month_bounds(month):
+    return f"{month}-01", f"{month}-{calendar.monthrange(int(month[:4]), int(month[5:7]))[1]:02d}"
+
+# =========================
+# ALERT OUTBOX
+# =========================
+# One alert per (user, month, threshold); recording an alert twice is a no-op,
+# so overlapping passes and write-time checks never duplicate notifications
+class AlertOutbox(LocalStore):
+    SCHEMA = OUTBOX_SCHEMA
+
+    def __init__(self, path=BUDGET_ALERTS_PATH):
+        super().__init__(path)
+
+    # Insert new alerts; returns how many were not already recorded
+    def record(self, alerts):
+        if not alerts:
+            return 0
+        return self._write(lambda conn: conn.executemany(
+            "INSERT OR IGNORE INTO budget_alerts (user_id, month, threshold, budget, spent, created_at) "
+            "VALUES (:user_id, :month, :threshold, :budget, :spent, :created_at)", alerts))[1]
+
+    def for_user(self, user_id, limit=50):
+        return self._select("SELECT * FROM budget_alerts WHERE user_id = ? ORDER BY id DESC LIMIT ?", (user_id, limit))
+
+    # Alerts a notifier has not delivered yet, oldest first
+    def undelivered(self, limit=100):
+        return self._select("SELECT * FROM budget_alerts WHERE delivered_at IS NULL ORDER BY id LIMIT ?", (limit,))
+
+    def mark_delivered(self, alert_ids):
+        alert_ids = list(alert_ids)
+        if alert_ids:
+            self._write(lambda conn: conn.execute(
+                f"UPDATE budget_alerts SET delivered_at = ? WHERE id IN ({', '.join('?' * len(alert_ids))})",
+                [datetime.utcnow().isoformat()] + alert_ids))
+
+    def get_state(self, key):
+        rows = self._select("SELECT value FROM budget_monitor_state WHERE key = ?", (key,))
+        return rows[0]["value"] if rows else None
+
+    def set_state(self, key, value):
+        self._write(lambda conn: conn.execute(
+            "INSERT INTO budget_monitor_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value)))
+
+alert_outbox = AlertOutbox()
+
+# =========================
+# EVALUATION
+# =========================
+# Index of the highest threshold crossed per user (-1 where none is)
+def crossed_thresholds(budgets, spent, thresholds=BUDGET_ALERT_THRESHOLDS):
+    budgets = np.asarray(budgets, dtype=np.float64)
+    spent = np.asarray(spent, dtype=np.float64)
+    ratio = np.divide(spent, budgets, out=np.zeros_like(spent), where=budgets > 0)
+    return np.searchsorted(np.asarray(thresholds), ratio, side="right") - 1
+
+# Alerts for rows of {"user_id", "budget", "spent"}
+def evaluate(rows, month, thresholds=BUDGET_ALERT_THRESHOLDS):
+    if not rows or not thresholds:
+        return []
+    budgets = [r["budget"] or 0.0 for r in rows]
+    spent = [r["spent"] or 0.0 for r in rows]
+    levels = crossed_thresholds(budgets, spent, thresholds)
+    now = datetime.utcnow().isoformat()
+    return [{"user_id": rows[i]["user_id"], "month": month, "threshold": thresholds[levels[i]],
+             "budget": float(budgets[i]), "spent": float(spent[i]), "created_at": now}
+            for i in np.flatnonzero(levels >= 0)]
+
+# Month spend from get_rollups rows plus the month's due recurring occurrences
+# that are not stored yet (get_recurring rows)
+def month_spend(rollup_rows, rules=(), month=None):
+    spent = sum(r["total"] or 0.0 for r in rollup_rows if (r["type"] or "").lower() == "expense")
+    return float(spent + pending_spend(rules, month))
+
+def pending_spend(rules, month):
+    if not rules:
+        return 0.0
+    return float(sum(r["amount"] or 0.0 for r in pending_rows(rules, f"{month}-01")
+                     if r["date"][:7] == month and (r["type"] or "").lower() == "expense"))
+
+# Expense total of transaction rows (get_transaction_totals), each converted to
+# `currency` at the rate of its day
+def converted_spend(rows, currency):
+    expenses = [r for r in rows if (r["type"] or "").lower() == "expense"]
+    return float(convert_rows(expenses, currency).sum())
+
+# Status rows of users with expenses in other currencies this month get their
+# spend recomputed from the month's rows in their base currency
+def convert_status_page(db, rows, month):
+    start, end = month_bounds(month)
+    converted = [row for row in rows if row.get("currency_rows")]
+    for row in converted:
+        row["spent"] = converted_spend(db.get_transaction_totals.uncached(row["user_id"], start, end).data,
+                                       base_currency(row))
+    return len(converted)
+
+# Only expense rows dated in the current month can raise this month's spend
+def affects_current_month(rows):
+    month = current_month()
+    return any((r.get("type") or "").lower() == "expense" and str(r.get("date"))[:7] == month for r in rows or [])
+
+# One pass over every user with a budget, page by page, until done or out of time.
+# Returns counts and whether the pass reached the last user.
+def run_pass(db, outbox=alert_outbox, time_budget=BUDGET_MONITOR_TIME_BUDGET, page_size=BUDGET_MONITOR_PAGE_SIZE,
+             month=None, thresholds=BUDGET_ALERT_THRESHOLDS):
+    month = month or current_month()
+    saved_month, _, saved_user = (outbox.get_state("cursor") or "").partition("|")
+    after_user_id = int(saved_user) if saved_month == month and saved_user else 0
+    stats = {"month": month, "started_after_user": after_user_id, "users": 0, "converted_users": 0, "pages": 0,
+             "alerts": 0, "complete": False}
+    start = time.monotonic()
+    while time.monotonic() - start < time_budget:
+        rows = db.get_budget_status_page(month, after_user_id, page_size).data
+        stats["converted_users"] += convert_status_page(db, rows, month)
+        stats["pages"] += 1
+        stats["users"] += len(rows)
+        stats["alerts"] += outbox.record(evaluate(rows, month, thresholds))
+        if len(rows) < page_size:
+            stats["complete"] = True
+            after_user_id = 0
+            break
+        after_user_id = rows[-1]["user_id"]
+    outbox.set_state("cursor", f"{month}|{after_user_id}")
+    stats["seconds"] = round(time.monotonic() - start, 3)
+    return stats
+
+# Re-check one user after a write (budget and rollup reads are cached)
+def evaluate_user(db, user_id, outbox=alert_outbox, month=None):
+    month = month or current_month()
+    budget = db.get_budget(user_id).data
+    if not budget:
+        return []
+    currency = base_currency(db.get_profile(user_id).data)
+    rules = db.get_recurring(user_id).data
+    rollups = db.get_rollups(user_id, month, month).data
+    if all_in(rollups, currency):
+        spent = month_spend(rollups, rules, month)
+    else:
+        rows = db.get_transaction_totals(user_id, *month_bounds(month)).data
+        spent = converted_spend(rows, currency) + pending_spend(rules, month)
+    alerts = evaluate([{"user_id": user_id, "budget": budget[0]["budget"], "spent": spent}], month)
+    outbox.record(alerts)
+    return alerts
+
+async def aevaluate_user(db, user_id, outbox=alert_outbox, month=None):
+    month = month or current_month()
+    budget = (await db.get_budget(user_id)).data
+    if not budget:
+        return []
+    currency = base_currency((await db.get_profile(user_id)).data)
+    rules = (await db.get_recurring(user_id)).data
+    rollups = (await db.get_rollups(user_id, month, month)).data
+    if all_in(rollups, currency):
+        spent = month_spend(rollups, rules, month)
+    else:
+        rows = (await db.get_transaction_totals(user_id, *month_bounds(month))).data
+        spent = converted_spend(rows, currency) + pending_spend(rules, month)
+    alerts = evaluate([{"user_id": user_id, "budget": budget[0]["budget"], "spent": spent}], month)
+    await asyncio.to_thread(outbox.record, alerts)
+    return alerts
+
+# =========================
+# SCHEDULER
+# =========================
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate every user's month-to-date spend against their budget")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    parser.add_argument("--interval", type=float, default=300, help="seconds between pass starts")
+    parser.add_argument("--time-budget", type=float, default=BUDGET_MONITOR_TIME_BUDGET,
+                        help="seconds a pass may run before it stops and saves its cursor")
+    parser.add_argument("--page-size", type=int, default=BUDGET_MONITOR_PAGE_SIZE)
+    args = parser.parse_args()
+
+    from src.storage import sync_backend
+    db = sync_backend()
+    while True:
+        started = time.monotonic()
+        stats = run_pass(db, time_budget=args.time_budget, page_size=args.page_size)
+        print(f"month={stats['month']} users={stats['users']} converted={stats['converted_users']} "
+              f"pages={stats['pages']} alerts={stats['alerts']} "
+              f"seconds={stats['seconds']} complete={stats['complete']}", flush=True)
+        if args.once:
+            return 0
+        time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,167 @@
+# src/cache.py
+# In-process read-through cache for per-user reads (profiles, budgets,
+# transaction lists and summaries). Entries expire after a TTL, the least
+# recently used entry is evicted when the cache is full, and every write in
+# src/db.py / src/async_db.py evicts the affected user's entries and bumps the
+# user's data version (the API's ETags, see src/responses.py).
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") == "1"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+
+class LRUCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._user_keys = {}            # (namespace, user_id) -> set of keys
+        self._generations = {}          # (namespace, user_id) -> bumped on every invalidation
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def generation(self, key):
+        with self._lock:
+            return self._generations.get((key[0], key[1]), 0)
+
+    # Store a loaded value unless the user was invalidated while it was loading
+    def set(self, key, value, generation=None):
+        namespace, user_id = key[0], key[1]
+        with self._lock:
+            if generation is not None and self._generations.get((namespace, user_id), 0) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            self._user_keys.setdefault((namespace, user_id), set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    # Drop every entry for this user in the given namespaces
+    def invalidate(self, user_id, *namespaces):
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[(namespace, user_id)] = self._generations.get((namespace, user_id), 0) + 1
+                for key in self._user_keys.pop((namespace, user_id), ()):
+                    if self._entries.pop(key, None) is not None:
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+            self._generations.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        keys = self._user_keys.get((key[0], key[1]))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[(key[0], key[1])]
+
+cache = LRUCache()
+
+# Per-user counter bumped by every write that invalidates the user, whether or
+# not caching is enabled. Never reset, so a version names one state of the data.
+class UserVersions:
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        return self._versions.get(user_id, 0)
+
+    def bump(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+versions = UserVersions()
+
+def _key(namespace, fn, args, kwargs):
+    # first positional argument is always the user (or profile) id
+    return (namespace, args[0], fn.__name__, args[1:], tuple(sorted(kwargs.items())))
+
+# Read-through decorator for sync db reads keyed by user
+def cached(namespace):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                return fn(*args, **kwargs)
+            key = _key(namespace, fn, args, kwargs)
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            generation = cache.generation(key)
+            value = fn(*args, **kwargs)
+            cache.set(key, value, generation)
+            return value
+        wrapper.uncached = fn   # for bulk scans that must not fill the cache
+        return wrapper
+    return decorator
+
+# Same for async db reads
+def acached(namespace):
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                return await fn(*args, **kwargs)
+            key = _key(namespace, fn, args, kwargs)
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            generation = cache.generation(key)
+            value = await fn(*args, **kwargs)
+            cache.set(key, value, generation)
+            return value
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+def invalidate_user(user_id, *namespaces):
+    cache.invalidate(user_id, *namespaces)
+    versions.bump(user_id)
+
+# Invalidate the owners of the given rows (rows carry user_id)
+def invalidate_rows(rows, *namespaces):
+    for user_id in {row.get("user_id") for row in rows or []}:
+        if user_id is not None:
+            cache.invalidate(user_id, *namespaces)
+            versions.bump(user_id)
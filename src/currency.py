@@ -0,0 +1,225 @@
+# src/currency.py
+# Multi-currency amounts. A transaction carries a currency (ISO 4217 code);
+# new ones without one are recorded in their owner's base currency
+# (profiles.base_currency, else BASE_CURRENCY), and older rows without one
+# count in the current base currency. Exchange rates come from a local CSV
+# file (FX_RATES_PATH):
+#
+#   date,currency,rate
+#   2024-01-02,EUR,1.0945
+#
+# where rate is the price of one unit of `currency` in FX_QUOTE_CURRENCY, in
+# force from `date` until the currency's next row. Dates before a currency's
+# first row use that first rate.
+#
+# The table is held as one sorted array of (currency, day) keys with the rates
+# beside it, so the rate in force for each of N rows is a single
+# np.searchsorted, and a conversion is a handful of array operations however
+# many rows and currencies there are. The file is re-read when it changes.
+import os
+import re
+import csv
+import logging
+import threading
+import time
+import numpy as np
+
+BASE_CURRENCY = os.getenv("BASE_CURRENCY", "USD").upper()
+FX_QUOTE_CURRENCY = os.getenv("FX_QUOTE_CURRENCY", "USD").upper()
+FX_RATES_PATH = os.getenv("FX_RATES_PATH", "fx_rates.csv")
+FX_RELOAD_SECONDS = float(os.getenv("FX_RELOAD_SECONDS", "60"))
+
+NATIVE = -1                 # currency code of rows without a currency
+_CODE_PATTERN = re.compile(r"^[A-Z]{3}$")
+_DAY_OFFSET = 2 ** 31       # (code, day) -> code * 2**32 + day + 2**31, ordered like the pair
+_FIRST_DAY = -(2 ** 31)     # the quote currency's single rate applies from the start of time
+
+fx_log = logging.getLogger("expense_tracker.fx")
+
+# =========================
+# CURRENCY CODES
+# =========================
+# Process-wide, append-only numbering of currency names, shared by rate tables
+# and ledgers so their codes stay comparable across reloads
+_names = []
+_codes = {}
+_codes_lock = threading.Lock()
+
+def currency_code(name):
+    if not name:
+        return NATIVE
+    code = _codes.get(name)
+    if code is None:
+        with _codes_lock:
+            code = _codes.get(name)
+            if code is None:
+                code = _codes[name] = len(_names)
+                _names.append(name)
+    return code
+
+def currency_name(code):
+    return None if code == NATIVE else _names[code]
+
+# "eur " -> "EUR"; None for no currency. ValueError if it is not a code the rate table knows.
+def normalize_currency(value):
+    if value is None or not str(value).strip():
+        return None
+    value = str(value).strip().upper()
+    if not _CODE_PATTERN.match(value):
+        raise ValueError("currency must be a 3-letter ISO 4217 code")
+    if not fx_rates.table().knows(value):
+        raise ValueError(f"No exchange rates for {value}")
+    return value
+
+# The currency a user's amounts are reported in (profile row, or None for the default)
+def base_currency(profile):
+    return (profile or {}).get("base_currency") or BASE_CURRENCY
+
+# Rows to write, with `currency` filled in where a row names none
+def with_currency(rows, currency):
+    return [{**r, "currency": r.get("currency") or currency} for r in rows]
+
+# True when every row (transactions or rollup buckets) is already in `currency`
+def all_in(rows, currency):
+    return all((r.get("currency") or currency) == currency for r in rows)
+
+# =========================
+# RATE TABLE
+# =========================
+class RateTable:
+    def __init__(self, codes, days, rates, quote=FX_QUOTE_CURRENCY, version=0):
+        quote_code = currency_code(quote)
+        codes = np.append(np.asarray(codes, np.int64), quote_code)
+        days = np.append(np.asarray(days, np.int64), _FIRST_DAY)
+        rates = np.append(np.asarray(rates, np.float64), 1.0)
+        keep = (codes != quote_code) | (days == _FIRST_DAY)   # the quote currency is always 1
+        codes, days, rates = codes[keep], days[keep], rates[keep]
+        order = np.lexsort((days, codes))   # stable: a repeated (currency, day) keeps the later row
+        self.keys = codes[order] * 2 ** 32 + days[order] + _DAY_OFFSET
+        self.rates = rates[order]
+        self.quote = quote
+        self.quote_code = quote_code
+        self.version = version
+        # first position of each currency code in keys, -1 if the table has none
+        self._first = np.full(max(len(_names), 1), -1, np.int64)
+        present, first = np.unique(codes[order], return_index=True)
+        self._first[present] = first
+
+    @classmethod
+    def empty(cls, quote=FX_QUOTE_CURRENCY):
+        return cls([], [], [], quote)
+
+    def knows(self, currency):
+        code = _codes.get(currency)
+        return code is not None and code < len(self._first) and self._first[code] >= 0
+
+    def currencies(self):
+        return sorted(_names[c] for c in np.flatnonzero(self._first >= 0))
+
+    # Rate in force for each (code, day); codes must not be NATIVE
+    def rates_on(self, codes, days):
+        codes = np.asarray(codes, np.int64)
+        first = np.where(codes < len(self._first), self._first[np.minimum(codes, len(self._first) - 1)], -1)
+        if (first < 0).any():
+            missing = sorted({_names[c] for c in np.unique(codes[first < 0])})
+            raise ValueError(f"No exchange rates for {', '.join(missing)}")
+        positions = np.searchsorted(self.keys, codes * 2 ** 32 + np.asarray(days, np.int64) + _DAY_OFFSET,
+                                    side="right") - 1
+        # a row dated before its currency's first rate lands on the previous currency
+        return self.rates[np.maximum(positions, first)]
+
+    # Amounts in currency codes[i] on days[i], in `target`. Rows in target or
+    # without a currency keep their amount; returns `amounts` itself if no row moves.
+    def convert(self, amounts, codes, days, target):
+        target_code = currency_code(target)
+        foreign = np.flatnonzero((codes != NATIVE) & (codes != target_code))
+        if not len(foreign):
+            return amounts
+        factors = self.rates_on(codes[foreign], days[foreign])
+        if target_code != self.quote_code:
+            factors = factors / self.rates_on(np.full(len(foreign), target_code), days[foreign])
+        converted = np.array(amounts, dtype=np.float64)
+        converted[foreign] *= factors
+        return converted
+
+    # Row dicts (currency, date, amount) -> their amounts in `target`, as an array
+    def convert_rows(self, rows, target):
+        amounts = np.fromiter((r.get("amount") or 0.0 for r in rows), np.float64, len(rows))
+        codes = np.fromiter((currency_code(r.get("currency")) for r in rows), np.int64, len(rows))
+        if not ((codes != NATIVE) & (codes != currency_code(target))).any():
+            return amounts
+        days = np.array([str(r["date"])[:10] for r in rows], dtype="datetime64[D]").astype(np.int64)
+        return self.convert(amounts, codes, days, target)
+
+# Rate file -> RateTable. A missing file gives a table that knows only the quote currency.
+def load_rates(path=FX_RATES_PATH, quote=FX_QUOTE_CURRENCY, version=0):
+    if not os.path.exists(path):
+        return RateTable.empty(quote)
+    codes, dates, rates = [], [], []
+    with open(path, newline="") as f:
+        for line, record in enumerate(csv.DictReader(f), start=2):
+            try:
+                currency = record["currency"].strip().upper()
+                rate = float(record["rate"])
+                if not _CODE_PATTERN.match(currency) or not rate > 0:
+                    raise ValueError
+            except (KeyError, TypeError, ValueError, AttributeError):
+                raise ValueError(f"{path}:{line}: expected date,currency,rate with a positive rate")
+            codes.append(currency_code(currency))
+            dates.append(record["date"].strip()[:10])
+            rates.append(rate)
+    days = np.array(dates, dtype="datetime64[D]").astype(np.int64)
+    return RateTable(codes, days, rates, quote, version)
+
+# The current rate table, re-read when the file's mtime changes (checked at
+# most every FX_RELOAD_SECONDS). Tables are immutable and swapped whole. A file
+# that fails to load is logged and skipped until it changes again; the last
+# good table (or an empty one) stays in use.
+class RateStore:
+    def __init__(self, path=FX_RATES_PATH, reload_seconds=FX_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.error = None       # why the current file could not be loaded, if it could not
+        self._table = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def table(self):
+        table = self._table
+        if table is not None and time.monotonic() < self._checked_at + self.reload_seconds:
+            return table
+        with self._lock:
+            if self._table is None or time.monotonic() >= self._checked_at + self.reload_seconds:
+                mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+                if self._table is None or mtime != self._mtime:
+                    self._table = self._load(mtime)
+                    self._mtime = mtime
+                self._checked_at = time.monotonic()
+            return self._table
+
+    def _load(self, mtime):
+        try:
+            table = load_rates(self.path, version=int(mtime or 0))
+        except (ValueError, OSError) as e:
+            self.error = str(e)
+            fx_log.error("exchange rates not reloaded, keeping the previous table: %s", e)
+            return self._table or RateTable.empty()
+        self.error = None
+        return table
+
+    # Drop the loaded table so the next read loads it again
+    def reset(self):
+        with self._lock:
+            self._table = None
+
+    def stats(self):
+        table = self.table()
+        return {"path": self.path, "quote": table.quote, "version": table.version,
+                "currencies": table.currencies(), "rates": len(table.rates), "error": self.error}
+
+fx_rates = RateStore()
+
+# Amounts of row dicts in `currency`, converted with the current rate table
+def convert_rows(rows, currency):
+    return fx_rates.table().convert_rows(rows, currency)
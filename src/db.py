@@ -1,24 +1,52 @@
 import os
+import threading
 from datetime import datetime
-from supabase import create_client
 from dotenv import load_dotenv
-import bcrypt
+from src.passwords import hash_password
+from src.cache import cached, invalidate_user, invalidate_rows
+from src.metrics import timed
+from src.currency import BASE_CURRENCY
 
-# Load environment variables
-load_dotenv()
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_KEY")
+_client = None
+_client_lock = threading.Lock()
 
-supabase = create_client(url, key)
+# Shared client, created on first use: importing this module (workers starting
+# up, the async layer reusing its helpers) needs neither credentials nor the
+# supabase package
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from supabase import create_client
+                load_dotenv()
+                url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+                if not url or not key:
+                    raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set for the supabase backend")
+                _client = create_client(url, key)
+    return _client
+
+# Restrict a row query to the given owner, so one statement both finds the
+# row and rejects another user's id
+def owned(query, user_id=None):
+    return query.eq("user_id", user_id) if user_id is not None else query
+
+# Ids split so that each in_() filter keeps the request URL short
+ID_CHUNK_SIZE = 500
+
+def id_chunks(ids):
+    ids = list(ids)
+    return [ids[i:i + ID_CHUNK_SIZE] for i in range(0, len(ids), ID_CHUNK_SIZE)]
 
 # =================
 # PROFILES TABLE 
 # =================
 
 # Create Profile
+@timed
 def create_profile(username, email=None, password=None):
-    hashed_pw = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode() if password else None
-    return supabase.table("profiles").insert({
+    hashed_pw = hash_password(password) if password else None
+    return get_client().table("profiles").insert({
         "username": username,
         "email": email,
         "password": hashed_pw,
@@ -26,75 +54,359 @@ def create_profile(username, email=None, password=None):
     }).execute()
 
 # Get all profiles
+@timed
 def get_all_profiles():
-    return supabase.table("profiles").select("*").order("created_at").execute()
+    return get_client().table("profiles").select("*").order("created_at").execute()
 
 # Get a single profile by id
+@cached("profile")
+@timed
 def get_profile(profile_id):
-    return supabase.table("profiles").select("*").eq("id", profile_id).single().execute()
+    return get_client().table("profiles").select("*").eq("id", profile_id).single().execute()
 
 # Get profile by username or email
+@timed
 def get_profile_by_username(username):
-    return supabase.table("profiles").select("*").eq("username", username).execute()
+    return get_client().table("profiles").select("*").eq("username", username).execute()
 
+@timed
 def get_profile_by_email(email):
-    return supabase.table("profiles").select("*").eq("email", email).execute()
+    return get_client().table("profiles").select("*").eq("email", email).execute()
+
+# Quote a value for use inside a PostgREST or=(...) filter
+def quote_filter_value(value):
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+# One round trip for login: match on username OR email
+@timed
+def get_profile_by_login(username_or_email):
+    value = quote_filter_value(username_or_email)
+    return get_client().table("profiles").select("*").or_(f"username.eq.{value},email.eq.{value}").limit(2).execute()
+
+# Postgres unique_violation, e.g. a duplicate username/email on insert
+def is_unique_violation(error):
+    return getattr(error, "code", None) == "23505"
 
 # Update profile
+@timed
 def update_profile(profile_id, updates: dict):
     updates["created_at"] = datetime.utcnow().isoformat()
-    return supabase.table("profiles").update(updates).eq("id", profile_id).execute()
+    result = get_client().table("profiles").update(updates).eq("id", profile_id).execute()
+    invalidate_user(profile_id, "profile")
+    return result
 
 # Delete profile
+@timed
 def delete_profile(profile_id):
-    return supabase.table("profiles").delete().eq("id", profile_id).execute() 
+    result = get_client().table("profiles").delete().eq("id", profile_id).execute()
+    invalidate_user(profile_id, "profile", "transactions", "budget")
+    return result
 
 # =====================
 # TRANSACTIONS TABLE 
 # =====================
-def create_transaction(user_id, category, type_, date, amount, description=None):
-    return supabase.table("transactions").insert({
+@timed
+def create_transaction(user_id, category, type_, date, amount, description=None, currency=None):
+    result = get_client().table("transactions").insert({
         "user_id": user_id,
         "category": category,
         "type": type_,        # <-- DB column is 'type', not 'type_'
         "date": date,
         "amount": amount,
         "description": description,
-        "created_at": datetime.utcnow().isoformat()
+        "created_at": datetime.utcnow().isoformat(),
+        "currency": currency
     }).execute()
+    invalidate_rows(result.data, "transactions")
+    return result
+
+# Multi-row insert; rows are dicts with the transactions table's column names.
+# returning=True gives back the inserted rows, in input order.
+@timed
+def create_transactions(rows, returning=False):
+    now = datetime.utcnow().isoformat()
+    rows = [{**row, "created_at": now} for row in rows]
+    from postgrest.types import ReturnMethod
+    result = get_client().table("transactions").insert(
+        rows, returning=ReturnMethod.representation if returning else ReturnMethod.minimal).execute()
+    invalidate_rows(rows, "transactions")
+    return result
 
+@cached("transactions")
+@timed
 def get_transactions(user_id):
-    return supabase.table("transactions").select("*").eq("user_id", user_id).order("date").execute()
+    return get_client().table("transactions").select("*").eq("user_id", user_id).order("date").execute()
+
+# `text` as an ilike pattern that matches only itself, ignoring case
+def like_literal(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# Filters for transaction listings, applied in the database. Served by the
+# (user_id, date, id), (user_id, category, date) and (user_id, amount, id)
+# indexes documented in README.md.
+def filter_transactions(query, start_date=None, end_date=None, categories=None, type_=None,
+                        min_amount=None, max_amount=None, search=None):
+    if start_date:
+        query = query.gte("date", start_date)
+    if end_date:
+        query = query.lte("date", end_date)
+    if categories:
+        query = query.in_("category", list(categories))
+    if type_:
+        query = query.ilike("type", like_literal(type_))
+    if min_amount is not None:
+        query = query.gte("amount", min_amount)
+    if max_amount is not None:
+        query = query.lte("amount", max_amount)
+    if search:
+        query = query.ilike("description", f"%{like_literal(search)}%")
+    return query
+
+# Rows strictly after the cursor row in (sort, id) order
+def keyset_after(query, sort, descending, after_value, after_id):
+    if after_value is None or after_id is None:
+        return query
+    op = "lt" if descending else "gt"
+    value = quote_filter_value(after_value)
+    return query.or_(f"{sort}.{op}.{value},and({sort}.eq.{value},id.{op}.{after_id})")
 
-def update_transaction(transaction_id, updates: dict):
+# Keyset page of a user's transactions, filtered and ordered by (sort, id)
+@cached("transactions")
+@timed
+def get_transactions_page(user_id, after_value=None, after_id=None, limit=100, sort="date", descending=False,
+                          **filters):
+    query = filter_transactions(get_client().table("transactions").select("*").eq("user_id", user_id), **filters)
+    query = keyset_after(query, sort, descending, after_value, after_id)
+    return query.order(sort, desc=descending).order("id", desc=descending).limit(limit).execute()
+
+# Only the columns the summary needs, with the date range applied in the database
+@cached("transactions")
+@timed
+def get_transaction_totals(user_id, start_date=None, end_date=None):
+    query = get_client().table("transactions").select("date,category,type,amount,currency").eq("user_id", user_id)
+    if start_date:
+        query = query.gte("date", start_date)
+    if end_date:
+        query = query.lte("date", end_date)
+    return query.execute()
+
+@timed
+def update_transaction(transaction_id, updates: dict, user_id=None):
     # map type_ to type before updating DB
     if "type_" in updates:
         updates["type"] = updates.pop("type_")
     updates["created_at"] = datetime.utcnow().isoformat()
-    return supabase.table("transactions").update(updates).eq("id", transaction_id).execute()
+    result = owned(get_client().table("transactions").update(updates).eq("id", transaction_id), user_id).execute()
+    invalidate_rows(result.data, "transactions")
+    return result
+
+
+@timed
+def delete_transaction(transaction_id, user_id=None):
+    result = owned(get_client().table("transactions").delete().eq("id", transaction_id), user_id).execute()
+    invalidate_rows(result.data, "transactions")
+    return result
+
+# Creates, updates and deletes of one user's transactions in a handful of
+# statements: one insert, one in_() update per distinct change and one in_()
+# delete. `updates` is [(changes, ids)]. PostgREST has no multi-statement
+# transactions, so a failure part way leaves the earlier statements applied
+# (each with its rollups, which the trigger keeps in step).
+@timed
+def apply_transaction_batch(user_id, creates=(), updates=(), deletes=()):
+    now = datetime.utcnow().isoformat()
+    table = lambda: get_client().table("transactions")
+    created, updated, deleted = [], [], []
+    if creates:
+        created = table().insert([{**row, "user_id": user_id, "created_at": now} for row in creates]).execute().data
+    for changes, ids in updates:
+        for chunk in id_chunks(ids):
+            updated += table().update({**changes, "created_at": now}).eq("user_id", user_id) \
+                .in_("id", chunk).execute().data
+    for chunk in id_chunks(deletes):
+        deleted += table().delete().eq("user_id", user_id).in_("id", chunk).execute().data
+    invalidate_user(user_id, "transactions")
+    return {"created": created, "updated": updated, "deleted": deleted}
+
+# =====================
+# TRANSACTION ROLLUPS
+# =====================
+# Running sum/count per (user_id, month, category, type, currency), kept current
+# by a trigger on transactions (see README), so every write changes its rows and
+# their buckets in one statement. Amounts are summed in their own currency.
+# `python -m src.rollups` rebuilds/verifies them.
+
+def rollup_key(row):
+    return (row["user_id"], str(row["date"])[:7], row.get("category") or "", row.get("type") or "",
+            row.get("currency") or "")
+
+# Aggregate rows into {key: [amount, count]}, signed (+1 insert, -1 removal)
+def rollup_deltas(rows, sign):
+    deltas = {}
+    for row in rows or []:
+        delta = deltas.setdefault(rollup_key(row), [0.0, 0])
+        delta[0] += sign * (row.get("amount") or 0.0)
+        delta[1] += sign
+    return deltas
 
+@cached("transactions")
+@timed
+def get_rollups(user_id, start_month=None, end_month=None):
+    query = get_client().table("transaction_rollups").select("*").eq("user_id", user_id)
+    if start_month:
+        query = query.gte("month", start_month)
+    if end_month:
+        query = query.lte("month", end_month)
+    return query.order("month").execute()
 
-def delete_transaction(transaction_id):
-    return supabase.table("transactions").delete().eq("id", transaction_id).execute()
+# Paged scans used by the rebuild/verify command
+@timed
+def get_transaction_page(offset, limit, user_id=None):
+    query = get_client().table("transactions").select("id,user_id,date,category,type,amount,currency")
+    if user_id is not None:
+        query = query.eq("user_id", user_id)
+    return query.order("id").range(offset, offset + limit - 1).execute()
+
+@timed
+def get_rollup_page(offset, limit, user_id=None):
+    query = get_client().table("transaction_rollups").select("*")
+    if user_id is not None:
+        query = query.eq("user_id", user_id)
+    query = query.order("user_id").order("month").order("category").order("type").order("currency")
+    return query.range(offset, offset + limit - 1).execute()
+
+@timed
+def upsert_rollups(rows):
+    return get_client().table("transaction_rollups").upsert(
+        rows, on_conflict="user_id,month,category,type,currency").execute()
+
+@timed
+def delete_rollup(user_id, month, category, type_, currency=""):
+    return get_client().table("transaction_rollups").delete().eq("user_id", user_id).eq("month", month) \
+        .eq("category", category).eq("type", type_).eq("currency", currency).execute()
 
 # ====================
 # BUDGET TABLE CRUD
 # ====================
+@timed
 def create_budget(user_id, budget):
-    return supabase.table("budget").insert({
+    result = get_client().table("budget").insert({
         "user_id": user_id,
         "budget": budget,
         "created_at": datetime.utcnow().isoformat()
     }).execute()
+    invalidate_user(user_id, "budget")
+    return result
 
+@cached("budget")
+@timed
 def get_budget(user_id):
-    return supabase.table("budget").select("*").eq("user_id", user_id).order("created_at").limit(1).execute()
+    return get_client().table("budget").select("*").eq("user_id", user_id).order("created_at").limit(1).execute()
 
-def update_budget(budget_id, new_budget):
-    return supabase.table("budget").update({
+@timed
+def update_budget(budget_id, new_budget, user_id=None):
+    result = owned(get_client().table("budget").update({
         "budget": new_budget,
         "created_at": datetime.utcnow().isoformat()
-    }).eq("id", budget_id).execute()
+    }).eq("id", budget_id), user_id).execute()
+    invalidate_rows(result.data, "budget")
+    return result
+
+@timed
+def delete_budget(budget_id, user_id=None):
+    result = owned(get_client().table("budget").delete().eq("id", budget_id), user_id).execute()
+    invalidate_rows(result.data, "budget")
+    return result
+
+# Budget creates, updates ([(new_budget, ids)]) and deletes for one user; not atomic (see above)
+@timed
+def apply_budget_batch(user_id, creates=(), updates=(), deletes=()):
+    now = datetime.utcnow().isoformat()
+    table = lambda: get_client().table("budget")
+    created, updated, deleted = [], [], []
+    if creates:
+        created = table().insert([{"user_id": user_id, "budget": b, "created_at": now} for b in creates]).execute().data
+    for new_budget, ids in updates:
+        for chunk in id_chunks(ids):
+            updated += table().update({"budget": new_budget, "created_at": now}).eq("user_id", user_id) \
+                .in_("id", chunk).execute().data
+    for chunk in id_chunks(deletes):
+        deleted += table().delete().eq("user_id", user_id).in_("id", chunk).execute().data
+    invalidate_user(user_id, "budget")
+    return {"created": created, "updated": updated, "deleted": deleted}
+
+# =====================
+# BUDGET MONITORING
+# =====================
+# Budget (earliest row, as in get_budget) and month expense total from the
+# rollups for the next `limit` users with a budget after after_user_id, in
+# user id order: one RPC per page (budget_status_page, see README). As on
+# SQLite, `spent` covers expenses in the user's base currency (or without one)
+# and currency_rows counts the others.
+@timed
+def get_budget_status_page(month, after_user_id=0, limit=1000):
+    return get_client().rpc("budget_status_page", {
+        "p_month": month, "p_after_user_id": after_user_id, "p_limit": limit,
+        "p_base_currency": BASE_CURRENCY
+    }).execute()
+
+# =========================
+# RECURRING TRANSACTIONS
+# =========================
+# Rules only; their occurrences are generated on read (see src/recurring.py)
+@timed
+def create_recurring(user_id, rule: dict):
+    result = get_client().table("recurring_transactions").insert({
+        **rule,
+        "user_id": user_id,
+        "created_at": datetime.utcnow().isoformat()
+    }).execute()
+    invalidate_user(user_id, "recurring")
+    return result
+
+@cached("recurring")
+@timed
+def get_recurring(user_id):
+    return get_client().table("recurring_transactions").select("*").eq("user_id", user_id).order("id").execute()
+
+# expected: column values the rule must still have (compare-and-set); when it
+# no longer does, nothing is updated and .data is empty
+@timed
+def update_recurring(rule_id, updates: dict, user_id=None, expected=None):
+    query = owned(get_client().table("recurring_transactions").update(updates).eq("id", rule_id), user_id)
+    for column, value in (expected or {}).items():
+        query = query.eq(column, value)
+    result = query.execute()
+    invalidate_rows(result.data, "recurring")
+    return result
+
+@timed
+def delete_recurring(rule_id, user_id=None):
+    result = owned(get_client().table("recurring_transactions").delete().eq("id", rule_id), user_id).execute()
+    invalidate_rows(result.data, "recurring")
+    return result
+
+# =====================
+# BATCH SCANS
+# =====================
+SCAN_COLUMNS = "id,user_id,category,type,date,amount,currency"
+
+# Page of every user's transactions after the given row, in (user_id, date, id)
+# order (the transactions_user_date index), with only the columns batch jobs use
+@timed
+def get_transaction_scan_page(after_user_id=None, after_date=None, after_id=None, limit=1000):
+    query = get_client().table("transactions").select(SCAN_COLUMNS)
+    if after_user_id is not None:
+        day = quote_filter_value(after_date)
+        query = query.or_(f"user_id.gt.{after_user_id},and(user_id.eq.{after_user_id},"
+                          f"or(date.gt.{day},and(date.eq.{day},id.gt.{after_id})))")
+    return query.order("user_id").order("date").order("id").limit(limit).execute()
 
-def delete_budget(budget_id):
-    return supabase.table("budget").delete().eq("id", budget_id).execute()
+# {profile id: base_currency or None} for the given profiles (the owners of a scanned batch)
+@timed
+def get_base_currencies(user_ids):
+    currencies = {}
+    for chunk in id_chunks(user_ids):
+        rows = get_client().table("profiles").select("id,base_currency").in_("id", chunk).execute().data
+        currencies.update((r["id"], r.get("base_currency")) for r in rows)
+    return currencies
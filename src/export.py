@@ -0,0 +1,161 @@
+# src/export.py
+# Streaming transaction export. Rows arrive page by page from the database
+# (TransactionService.iter_transactions) and are encoded in chunks of
+# EXPORT_CHUNK_ROWS, so memory is bounded by the chunk size however large the
+# export gets. Parquet is written one row group per chunk; each chunk's bytes
+# are handed to the client as soon as the row group is flushed. Each chunk's
+# amounts are converted to the user's base currency in one vectorized call
+# (base_amount); rows without a currency are listed in the base currency.
+# The async export encodes each chunk on a worker thread, off the event loop.
+import os
+import io
+import asyncio
+import csv
+import json
+from src.currency import convert_rows, BASE_CURRENCY
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+# rows per database read; keep at or below PostgREST's max-rows (1000 on Supabase),
+# a shorter page than requested ends the export
+EXPORT_PAGE_ROWS = int(os.getenv("EXPORT_PAGE_ROWS", "1000"))
+EXPORT_COLUMNS = ("id", "date", "category", "type", "amount", "description", "currency", "base_amount")
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+def _export_row(row):
+    return {"id": row["id"], "date": str(row["date"])[:10], "category": row.get("category"),
+            "type": row.get("type"), "amount": row.get("amount"), "description": row.get("description"),
+            "currency": row.get("currency")}
+
+# Fill in currency and base_amount for a chunk of export rows
+def _in_currency(chunk, currency):
+    for row, amount in zip(chunk, convert_rows(chunk, currency).tolist()):
+        row["currency"] = row["currency"] or currency
+        row["base_amount"] = amount
+    return chunk
+
+class CsvEncoder:
+    def header(self):
+        return self.encode_rows([EXPORT_COLUMNS])
+
+    def encode_rows(self, values):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(values)
+        return buffer.getvalue().encode()
+
+    def encode(self, rows):
+        return self.encode_rows([[row[c] for c in EXPORT_COLUMNS] for row in rows])
+
+    def close(self):
+        return b""
+
+class NdjsonEncoder:
+    def header(self):
+        return b""
+
+    def encode(self, rows):
+        return "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+    def close(self):
+        return b""
+
+# Write-only file object for pyarrow that hands back what was written since the
+# last drain; tell() keeps counting so the Parquet footer offsets stay right
+class _ChunkSink:
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+class ParquetEncoder:
+    def __init__(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet export requires pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.schema = pa.schema([("id", pa.int64()), ("date", pa.date32()), ("category", pa.string()),
+                                 ("type", pa.string()), ("amount", pa.float64()), ("description", pa.string()),
+                                 ("currency", pa.string()), ("base_amount", pa.float64())])
+        self.sink = _ChunkSink()
+        self.writer = pq.ParquetWriter(pa.PythonFile(self.sink, mode="w"), self.schema, compression="snappy")
+
+    def header(self):
+        return b""
+
+    # One row group per chunk
+    def encode(self, rows):
+        pa = self.pa
+        columns = {c: [row[c] for row in rows] for c in EXPORT_COLUMNS}
+        columns["date"] = pa.array(columns["date"]).cast(pa.date32())
+        self.writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+        return self.sink.drain()
+
+    def close(self):
+        self.writer.close()
+        return self.sink.drain()
+
+ENCODERS = {"csv": CsvEncoder, "ndjson": NdjsonEncoder, "parquet": ParquetEncoder}
+
+# Encoder for a format; ValueError for unknown formats or a missing pyarrow
+def encoder_for(fmt):
+    if fmt not in ENCODERS:
+        raise ValueError(f"Format must be one of {', '.join(ENCODERS)}")
+    return ENCODERS[fmt]()
+
+def _encode(encoder, chunk, currency):
+    return encoder.encode(_in_currency(chunk, currency))
+
+def export_chunks(rows, encoder, chunk_rows=EXPORT_CHUNK_ROWS, currency=BASE_CURRENCY):
+    yield encoder.header()
+    chunk = []
+    for row in rows:
+        chunk.append(_export_row(row))
+        if len(chunk) >= chunk_rows:
+            yield _encode(encoder, chunk, currency)
+            chunk = []
+    if chunk:
+        yield _encode(encoder, chunk, currency)
+    yield encoder.close()
+
+# Chunks are encoded one at a time, so the encoder never runs on two threads at once
+async def aexport_chunks(rows, encoder, chunk_rows=EXPORT_CHUNK_ROWS, currency=BASE_CURRENCY):
+    yield encoder.header()
+    chunk = []
+    async for row in rows:
+        chunk.append(_export_row(row))
+        if len(chunk) >= chunk_rows:
+            yield await asyncio.to_thread(_encode, encoder, chunk, currency)
+            chunk = []
+    if chunk:
+        yield await asyncio.to_thread(_encode, encoder, chunk, currency)
+    yield await asyncio.to_thread(encoder.close)
@@ -0,0 +1,80 @@
+# src/importer.py
+# Streaming CSV parsing for bank-statement imports. Lines are decoded and split
+# chunk by chunk, so a 100k-row upload is never held in memory as a whole.
+import codecs
+import csv
+
+CHUNK_SIZE = 64 * 1024
+
+# Column aliases found in bank exports -> TransactionCreate field names
+HEADER_ALIASES = {
+    "type": "type_",
+    "kind": "type_",
+    "transaction date": "date",
+    "value": "amount",
+    "memo": "description",
+    "details": "description",
+}
+# The only columns read from a file; any other column is ignored
+IMPORT_FIELDS = ("date", "category", "type_", "amount", "description", "currency")
+
+# Yield text lines from an UploadFile-like object with an async read()
+async def read_upload_lines(upload, chunk_size=CHUNK_SIZE):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    while True:
+        chunk = await upload.read(chunk_size)
+        buffer += decoder.decode(chunk or b"", final=not chunk)
+        # keep the trailing partial line for the next chunk
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+        if not chunk:
+            break
+    if buffer:
+        yield buffer
+
+# Yield (line_number, record) for each CSV record; quoted fields may span lines
+async def iter_csv_records(lines):
+    pending, start = "", 0
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not pending:
+            start = line_no
+        pending += line
+        if pending.count('"') % 2:
+            continue
+        record = next(csv.reader([pending]), [])
+        pending = ""
+        if any(field.strip() for field in record):
+            yield start, record
+    if pending:
+        yield start, next(csv.reader([pending]), [])
+
+def normalize_header(record):
+    names = []
+    for name in record:
+        name = name.strip().lower()
+        names.append(HEADER_ALIASES.get(name, name))
+    return names
+
+# Map one CSV record onto TransactionCreate fields (validation happens in the caller).
+# The owner is always the importing user, whatever the file's columns say.
+def record_to_payload(header, record, user_id):
+    payload = {}
+    for name, value in zip(header, record):
+        if name not in IMPORT_FIELDS:
+            continue
+        value = value.strip()
+        if name == "amount":
+            value = value.replace(",", "")
+        payload[name] = value or None
+    payload["user_id"] = user_id
+    return payload
+
+# Short, single-line description of a validation error
+def describe_error(error):
+    if hasattr(error, "errors"):
+        return "; ".join(f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in error.errors())
+    return str(error)
@@ -0,0 +1,291 @@
+# src/ledger.py
+# Columnar in-memory ledger for per-user analytics. Each active user's
+# transactions are held as parallel NumPy arrays sorted by (day, id):
+#   ids int64 | days int32 (days since 1970-01-01) | amounts float64
+#   categories int32 (codes into a per-ledger dictionary) | types int8 (TYPES)
+#   currencies int16 (src/currency.py codes, NATIVE for the owner's base currency)
+# Date ranges are two binary searches, and totals, group-bys, running balances
+# and top-N categories are single vectorized passes over the slice.
+#
+# A Ledger is immutable: writes build a new one and LedgerStore swaps it in, so
+# a request always reads one consistent snapshot. The services keep loaded
+# ledgers current on every write (see TransactionService in src/logic.py).
+# Reports read in_currency(base), a copy with every amount converted to the
+# user's base currency, built once per ledger snapshot and rate table.
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from src.currency import currency_code, NATIVE
+
+LEDGER_ENABLED = os.getenv("LEDGER_ENABLED", "1") == "1"
+LEDGER_MAX_USERS = int(os.getenv("LEDGER_MAX_USERS", "1000"))
+LEDGER_TTL_SECONDS = float(os.getenv("LEDGER_TTL_SECONDS", "300"))
+
+TYPES = ("other", "income", "expense")
+INCOME, EXPENSE = 1, 2
+UNCATEGORIZED = "Uncategorized"
+INSERT_SORT_THRESHOLD = 64   # larger batches are merged with one lexsort
+
+# Category dictionaries are shared by successive snapshots, which may be
+# built from several threads at once; new names are added under this lock
+_categories_lock = threading.Lock()
+
+def to_days(dates):
+    return np.array([str(d)[:10] for d in dates], dtype="datetime64[D]").astype(np.int32)
+
+def day_bound(value):
+    return None if value is None else int(np.datetime64(str(value)[:10], "D").astype(np.int64))
+
+def _type_code(value):
+    value = (value or "").lower()
+    return INCOME if value == "income" else EXPENSE if value == "expense" else 0
+
+class Ledger:
+    __slots__ = ("ids", "days", "amounts", "categories", "types", "currencies", "names", "codes", "_balance",
+                 "_converted")
+
+    def __init__(self, ids, days, amounts, categories, types, currencies, names, codes):
+        self.ids, self.days, self.amounts = ids, days, amounts
+        self.categories, self.types, self.currencies = categories, types, currencies
+        self.names = names      # code -> category name (append-only, shared by successive snapshots)
+        self.codes = codes      # category name -> code
+        self._balance = None    # prefix sums of signed amounts, built on first use
+        self._converted = None  # (currency, rate table, Ledger) of the last in_currency call
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, np.int64), np.empty(0, np.int32), np.empty(0, np.float64),
+                   np.empty(0, np.int32), np.empty(0, np.int8), np.empty(0, np.int16), [], {})
+
+    @classmethod
+    def from_rows(cls, rows):
+        ledger = cls.empty()
+        return ledger.with_rows(rows)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ------------------- Writes (return a new Ledger) -------------------
+    def _encode(self, rows):
+        codes, names = self.codes, self.names
+        category_codes = []
+        for row in rows:
+            name = row.get("category") or UNCATEGORIZED
+            code = codes.get(name)
+            if code is None:
+                with _categories_lock:
+                    code = codes.get(name)
+                    if code is None:
+                        code = codes[name] = len(names)
+                        names.append(name)
+            category_codes.append(code)
+        return (np.array([row["id"] for row in rows], dtype=np.int64),
+                to_days([row["date"] for row in rows]),
+                np.array([row.get("amount") or 0.0 for row in rows], dtype=np.float64),
+                np.array(category_codes, dtype=np.int32),
+                np.array([_type_code(row.get("type")) for row in rows], dtype=np.int8),
+                np.array([currency_code(row.get("currency")) for row in rows], dtype=np.int16))
+
+    def with_rows(self, rows):
+        rows = list(rows)
+        if not rows:
+            return self
+        ids, days, amounts, categories, types, currencies = self._encode(rows)
+        if len(rows) > INSERT_SORT_THRESHOLD:
+            ids = np.concatenate([self.ids, ids])
+            days = np.concatenate([self.days, days])
+            order = np.lexsort((ids, days))
+            return Ledger(ids[order], days[order], np.concatenate([self.amounts, amounts])[order],
+                          np.concatenate([self.categories, categories])[order],
+                          np.concatenate([self.types, types])[order],
+                          np.concatenate([self.currencies, currencies])[order], self.names, self.codes)
+        # a few new rows: binary-search their (day, id) slots instead of re-sorting
+        order = np.lexsort((ids, days))
+        positions = []
+        for day, row_id in zip(days[order], ids[order]):
+            lo = int(np.searchsorted(self.days, day, side="left"))
+            hi = int(np.searchsorted(self.days, day, side="right"))
+            positions.append(lo + int(np.searchsorted(self.ids[lo:hi], row_id)))
+        return Ledger(np.insert(self.ids, positions, ids[order]), np.insert(self.days, positions, days[order]),
+                      np.insert(self.amounts, positions, amounts[order]),
+                      np.insert(self.categories, positions, categories[order]),
+                      np.insert(self.types, positions, types[order]),
+                      np.insert(self.currencies, positions, currencies[order]), self.names, self.codes)
+
+    def without_ids(self, ids):
+        ids = list(ids)
+        if not ids or not len(self):
+            return self
+        keep = ~np.isin(self.ids, np.array(ids, dtype=np.int64))
+        if keep.all():
+            return self
+        return Ledger(self.ids[keep], self.days[keep], self.amounts[keep], self.categories[keep],
+                      self.types[keep], self.currencies[keep], self.names, self.codes)
+
+    # Replace rows by id (an update may move a row to another date)
+    def with_updates(self, rows):
+        rows = list(rows)
+        return self.without_ids(row["id"] for row in rows).with_rows(rows)
+
+    # The same rows with every amount in `currency`, converted at the rate in
+    # force on each row's day (see src/currency.py); self if nothing needs converting
+    def in_currency(self, currency, table):
+        converted = self._converted
+        if converted is not None and converted[0] == currency and converted[1] is table:
+            return converted[2]
+        amounts = table.convert(self.amounts, self.currencies, self.days, currency)
+        ledger = self if amounts is self.amounts else Ledger(
+            self.ids, self.days, amounts, self.categories, self.types,
+            np.full(len(self), NATIVE, np.int16), self.names, self.codes)
+        self._converted = (currency, table, ledger)
+        return ledger
+
+    # ------------------- Reads -------------------
+    def _slice(self, start_date=None, end_date=None):
+        start, end = day_bound(start_date), day_bound(end_date)
+        lo = 0 if start is None else int(np.searchsorted(self.days, start, side="left"))
+        hi = len(self) if end is None else int(np.searchsorted(self.days, end, side="right"))
+        return lo, max(lo, hi)
+
+    def _signed(self):
+        return np.where(self.types == INCOME, self.amounts, np.where(self.types == EXPENSE, -self.amounts, 0.0))
+
+    def totals(self, start_date=None, end_date=None):
+        lo, hi = self._slice(start_date, end_date)
+        types, amounts = self.types[lo:hi], self.amounts[lo:hi]
+        income = float(amounts[types == INCOME].sum())
+        expense = float(amounts[types == EXPENSE].sum())
+        return {"count": hi - lo, "income": income, "expense": expense, "net": income - expense}
+
+    # Expense (or income) total per category, largest first
+    def by_category(self, start_date=None, end_date=None, kind=EXPENSE, top=None):
+        lo, hi = self._slice(start_date, end_date)
+        mask = self.types[lo:hi] == kind
+        totals = np.bincount(self.categories[lo:hi][mask], weights=self.amounts[lo:hi][mask],
+                             minlength=len(self.names))
+        present = np.flatnonzero(np.bincount(self.categories[lo:hi][mask], minlength=len(self.names)))
+        ranked = present[np.argsort(-totals[present], kind="stable")]
+        if top is not None:
+            ranked = ranked[:top]
+        return [{"category": self.names[c], "amount": float(totals[c])} for c in ranked]
+
+    def by_period(self, start_date=None, end_date=None, granularity="month"):
+        lo, hi = self._slice(start_date, end_date)
+        if hi == lo:
+            return []
+        days = self.days[lo:hi].astype("datetime64[D]")
+        if granularity == "month":
+            keys = days.astype("datetime64[M]")
+        elif granularity == "week":
+            # 1970-01-01 was a Thursday; shift so weeks start on Monday
+            keys = days - ((self.days[lo:hi].astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+        else:
+            keys = days
+        # rows are sorted by day, so each period is one contiguous run
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        types, amounts = self.types[lo:hi], self.amounts[lo:hi]
+        income = np.add.reduceat(np.where(types == INCOME, amounts, 0.0), starts)
+        expense = np.add.reduceat(np.where(types == EXPENSE, amounts, 0.0), starts)
+        return [{"period": str(p), "income": float(i), "expense": float(e), "net": float(i - e)}
+                for p, i, e in zip(keys[starts], income, expense)]
+
+    # Closing balance (income - expense since the first row) for each day in the range
+    def running_balance(self, start_date=None, end_date=None):
+        if self._balance is None:
+            self._balance = np.concatenate([[0.0], np.cumsum(self._signed())])
+        lo, hi = self._slice(start_date, end_date)
+        if hi == lo:
+            return []
+        days = self.days[lo:hi]
+        last = np.flatnonzero(np.r_[days[1:] != days[:-1], True]) + lo
+        return [{"date": str(d), "balance": float(b)}
+                for d, b in zip(self.days[last].astype("datetime64[D]"), self._balance[last + 1])]
+
+    # Same shape as logic.summarize_transactions
+    def summary(self, start_date=None, end_date=None, granularity="month"):
+        categories = sorted(self.by_category(start_date, end_date), key=lambda c: c["category"])
+        return {"granularity": granularity, **self.totals(start_date, end_date),
+                "categories": categories, "periods": self.by_period(start_date, end_date, granularity)}
+
+# Loaded ledgers of recently active users (LRU, expiring after a TTL so writes
+# made by other workers show up), plus a generation per user so a load that
+# raced with a write is not installed
+class LedgerStore:
+    def __init__(self, max_users=LEDGER_MAX_USERS, ttl=LEDGER_TTL_SECONDS):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._ledgers = OrderedDict()   # user_id -> (expires_at, Ledger)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._ledgers.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._ledgers[user_id]
+                return None
+            self._ledgers.move_to_end(user_id)
+            return entry[1]
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def install(self, user_id, ledger, generation):
+        with self._lock:
+            if self._generations.get(user_id, 0) != generation:
+                return
+            self._ledgers[user_id] = (time.monotonic() + self.ttl, ledger)
+            self._ledgers.move_to_end(user_id)
+            while len(self._ledgers) > self.max_users:
+                self._ledgers.popitem(last=False)
+
+    def _apply(self, user_id, change):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            entry = self._ledgers.get(user_id)
+            if entry is not None:
+                self._ledgers[user_id] = (entry[0], change(entry[1]))
+
+    # Written rows carry user_id; only already-loaded ledgers are touched
+    def inserted(self, rows):
+        for user_id, user_rows in _by_user(rows).items():
+            self._apply(user_id, lambda ledger: ledger.with_rows(user_rows))
+
+    def updated(self, rows):
+        for user_id, user_rows in _by_user(rows).items():
+            self._apply(user_id, lambda ledger: ledger.with_updates(user_rows))
+
+    def deleted(self, rows):
+        for user_id, user_rows in _by_user(rows).items():
+            self._apply(user_id, lambda ledger: ledger.without_ids(r["id"] for r in user_rows))
+
+    # Outcome of an apply_*_batch call: {"created", "updated", "deleted"} rows
+    def applied(self, outcome):
+        self.inserted(outcome["created"])
+        self.updated(outcome["updated"])
+        self.deleted(outcome["deleted"])
+
+    # Forget a user's ledger (e.g. after a bulk insert whose ids are unknown)
+    def drop(self, user_id):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._ledgers.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._ledgers), "rows": sum(len(l) for _, l in self._ledgers.values()),
+                    "max_users": self.max_users, "ttl_seconds": self.ttl}
+
+def _by_user(rows):
+    grouped = {}
+    for row in rows or []:
+        if row.get("user_id") is not None:
+            grouped.setdefault(row["user_id"], []).append(row)
+    return grouped
+
+ledgers = LedgerStore()
@@ -0,0 +1,50 @@
+# src/local_store.py
+# Small node-local SQLite stores for derived data that the API serves but the
+# main database does not hold (budget alerts, anomaly flags). One connection
+# per store, opened on first use and shared by threads under a lock.
+import sqlite3
+import threading
+
+class LocalStore:
+    SCHEMA = ""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.row_factory = sqlite3.Row
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _select(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._connection().execute(sql, params)]
+
+    # Run fn(conn) in one write transaction; returns (fn's result, rows changed)
+    def _write(self, fn):
+        with self._lock:
+            conn = self._connection()
+            before = conn.total_changes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return result, conn.total_changes - before
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
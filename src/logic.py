@@ -1,10 +1,83 @@
-from src.db import (
-    create_profile, get_all_profiles, get_profile, update_profile, delete_profile,
-    create_transaction, get_transactions, update_transaction, delete_transaction,
-    create_budget, get_budget, update_budget, delete_budget,
-    get_profile_by_username, get_profile_by_email
+from src.storage import sync_backend
+from src.services import (
+    GRANULARITIES, MAX_PAGE_SIZE, public_profile, login_user, currencies_data, summarize_transactions,
+    rollup_summary, rollup_months, reporting_ledger, cursor_key, decode_cursor, page_size, merged_page, error_result,
+    parse_sort, transaction_filters, analytics_params, analytics, plan_batch, transaction_fields, transaction_updates,
+    budget_fields, batch_arguments, fill_currency, budget_batch_arguments, has_work, finish_batch, EMPTY_BATCH,
+    pending_after, merge_rows
 )
-import bcrypt
+from src.passwords import verify_password
+from src.metrics import record_service_error
+from src.ledger import Ledger, ledgers, LEDGER_ENABLED
+from src.budget_monitor import alert_outbox, evaluate_user, affects_current_month, BUDGET_ALERTS_ENABLED
+from src.anomalies import anomaly_store, detect_ledger
+from src.currency import base_currency, normalize_currency, with_currency
+from src.recurring import (
+    rule_fields, pending_rows, closing_rules, detach_target, claim, occurrence_row, is_virtual
+)
+
+# Data-access functions of the configured storage backend (see src/storage.py)
+db = sync_backend()
+
+# =========================
+# RECURRING TRANSACTIONS
+# =========================
+# The user's recurring rules, after storing the occurrences of any month that
+# closed since they were last read (see src/recurring.py)
+def recurring_rules(user_id):
+    rules = db.get_recurring(user_id).data
+    closing = closing_rules(rules)
+    for rule, (updates, rows) in closing:
+        store_occurrences(rule, updates, rows)
+    return db.get_recurring(user_id).data if closing else rules
+
+# Claim the rule's state with a compare-and-set update, then insert the rows,
+# in the owner's base currency unless a row names its own. A lost claim means
+# another reader stored them; a failed insert releases it.
+def store_occurrences(rule, updates, rows):
+    if not db.update_recurring(rule["id"], updates, rule["user_id"], claim(rule)).data:
+        return []
+    if not rows:
+        return []
+    try:
+        rows = with_currency(rows, user_currency(rule["user_id"]))
+        inserted = db.create_transactions(rows, returning=True).data
+    except Exception:
+        db.update_recurring(rule["id"], claim(rule), rule["user_id"])
+        raise
+    ledgers.inserted(inserted)
+    return inserted
+
+# Due occurrences not stored yet, in (date, id) order
+def pending_transactions(user_id, start_date=None, end_date=None):
+    return pending_rows(recurring_rules(user_id), start_date, end_date)
+
+# Store one due occurrence on its own, with `changes` applied (None: drop it
+# instead). Returns the stored row, the dropped occurrence, or None if unknown.
+def detach_occurrence(transaction_id, user_id, changes=None):
+    target = detach_target(recurring_rules(user_id) if user_id is not None else [], transaction_id)
+    if target is None:
+        return None
+    rule, n, day, updates = target
+    if changes is None:
+        claimed = db.update_recurring(rule["id"], updates, user_id, claim(rule)).data
+        return occurrence_row(rule, n, day) if claimed else None
+    stored = store_occurrences(rule, updates, [{**occurrence_row(rule, n, day, stored=True), **changes}])
+    return stored[0] if stored else None
+
+# The currency the user's summaries, budgets and exports are reported in
+def user_currency(user_id):
+    return base_currency(db.get_profile(user_id).data)
+
+# Re-check the user's budget alerts after a write that can raise this month's
+# spend (rows=None: the budget itself changed). A failed check never fails the write.
+def check_budget(user_id, rows=None):
+    if not BUDGET_ALERTS_ENABLED or (rows is not None and not affects_current_month(rows)):
+        return
+    try:
+        evaluate_user(db, user_id)
+    except Exception as e:
+        record_service_error("BudgetMonitor", "evaluate_user", e)
 
 # =========================
 # PROFILE SERVICE
@@ -15,100 +88,289 @@ class ProfileService:
         if not username or not password:
             return {"Success": False, "Message": "Username and password required"}
         try:
-            # Check if username/email exists
-            if email:
-                existing = get_profile_by_email(email).data
-            else:
-                existing = get_profile_by_username(username).data
-
-            if existing:
-                return {"Success": False, "Message": "User already exists"}
-            
-            result = create_profile(username, email, password)
+            # the unique constraints on username/email decide, no check-then-insert race
+            result = db.create_profile(username, email, password)
             if result.data:
                 return {"Success": True, "Message": "Profile added successfully"}
             else:
                 return {"Success": False, "Message": "Failed to add profile"}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            if db.is_unique_violation(e):
+                return {"Success": False, "Message": "User already exists"}
+            return error_result("ProfileService", "add_profile", e)
 
     def list_profiles(self):
         try:
-            result = get_all_profiles()
-            return {"Success": True, "Data": result.data}
+            result = db.get_all_profiles()
+            return {"Success": True, "Data": [public_profile(p) for p in result.data]}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("ProfileService", "list_profiles", e)
 
     def get_profile(self, profile_id):
         try:
-            result = get_profile(profile_id)
-            return {"Success": True, "Data": result.data}
+            result = db.get_profile(profile_id)
+            return {"Success": True, "Data": public_profile(result.data)}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("ProfileService", "get_profile", e)
 
     def update_profile(self, profile_id, username):
         try:
-            result = update_profile(profile_id, {"username": username})
+            result = db.update_profile(profile_id, {"username": username})
             return {"Success": True, "Message": "Profile updated successfully"}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("ProfileService", "update_profile", e)
+
+    # Base currency and the currencies the exchange-rate table knows
+    def get_currencies(self, profile_id):
+        try:
+            return {"Success": True, "Data": currencies_data(user_currency(profile_id))}
+        except Exception as e:
+            return error_result("ProfileService", "get_currencies", e)
+
+    # Currency the user's summaries, budgets and exports are reported in
+    def set_base_currency(self, profile_id, currency):
+        try:
+            currency = normalize_currency(currency)
+            if currency is None:
+                return {"Success": False, "Message": "Currency required"}
+            result = db.update_profile(profile_id, {"base_currency": currency})
+            if not result.data:
+                return {"Success": False, "Message": "Profile not found"}
+            check_budget(profile_id)
+            return {"Success": True, "Message": f"Base currency set to {currency}"}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("ProfileService", "set_base_currency", e)
 
     def delete_profile(self, profile_id):
         try:
-            result = delete_profile(profile_id)
+            result = db.delete_profile(profile_id)
+            ledgers.drop(profile_id)
             return {"Success": True, "Message": "Profile deleted successfully"}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("ProfileService", "delete_profile", e)
 
     def login(self, username_or_email, password):
         try:
-            result = get_profile_by_username(username_or_email).data
-            if not result:
-                result = get_profile_by_email(username_or_email).data
+            result = db.get_profile_by_login(username_or_email).data
             if not result:
                 return {"Success": False, "Message": "User not found. Please register first."}
-            user = result[0]
-            if bcrypt.checkpw(password.encode(), user["password"].encode()):
-                return {"Success": True, "Message": "Login successful", "Data": user}
+            user = login_user(result, username_or_email)
+            if verify_password(password, user.get("password")):
+                return {"Success": True, "Message": "Login successful", "Data": public_profile(user)}
             else:
                 return {"Success": False, "Message": "Incorrect password"}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("ProfileService", "login", e)
 
 # =========================
 # TRANSACTION SERVICE
 # =========================
 class TransactionService:
-    def add_transaction(self, user_id, category, type_, date, amount, description=None):
+    def add_transaction(self, user_id, category, type_, date, amount, description=None, currency=None):
         try:
-            result = create_transaction(user_id, category, type_, date, amount, description)
+            currency = normalize_currency(currency) or user_currency(user_id)
+            result = db.create_transaction(user_id, category, type_, date, amount, description, currency)
+            ledgers.inserted(result.data)
+            check_budget(user_id, result.data)
             return {"Success": True, "Message": "Transaction added successfully"}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("TransactionService", "add_transaction", e)
 
-    def list_transactions(self, user_id):
+    def list_transactions(self, user_id, cursor=None, limit=None, sort=None, **filters):
         try:
-            result = get_transactions(user_id)
-            return {"Success": True, "Data": result.data}
+            limit = page_size(limit)
+            column, descending = parse_sort(sort)
+            filters = transaction_filters(**filters)
+            after_value, after_id = decode_cursor(cursor, column)
+            # closing a month stores its occurrences, so generate them before the read
+            pending = pending_after(pending_transactions(user_id, filters.get("start_date"), filters.get("end_date")),
+                                    column, descending, after_value, after_id, **filters)
+            # fetch one extra row to know whether another page exists
+            result = db.get_transactions_page(user_id, after_value, after_id, limit + 1, column, descending, **filters)
+            return merged_page(result.data, pending, limit, column, descending)
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("TransactionService", "list_transactions", e)
+
+    # Every matching row for a user, read from the database one page at a time.
+    # sort/filters are validated by the caller (parse_sort, transaction_filters).
+    def iter_transactions(self, user_id, limit=MAX_PAGE_SIZE, sort="date", descending=False, **filters):
+        after_value = after_id = None
+        while True:
+            rows = db.get_transactions_page.uncached(user_id, after_value, after_id, limit, sort, descending,
+                                                     **filters).data
+            yield from rows
+            if len(rows) < limit:
+                return
+            after_value, after_id = cursor_key(rows[-1], sort)
+
+    # iter_transactions with the due recurring occurrences merged in, in the same order
+    def iter_with_recurring(self, user_id, limit=MAX_PAGE_SIZE, sort="date", descending=False, **filters):
+        pending = pending_after(pending_transactions(user_id, filters.get("start_date"), filters.get("end_date")),
+                                sort, descending, None, None, **filters)
+        return merge_rows(self.iter_transactions(user_id, limit, sort, descending, **filters), pending, sort,
+                          descending)
+
+    # Columnar ledger of all the user's transactions (see src/ledger.py). It is
+    # loaded once, then kept current by this service's writes.
+    def ledger(self, user_id):
+        ledger = ledgers.get(user_id) if LEDGER_ENABLED else None
+        if ledger is None:
+            generation = ledgers.generation(user_id)
+            ledger = Ledger.from_rows(self.iter_transactions(user_id))
+            if LEDGER_ENABLED:
+                ledgers.install(user_id, ledger, generation)
+        return ledger
+
+    def get_summary(self, user_id, start_date=None, end_date=None, granularity="month"):
+        if granularity not in GRANULARITIES:
+            return {"Success": False, "Message": f"Granularity must be one of {', '.join(GRANULARITIES)}"}
+        try:
+            currency = user_currency(user_id)
+            months = rollup_months(start_date, end_date) if granularity == "month" else None
+            pending = pending_transactions(user_id, start_date, end_date)
+            summary = None
+            if months:
+                summary = rollup_summary(db.get_rollups(user_id, *months).data, pending, currency)
+            if summary is None and LEDGER_ENABLED:
+                ledger = reporting_ledger(self.ledger(user_id), currency, pending)
+                summary = ledger.summary(start_date, end_date, granularity)
+            if summary is None:
+                result = db.get_transaction_totals(user_id, start_date, end_date)
+                summary = summarize_transactions(result.data + pending, granularity, currency)
+            return {"Success": True, "Data": {**summary, "currency": currency}}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("TransactionService", "get_summary", e)
 
-    def update_transaction(self, transaction_id, updates: dict):
+    # Totals, per-period flows, top expense categories and the daily running balance
+    def get_analytics(self, user_id, start_date=None, end_date=None, granularity="month", top=5):
         try:
-            if "type_" in updates:
-                updates["type"] = updates.pop("type_")  # map for DB
-            result = update_transaction(transaction_id, updates)
+            start_date, end_date, granularity, top = analytics_params(start_date, end_date, granularity, top)
+            currency = user_currency(user_id)
+            pending = pending_transactions(user_id, start_date, end_date)
+            ledger = reporting_ledger(self.ledger(user_id), currency, pending)
+            data = analytics(ledger, start_date, end_date, granularity, top)
+            return {"Success": True, "Data": {**data, "currency": currency}}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("TransactionService", "get_analytics", e)
+
+    # Spending anomalies flagged for the user (see src/anomalies.py): the offline
+    # job's latest flags, recomputed from the ledger on refresh or first request
+    def get_anomalies(self, user_id, refresh=False):
+        try:
+            if refresh or anomaly_store.computed_at(user_id) is None:
+                ledger = reporting_ledger(self.ledger(user_id), user_currency(user_id))
+                anomaly_store.replace([user_id], detect_ledger(user_id, ledger))
+            return {"Success": True, "Data": anomaly_store.for_user(user_id)}
+        except Exception as e:
+            return error_result("TransactionService", "get_anomalies", e)
+
+    def update_transaction(self, transaction_id, updates: dict, user_id=None):
+        try:
+            updates = transaction_updates(updates)
+            if "currency" in updates and updates["currency"] is None:
+                updates["currency"] = user_currency(user_id)
+            if is_virtual(transaction_id):
+                # a generated occurrence: store it with the changes applied
+                row = detach_occurrence(transaction_id, user_id, updates)
+                if row is None:
+                    return {"Success": False, "Message": "Transaction not found"}
+                check_budget(user_id, [row])
+                return {"Success": True, "Message": "Transaction updated successfully", "Data": {"id": row["id"]}}
+            result = db.update_transaction(transaction_id, updates, user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Transaction not found"}
+            ledgers.updated(result.data)
+            check_budget(result.data[0]["user_id"], result.data)
             return {"Success": True, "Message": "Transaction updated successfully"}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("TransactionService", "update_transaction", e)
 
 
-    def delete_transaction(self, transaction_id):
+    def delete_transaction(self, transaction_id, user_id=None):
         try:
-            result = delete_transaction(transaction_id)
+            if is_virtual(transaction_id):
+                if detach_occurrence(transaction_id, user_id) is None:
+                    return {"Success": False, "Message": "Transaction not found"}
+                return {"Success": True, "Message": "Transaction deleted successfully"}
+            result = db.delete_transaction(transaction_id, user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Transaction not found"}
+            ledgers.deleted(result.data)
             return {"Success": True, "Message": "Transaction deleted successfully"}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("TransactionService", "delete_transaction", e)
+
+    # Many creates/updates/deletes in a few statements, with a result per operation
+    def apply_batch(self, user_id, operations):
+        try:
+            plan, results = plan_batch(operations, transaction_fields)
+            outcome = EMPTY_BATCH
+            if plan["creates"]:
+                fill_currency(plan, user_currency(user_id))
+            if has_work(plan):
+                outcome = db.apply_transaction_batch(user_id, *batch_arguments(plan))
+            ledgers.applied(outcome)
+            check_budget(user_id, outcome["created"] + outcome["updated"])
+            return finish_batch(plan, results, outcome, "Transaction")
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("TransactionService", "apply_batch", e)
+
+# =========================
+# RECURRING SERVICE
+# =========================
+class RecurringService:
+    def add_rule(self, user_id, **fields):
+        try:
+            result = db.create_recurring(user_id, rule_fields(True, **fields))
+            return {"Success": True, "Message": "Recurring transaction added successfully", "Data": result.data}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("RecurringService", "add_rule", e)
+
+    def list_rules(self, user_id):
+        try:
+            return {"Success": True, "Data": recurring_rules(user_id)}
+        except Exception as e:
+            return error_result("RecurringService", "list_rules", e)
+
+    # category, type, amount, description and end_date; they apply to the
+    # occurrences not stored yet (a new schedule is a new rule)
+    def update_rule(self, rule_id, user_id=None, **fields):
+        try:
+            updates = rule_fields(False, **fields)
+            result = db.update_recurring(rule_id, updates, user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Recurring transaction not found"}
+            return {"Success": True, "Message": "Recurring transaction updated successfully"}
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("RecurringService", "update_rule", e)
+
+    # Occurrences already stored stay; set end_date instead to keep this month's
+    def delete_rule(self, rule_id, user_id=None):
+        try:
+            result = db.delete_recurring(rule_id, user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Recurring transaction not found"}
+            return {"Success": True, "Message": "Recurring transaction deleted successfully"}
+        except Exception as e:
+            return error_result("RecurringService", "delete_rule", e)
 
 # =========================
 # BUDGET SERVICE
@@ -116,28 +378,55 @@ class TransactionService:
 class BudgetService:
     def set_budget(self, user_id, budget):
         try:
-            result = create_budget(user_id, budget)
+            result = db.create_budget(user_id, budget)
+            check_budget(user_id)
             return {"Success": True, "Message": "Budget set successfully"}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("BudgetService", "set_budget", e)
 
     def get_budget(self, user_id):
         try:
-            result = get_budget(user_id)
+            result = db.get_budget(user_id)
             return {"Success": True, "Data": result.data}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("BudgetService", "get_budget", e)
 
-    def update_budget(self, budget_id, new_budget):
+    def update_budget(self, budget_id, new_budget, user_id=None):
         try:
-            result = update_budget(budget_id, new_budget)
+            result = db.update_budget(budget_id, new_budget, user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Budget not found"}
+            check_budget(result.data[0]["user_id"])
             return {"Success": True, "Message": "Budget updated successfully"}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("BudgetService", "update_budget", e)
 
-    def delete_budget(self, budget_id):
+    def delete_budget(self, budget_id, user_id=None):
         try:
-            result = delete_budget(budget_id)
+            result = db.delete_budget(budget_id, user_id)
+            if not result.data:
+                return {"Success": False, "Message": "Budget not found"}
+            check_budget(result.data[0]["user_id"])
             return {"Success": True, "Message": "Budget deleted successfully"}
         except Exception as e:
-            return {"Success": False, "Message": f"Error: {str(e)}"}
+            return error_result("BudgetService", "delete_budget", e)
+
+    # Alerts raised for the user, newest first (see src/budget_monitor.py)
+    def get_alerts(self, user_id):
+        try:
+            return {"Success": True, "Data": alert_outbox.for_user(user_id)}
+        except Exception as e:
+            return error_result("BudgetService", "get_alerts", e)
+
+    def apply_batch(self, user_id, operations):
+        try:
+            plan, results = plan_batch(operations, budget_fields)
+            outcome = EMPTY_BATCH
+            if has_work(plan):
+                outcome = db.apply_budget_batch(user_id, *budget_batch_arguments(plan))
+                check_budget(user_id)
+            return finish_batch(plan, results, outcome, "Budget")
+        except ValueError as e:
+            return {"Success": False, "Message": str(e)}
+        except Exception as e:
+            return error_result("BudgetService", "apply_batch", e)
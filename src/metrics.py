@@ -0,0 +1,204 @@
+# src/metrics.py
+# Low-overhead in-process metrics rendered in Prometheus text format at /metrics:
+#   - http_request_seconds / http_request_bytes / http_response_bytes per route
+#   - db_call_seconds, db_calls_total, db_rows_total, db_errors_total per db function
+#   - service_errors_total for the `except Exception` branches in the services
+# Calls slower than METRICS_SLOW_MS (0 = off) are also logged.
+import os
+import time
+import logging
+import threading
+import inspect
+from bisect import bisect_left
+from functools import wraps
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_SLOW_MS = float(os.getenv("METRICS_SLOW_MS", "0"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+
+slow_log = logging.getLogger("expense_tracker.slow")
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}      # (name, labels) -> value
+        self.histograms = {}    # (name, labels) -> Histogram
+        self.help = {}
+        self.collectors = []    # callables returning [(name, labels, value)] gauges
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, labels=(), value=1):
+        self.record(increments=(((name, labels), value),))
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        self.record(observations=(((name, labels), value, buckets),))
+
+    # Apply several updates under one lock acquisition (the lock is most of the cost)
+    def record(self, increments=(), observations=()):
+        with self._lock:
+            counters, histograms = self.counters, self.histograms
+            for key, value in increments:
+                counters[key] = counters.get(key, 0) + value
+            for key, value, buckets in observations:
+                histogram = histograms.get(key)
+                if histogram is None:
+                    histogram = histograms[key] = Histogram(buckets)
+                histogram.observe(value)
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            snapshot = [(k, list(h.counts), h.sum, h.count, h.buckets) for k, h in histograms]
+
+        seen = set()
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), counts, total, count, buckets in snapshot:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, n in zip(list(buckets) + ["+Inf"], counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                header(name, "gauge")
+                lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+registry = Registry()
+registry.describe("http_request_seconds", "API request latency by route")
+registry.describe("http_request_bytes", "Request body size by route")
+registry.describe("http_response_bytes", "Response body size by route")
+registry.describe("db_call_seconds", "Database call latency by function")
+registry.describe("db_calls_total", "Database calls by function")
+registry.describe("db_rows_total", "Rows returned by function")
+registry.describe("db_errors_total", "Database calls that raised, by function")
+registry.describe("service_errors_total", "Errors caught by the service layer")
+
+def _log_if_slow(kind, name, seconds):
+    if METRICS_SLOW_MS and seconds * 1000 >= METRICS_SLOW_MS:
+        slow_log.warning("slow %s %s took %.1f ms", kind, name, seconds * 1000)
+
+def _row_count(result):
+    data = getattr(result, "data", None)
+    if isinstance(data, list):
+        return len(data)
+    return 1 if data else 0
+
+def _record_db(name, seconds, result, error):
+    labels = (("function", name),)
+    increments = [(("db_calls_total", labels), 1)]
+    if error:
+        increments.append((("db_errors_total", labels), 1))
+    else:
+        increments.append((("db_rows_total", labels), _row_count(result)))
+    registry.record(increments, ((("db_call_seconds", labels), seconds, LATENCY_BUCKETS),))
+    _log_if_slow("db", name, seconds)
+
+# Time, count and size every call of a db function (sync or async)
+def timed(fn):
+    if not METRICS_ENABLED:
+        return fn
+    name = fn.__name__
+    if inspect.iscoroutinefunction(fn):
+        @wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception:
+                _record_db(name, time.perf_counter() - start, None, True)
+                raise
+            _record_db(name, time.perf_counter() - start, result, False)
+            return result
+        return async_wrapper
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            _record_db(name, time.perf_counter() - start, None, True)
+            raise
+        _record_db(name, time.perf_counter() - start, result, False)
+        return result
+    return wrapper
+
+def record_service_error(service, operation, error):
+    registry.inc("service_errors_total", (("service", service), ("operation", operation),
+                                          ("error", type(error).__name__)))
+
+# Pure ASGI middleware: latency, request and response size per route template
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        state = {"status": 500, "bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - start
+            route = getattr(scope.get("route"), "path", "unmatched")
+            labels = (("method", scope["method"]), ("route", route))
+            observations = [
+                (("http_request_seconds", labels + (("status", str(state["status"])),)), seconds, LATENCY_BUCKETS),
+                (("http_response_bytes", labels), state["bytes"], SIZE_BUCKETS),
+            ]
+            for name, value in scope.get("headers", ()):
+                if name == b"content-length":
+                    observations.append((("http_request_bytes", labels), int(value), SIZE_BUCKETS))
+                    break
+            registry.record(observations=observations)
+            _log_if_slow("request", f"{scope['method']} {route}", seconds)
@@ -0,0 +1,55 @@
+# src/passwords.py
+# bcrypt hashing/verification on a small dedicated worker pool. bcrypt holds a
+# CPU for tens of milliseconds per call; running it here keeps it off the event
+# loop and out of Starlette's shared threadpool, and caps how many cores a login
+# storm can take.
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="bcrypt")
+    return _pool
+
+def _hash(password):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
+
+def _verify(password, hashed):
+    if not password or not hashed:
+        return False
+    try:
+        return bcrypt.checkpw(password.encode(), hashed.encode())
+    except ValueError:  # not a bcrypt hash
+        return False
+
+# Sync callers block on the pool, so concurrency is still capped at AUTH_WORKERS
+def hash_password(password):
+    return _get_pool().submit(_hash, password).result()
+
+def verify_password(password, hashed):
+    return _get_pool().submit(_verify, password, hashed).result()
+
+async def ahash_password(password):
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), _hash, password)
+
+async def averify_password(password, hashed):
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), _verify, password, hashed)
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
@@ -0,0 +1,188 @@
+# src/recurring.py
+# Recurring transactions. A rule (table recurring_transactions) describes a
+# transaction repeating every `every` days, weeks or months from start_date,
+# optionally until end_date. Occurrences are not written as they come due:
+# reads generate the due occurrences for their window and merge them with the
+# stored rows. An occurrence is stored as an ordinary transaction only when its
+# month closes (close_period) or when it is edited on its own, in the owner's
+# base currency at that time.
+#
+# Per rule, materialized_through is the last date whose occurrences are
+# already stored, and `exceptions` lists the numbers of later occurrences that
+# were edited (stored separately) or deleted, so they are not generated again.
+# Both are claimed with a compare-and-set update, so two readers closing the
+# same month store its occurrences once.
+import calendar
+from datetime import date, timedelta
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+# Occurrence numbers per rule in a virtual id: -(rule_id * OCCURRENCE_SPAN + n)
+OCCURRENCE_SPAN = 1_000_000
+
+def _day(value):
+    return date.fromisoformat(str(value)[:10])
+
+# Validated rule columns. create=False is a partial update of the fields that
+# may change after creation (not frequency, every or start_date)
+def rule_fields(create, category=None, type_=None, amount=None, description=None, frequency=None, every=None,
+                start_date=None, end_date=None):
+    fields = {}
+    for name, value in (("category", category), ("type", type_), ("amount", amount), ("description", description)):
+        if value is not None:
+            fields[name] = value
+    if end_date is not None:
+        fields["end_date"] = _day(end_date).isoformat()
+    if not create:
+        if not fields:
+            raise ValueError("No fields to update")
+        return fields
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Frequency must be one of {', '.join(FREQUENCIES)}")
+    if int(every or 1) < 1:
+        raise ValueError("every must be at least 1")
+    if start_date is None or amount is None or type_ is None:
+        raise ValueError("type_, amount and start_date are required")
+    start = _day(start_date)
+    if end_date is not None and _day(end_date) < start:
+        raise ValueError("end_date must not be before start_date")
+    fields.update({"category": category, "description": description, "frequency": frequency,
+                   "every": int(every or 1), "start_date": start.isoformat(),
+                   "materialized_through": (start - timedelta(days=1)).isoformat(), "exceptions": ""})
+    return fields
+
+def exceptions(rule):
+    return {int(n) for n in (rule.get("exceptions") or "").split(",") if n}
+
+def format_exceptions(numbers):
+    return ",".join(str(n) for n in sorted(numbers))
+
+# Date of occurrence n (0 is start_date); monthly rules keep the start day,
+# clamped to the end of shorter months
+def occurrence_date(rule, n):
+    start = _day(rule["start_date"])
+    every = int(rule.get("every") or 1)
+    if rule["frequency"] == "daily":
+        return start + timedelta(days=n * every)
+    if rule["frequency"] == "weekly":
+        return start + timedelta(weeks=n * every)
+    month = start.month - 1 + n * every
+    year, month = start.year + month // 12, month % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+# Number of the first occurrence on or after `day`
+def first_occurrence(rule, day):
+    start = _day(rule["start_date"])
+    if day <= start:
+        return 0
+    every = int(rule.get("every") or 1)
+    if rule["frequency"] == "monthly":
+        n = ((day.year - start.year) * 12 + day.month - start.month) // every
+    else:
+        step = every * (7 if rule["frequency"] == "weekly" else 1)
+        n = -(-(day - start).days // step)
+    while occurrence_date(rule, n) < day:
+        n += 1
+    return n
+
+# (n, date) of the rule's unstored occurrences between first_day and last_day, inclusive
+def occurrences(rule, first_day, last_day):
+    first_day = max(first_day, _day(rule["materialized_through"]) + timedelta(days=1))
+    if rule.get("end_date"):
+        last_day = min(last_day, _day(rule["end_date"]))
+    skipped = exceptions(rule)
+    n = first_occurrence(rule, first_day)
+    day = occurrence_date(rule, n)
+    while day <= last_day:
+        if n not in skipped:
+            yield n, day
+        n += 1
+        day = occurrence_date(rule, n)
+
+def virtual_id(rule_id, n):
+    return -(rule_id * OCCURRENCE_SPAN + n)
+
+def is_virtual(transaction_id):
+    return transaction_id is not None and transaction_id < 0
+
+def split_virtual_id(transaction_id):
+    return divmod(-transaction_id, OCCURRENCE_SPAN)
+
+# Transaction row for occurrence n (stored=True: the columns to insert)
+def occurrence_row(rule, n, day, stored=False):
+    row = {"user_id": rule["user_id"], "category": rule["category"], "type": rule["type"],
+           "date": day.isoformat(), "amount": rule["amount"], "description": rule["description"]}
+    if not stored:
+        row.update({"id": virtual_id(rule["id"], n), "created_at": None, "recurring_id": rule["id"]})
+    return row
+
+# Due, unstored occurrences of every rule in [start_date, end_date], capped at
+# today, in (date, id) order
+def pending_rows(rules, start_date=None, end_date=None, today=None):
+    today = today or date.today()
+    last_day = min(_day(end_date), today) if end_date else today
+    first_day = _day(start_date) if start_date else date.min
+    rows = [occurrence_row(rule, n, day) for rule in rules for n, day in occurrences(rule, first_day, last_day)]
+    rows.sort(key=lambda r: (r["date"], r["id"]))
+    return rows
+
+# Last day of the month before today's: occurrences up to it are stored
+def closed_through(today=None):
+    today = today or date.today()
+    return today.replace(day=1) - timedelta(days=1)
+
+# (updates, rows) that store the rule's occurrences in months that have
+# closed, or None when there is nothing to close
+def close_period(rule, today=None):
+    through = closed_through(today)
+    if _day(rule["materialized_through"]) >= through:
+        return None
+    rows = [occurrence_row(rule, n, day, stored=True) for n, day in occurrences(rule, date.min, through)]
+    later = {n for n in exceptions(rule) if occurrence_date(rule, n) > through}
+    return {"materialized_through": through.isoformat(), "exceptions": format_exceptions(later)}, rows
+
+# (rule, (updates, rows)) for each rule with a closed month to store
+def closing_rules(rules, today=None):
+    changes = [(rule, close_period(rule, today)) for rule in rules]
+    return [(rule, change) for rule, change in changes if change]
+
+# The rule's state as last read, for compare-and-set updates
+def claim(rule):
+    return {"materialized_through": str(rule["materialized_through"])[:10], "exceptions": rule.get("exceptions") or ""}
+
+# Occurrence n if it is due and not stored yet, else None
+def due_occurrence(rule, n, today=None):
+    day = occurrence_date(rule, n)
+    if n < 0 or n in exceptions(rule) or day <= _day(rule["materialized_through"]) or day > (today or date.today()):
+        return None
+    if rule.get("end_date") and day > _day(rule["end_date"]):
+        return None
+    return day
+
+# (rule, n, day, updates) to store or drop the due occurrence behind a virtual
+# id on its own, or None when the user has no such occurrence
+def detach_target(rules, transaction_id):
+    rule_id, n = split_virtual_id(transaction_id)
+    rule = next((r for r in rules if r["id"] == rule_id), None)
+    day = due_occurrence(rule, n) if rule else None
+    if day is None:
+        return None
+    return rule, n, day, {"exceptions": format_exceptions(exceptions(rule) | {n})}
+
+# In-memory equivalent of db.filter_transactions for generated rows
+def matches(row, start_date=None, end_date=None, categories=None, type_=None, min_amount=None, max_amount=None,
+            search=None):
+    if start_date and row["date"] < start_date:
+        return False
+    if end_date and row["date"] > end_date:
+        return False
+    if categories and row["category"] not in categories:
+        return False
+    if type_ and (row["type"] or "").lower() != type_.lower():
+        return False
+    if min_amount is not None and (row["amount"] is None or row["amount"] < min_amount):
+        return False
+    if max_amount is not None and (row["amount"] is None or row["amount"] > max_amount):
+        return False
+    if search and search.lower() not in (row["description"] or "").lower():
+        return False
+    return True
@@ -0,0 +1,174 @@
+# src/responses.py
+# Response encoding for the API:
+#   - JSON bodies are rendered with orjson when it is installed (stdlib json otherwise)
+#   - bodies of at least COMPRESS_MIN_BYTES are brotli- or gzip-compressed when the
+#     client accepts it; streamed bodies are compressed chunk by chunk
+#   - per-user reads carry a weak ETag built from the user's data version (see
+#     src/cache.py); a request whose If-None-Match still matches gets 304, no body
+# Versions live in each API process, so a write seen by another worker reaches
+# this worker's ETags after at most ETAG_MAX_AGE_SECONDS, like its read cache.
+import os
+import json
+import time
+import zlib
+import secrets
+from datetime import date
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse, Response
+
+from src.cache import versions, CACHE_TTL_SECONDS
+from src.currency import fx_rates
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+ETAG_MAX_AGE_SECONDS = float(os.getenv("ETAG_MAX_AGE_SECONDS", str(CACHE_TTL_SECONDS)))
+
+# Already-compressed formats are sent as they are
+INCOMPRESSIBLE_TYPES = ("application/vnd.apache.parquet", "application/octet-stream", "application/zip",
+                        "application/gzip", "image/")
+# Distinguishes this process's versions from a restarted (reset) process's
+PROCESS_TAG = secrets.token_hex(4)
+
+# =========================
+# JSON
+# =========================
+# One JSON document as bytes (dates and other non-JSON values as strings)
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=str, ensure_ascii=False, separators=(",", ":")).encode()
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+# =========================
+# CONDITIONAL READS
+# =========================
+# Weak validator for everything the user's reads depend on: their data version,
+# the day (due recurring occurrences change with it), the exchange-rate table
+# (converted amounts change with it) and the ETAG_MAX_AGE window
+def user_etag(user_id):
+    window = int(time.time() // ETAG_MAX_AGE_SECONDS) if ETAG_MAX_AGE_SECONDS > 0 else 0
+    return (f'W/"{PROCESS_TAG}-{versions.get(user_id)}-{fx_rates.table().version}-{date.today().toordinal()}'
+            f'-{window}"')
+
+def _matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = tag[2:]   # weak comparison: W/ prefixes are ignored
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+# 304 if the client's copy is current, else the awaited read with its ETag.
+# The tag is taken before reading, so a write during the read only costs a 200 later.
+async def conditional(request, user_id, read):
+    tag = user_etag(user_id)
+    headers = {"ETag": tag, "Cache-Control": "private, no-cache"}
+    if _matches(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+    content = await read()
+    if isinstance(content, dict) and content.get("Success") is False:
+        return FastJSONResponse(content)
+    return FastJSONResponse(content, headers=headers)
+
+# =========================
+# COMPRESSION
+# =========================
+def _accepted(accept_encoding):
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.strip())
+    return accepted
+
+def _choose_encoding(accept_encoding):
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+# (compress, flush, finish) for one response body
+def _compressor(encoding):
+    if encoding == "br":
+        c = brotli.Compressor(quality=BROTLI_QUALITY)
+        return c.process, c.flush, c.finish
+    c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)   # wbits 31: gzip container
+    return c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESS_ENABLED:
+            return await self.app(scope, receive, send)
+        encoding = _choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+class _CompressingSend:
+    def __init__(self, send, encoding, minimum_size):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.passthrough = False
+        self.compressor = None
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            if "content-encoding" in headers or content_type.startswith(INCOMPRESSIBLE_TYPES):
+                self.passthrough = True
+                return await self.send(message)
+            self.start = message   # held until the first body chunk shows the size
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            return await self.send(message)
+
+        body, more = message.get("body", b""), message.get("more_body", False)
+        if self.compressor is None:
+            if not more and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(self.start)
+                return await self.send(message)
+            headers = MutableHeaders(scope=self.start)
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            self.compressor = _compressor(self.encoding)
+            if not more:
+                compress, _, finish = self.compressor
+                body = compress(body) + finish()
+                headers["Content-Length"] = str(len(body))
+                await self.send(self.start)
+                return await self.send({"type": "http.response.body", "body": body})
+            del headers["Content-Length"]
+            await self.send(self.start)
+        compress, flush, finish = self.compressor
+        # flush every chunk so streamed responses keep streaming
+        body = compress(body) + (flush() if more else finish())
+        await self.send({"type": "http.response.body", "body": body, "more_body": more})
@@ -0,0 +1,81 @@
+# src/rollups.py
+# Rebuild / verify the transaction_rollups table from raw transaction rows.
+#
+#   python -m src.rollups                 # verify every user, report drift
+#   python -m src.rollups --user-id 7     # verify one user
+#   python -m src.rollups --fix           # rewrite drifted buckets
+import argparse
+from src.db import (
+    rollup_deltas, get_transaction_page, get_rollup_page,
+    upsert_rollups, delete_rollup
+)
+
+PAGE_SIZE = 1000
+TOLERANCE = 1e-6
+
+def _scan(fetch_page, user_id=None):
+    offset = 0
+    while True:
+        rows = fetch_page(offset, PAGE_SIZE, user_id).data
+        yield from rows
+        if len(rows) < PAGE_SIZE:
+            return
+        offset += PAGE_SIZE
+
+# Recompute what the rollups should be from the raw transactions
+def expected_rollups(user_id=None):
+    return rollup_deltas(_scan(get_transaction_page, user_id), 1)
+
+def stored_rollups(user_id=None):
+    return {
+        (r["user_id"], r["month"], r["category"], r["type"], r.get("currency") or ""): [r["total"], r["count"]]
+        for r in _scan(get_rollup_page, user_id)
+    }
+
+# List every bucket whose stored sum/count differs from the recomputed one
+def find_drift(expected, stored):
+    drift = []
+    for k in sorted(set(expected) | set(stored), key=str):
+        want = expected.get(k, [0.0, 0])
+        have = stored.get(k, [0.0, 0])
+        if abs(want[0] - have[0]) > TOLERANCE or want[1] != have[1]:
+            drift.append({"key": k, "expected": want, "stored": have})
+    return drift
+
+def repair(drift):
+    upserts = []
+    for item in drift:
+        user_id, month, category, type_, currency = item["key"]
+        amount, count = item["expected"]
+        if count == 0:
+            delete_rollup(user_id, month, category, type_, currency)
+        else:
+            upserts.append({"user_id": user_id, "month": month, "category": category,
+                            "type": type_, "currency": currency, "total": amount, "count": count})
+    for i in range(0, len(upserts), PAGE_SIZE):
+        upsert_rollups(upserts[i:i + PAGE_SIZE])
+
+def verify(user_id=None, fix=False):
+    drift = find_drift(expected_rollups(user_id), stored_rollups(user_id))
+    if fix and drift:
+        repair(drift)
+    return drift
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild / verify transaction rollups")
+    parser.add_argument("--user-id", type=int, default=None, help="only check this user")
+    parser.add_argument("--fix", action="store_true", help="rewrite drifted buckets from raw rows")
+    args = parser.parse_args()
+
+    drift = verify(args.user_id, args.fix)
+    for item in drift:
+        user_id, month, category, type_, currency = item["key"]
+        print(f"user={user_id} month={month} category={category!r} type={type_!r} currency={currency!r} "
+              f"expected={item['expected'][0]:.2f}/{item['expected'][1]} "
+              f"stored={item['stored'][0]:.2f}/{item['stored'][1]}")
+    status = "repaired" if args.fix else "found"
+    print(f"{len(drift)} drifted bucket(s) {status}")
+    return 1 if drift and not args.fix else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,375 @@
+# src/services.py
+# Service logic shared by the sync (src/logic.py) and async (src/async_logic.py)
+# services: validation, keyset paging, summaries, batch planning and result
+# payloads. Nothing here touches the database; each service module only makes
+# its backend's calls around these, so the two stay one implementation.
+from src.metrics import record_service_error
+from src.currency import fx_rates, normalize_currency, convert_rows, all_in
+from src.recurring import matches
+import base64
+import calendar
+import heapq
+from datetime import date
+import numpy as np
+
+GRANULARITIES = ("day", "week", "month")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+SORT_COLUMNS = ("date", "amount")
+MAX_SEARCH_LENGTH = 100
+MAX_TOP_CATEGORIES = 50
+
+# =========================
+# KEYSET CURSORS
+# =========================
+# Opaque cursor over (sort value, id) of the last row on a page
+def cursor_key(row, sort="date"):
+    value = str(row["date"])[:10] if sort == "date" else row[sort]
+    return value, row["id"]
+
+def encode_cursor(row, sort="date"):
+    value, row_id = cursor_key(row, sort)
+    return base64.urlsafe_b64encode(f"{sort}|{value}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor, sort="date"):
+    if not cursor:
+        return None, None
+    try:
+        column, value, after_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if column != sort:
+            raise ValueError
+        return (float(value) if sort == "amount" else value), int(after_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+# =========================
+# LISTING FILTERS
+# =========================
+# "date", "-date", "amount" or "-amount" -> (column, descending)
+def parse_sort(sort=None):
+    sort = (sort or "date").strip()
+    column = sort.lstrip("-")
+    if column not in SORT_COLUMNS:
+        raise ValueError(f"Sort must be one of {', '.join(SORT_COLUMNS)} (prefix with - for descending)")
+    return column, sort.startswith("-")
+
+def _iso_date(value, name):
+    try:
+        return date.fromisoformat(str(value)[:10]).isoformat()
+    except ValueError:
+        raise ValueError(f"{name} must be a YYYY-MM-DD date")
+
+# Validated keyword filters for db.get_transactions_page; values are hashable so
+# filtered pages can be cached like any other read
+def transaction_filters(start_date=None, end_date=None, categories=None, type_=None,
+                        min_amount=None, max_amount=None, search=None):
+    filters = {}
+    if start_date:
+        filters["start_date"] = _iso_date(start_date, "start_date")
+    if end_date:
+        filters["end_date"] = _iso_date(end_date, "end_date")
+    if start_date and end_date and filters["start_date"] > filters["end_date"]:
+        raise ValueError("start_date must not be after end_date")
+    categories = tuple(sorted({c.strip() for c in categories or [] if c and c.strip()}))
+    if categories:
+        filters["categories"] = categories
+    if type_ and type_.strip():
+        filters["type_"] = type_.strip()
+    if min_amount is not None:
+        filters["min_amount"] = float(min_amount)
+    if max_amount is not None:
+        filters["max_amount"] = float(max_amount)
+    if min_amount is not None and max_amount is not None and filters["min_amount"] > filters["max_amount"]:
+        raise ValueError("min_amount must not be greater than max_amount")
+    if search and search.strip():
+        filters["search"] = search.strip()[:MAX_SEARCH_LENGTH]
+    return filters
+
+def page_size(limit):
+    return max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+# Trim the look-ahead row and build the page payload
+def build_page(rows, limit, sort="date"):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {"Success": True, "Data": rows,
+            "NextCursor": encode_cursor(rows[-1], sort) if has_more else None}
+
+# Generated occurrences that belong on the page after the cursor, in page order
+def pending_after(pending, sort, descending, after_value, after_id, **filters):
+    rows = [r for r in pending if matches(r, **filters)]
+    if after_value is not None and after_id is not None:
+        after = (after_value, after_id)
+        rows = [r for r in rows if (cursor_key(r, sort) < after if descending else cursor_key(r, sort) > after)]
+    return sorted(rows, key=lambda r: cursor_key(r, sort), reverse=descending)
+
+# Stored rows and generated occurrences, both in page order, as one ordered stream
+def merge_rows(rows, pending, sort="date", descending=False):
+    return heapq.merge(rows, pending, key=lambda r: cursor_key(r, sort), reverse=descending)
+
+# Page payload from the stored rows (fetched with one look-ahead row) and the
+# generated occurrences that belong after the cursor
+def merged_page(rows, pending, limit, sort="date", descending=False):
+    rows = list(merge_rows(rows, pending, sort, descending)) if pending else rows
+    return build_page(rows[:limit + 1], limit, sort)
+
+# Generated occurrences in the transaction_rollups row shape
+def pending_rollups(pending):
+    return [{"month": r["date"][:7], "category": r["category"] or "", "type": r["type"] or "",
+             "total": r["amount"] or 0.0, "count": 1} for r in pending]
+
+# =========================
+# SUMMARY AGGREGATION
+# =========================
+def _period_keys(dates, granularity):
+    days = np.array(dates, dtype="datetime64[D]")
+    if granularity == "month":
+        return days.astype("datetime64[M]").astype(str)
+    if granularity == "week":
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday
+        weekday = (days.astype(np.int64) + 3) % 7
+        return (days - weekday.astype("timedelta64[D]")).astype(str)
+    return days.astype(str)
+
+def _group_sum(keys, amounts):
+    labels, inverse = np.unique(keys, return_inverse=True)
+    return labels, np.bincount(inverse, weights=amounts, minlength=len(labels))
+
+# Category totals (expenses), per-period totals and income/expense/net; amounts
+# are converted to `currency` first when one is given
+def summarize_transactions(rows, granularity="month", currency=None):
+    summary = {"granularity": granularity, "count": len(rows), "income": 0.0, "expense": 0.0,
+               "net": 0.0, "categories": [], "periods": []}
+    if not rows:
+        return summary
+
+    dates = [str(r["date"])[:10] for r in rows]
+    if currency:
+        amounts = convert_rows(rows, currency)
+    else:
+        amounts = np.array([r["amount"] or 0.0 for r in rows], dtype=np.float64)
+    types = np.array([(r["type"] or "").lower() for r in rows])
+    categories = np.array([r["category"] or "Uncategorized" for r in rows])
+    is_income = types == "income"
+    is_expense = types == "expense"
+    periods = _period_keys(dates, granularity)
+
+    income = float(amounts[is_income].sum())
+    expense = float(amounts[is_expense].sum())
+    summary.update({"income": income, "expense": expense, "net": income - expense})
+
+    labels, totals = _group_sum(categories[is_expense], amounts[is_expense])
+    summary["categories"] = [{"category": str(c), "amount": float(a)} for c, a in zip(labels, totals)]
+
+    labels, inverse = np.unique(periods, return_inverse=True)
+    period_income = np.bincount(inverse, weights=np.where(is_income, amounts, 0.0), minlength=len(labels))
+    period_expense = np.bincount(inverse, weights=np.where(is_expense, amounts, 0.0), minlength=len(labels))
+    summary["periods"] = [
+        {"period": str(p), "income": float(i), "expense": float(e), "net": float(i - e)}
+        for p, i, e in zip(labels, period_income, period_expense)
+    ]
+    return summary
+
+# Summary straight from the monthly rollup rows (a handful per user)
+def summarize_rollups(rows):
+    summary = {"granularity": "month", "count": 0, "income": 0.0, "expense": 0.0,
+               "net": 0.0, "categories": [], "periods": []}
+    categories, periods = {}, {}
+    for r in rows:
+        kind = (r["type"] or "").lower()
+        period = periods.setdefault(r["month"], {"period": r["month"], "income": 0.0, "expense": 0.0, "net": 0.0})
+        summary["count"] += r["count"]
+        if kind == "income":
+            summary["income"] += r["total"]
+            period["income"] += r["total"]
+        elif kind == "expense":
+            summary["expense"] += r["total"]
+            period["expense"] += r["total"]
+            category = r["category"] or "Uncategorized"
+            categories[category] = categories.get(category, 0.0) + r["total"]
+        period["net"] = period["income"] - period["expense"]
+    summary["net"] = summary["income"] - summary["expense"]
+    summary["categories"] = [{"category": c, "amount": a} for c, a in sorted(categories.items())]
+    summary["periods"] = [periods[m] for m in sorted(periods)]
+    return summary
+
+# (start_month, end_month) when the range covers whole months, so rollups can answer it
+def rollup_months(start_date=None, end_date=None):
+    try:
+        start_month = end_month = None
+        if start_date:
+            if start_date[8:10] != "01":
+                return None
+            start_month = start_date[:7]
+        if end_date:
+            year, month = int(end_date[:4]), int(end_date[5:7])
+            if int(end_date[8:10]) != calendar.monthrange(year, month)[1]:
+                return None
+            end_month = end_date[:7]
+        return start_month, end_month
+    except (ValueError, IndexError):
+        return None
+
+# Monthly summary from rollup buckets plus the due occurrences, or None when a
+# bucket is in another currency (the caller then converts row by row)
+def rollup_summary(rollups, pending, currency):
+    if not all_in(rollups, currency):
+        return None
+    return summarize_rollups(rollups + pending_rollups(pending))
+
+# =========================
+# LEDGER ANALYTICS
+# =========================
+# The user's ledger in their base currency with the due occurrences added
+def reporting_ledger(ledger, currency, pending=()):
+    ledger = ledger.in_currency(currency, fx_rates.table())
+    return ledger.with_rows(pending) if pending else ledger
+
+def analytics_params(start_date=None, end_date=None, granularity="month", top=5):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularity must be one of {', '.join(GRANULARITIES)}")
+    filters = transaction_filters(start_date=start_date, end_date=end_date)
+    top = max(1, min(int(top or 5), MAX_TOP_CATEGORIES))
+    return filters.get("start_date"), filters.get("end_date"), granularity, top
+
+def analytics(ledger, start_date=None, end_date=None, granularity="month", top=5):
+    return {
+        "granularity": granularity,
+        **ledger.totals(start_date, end_date),
+        "top_categories": ledger.by_category(start_date, end_date, top=top),
+        "periods": ledger.by_period(start_date, end_date, granularity),
+        "balance": ledger.running_balance(start_date, end_date),
+    }
+
+# =========================
+# BATCH MUTATIONS
+# =========================
+BATCH_OPERATIONS = ("create", "update", "delete")
+MAX_BATCH_OPERATIONS = 1000
+TRANSACTION_FIELDS = ("category", "type", "date", "amount", "description", "currency")
+REQUIRED_TRANSACTION_FIELDS = ("category", "type", "date", "amount")
+
+# Column values of a transaction create/update operation ("type_" is accepted for "type")
+def transaction_fields(op, create):
+    fields = {k: op[k] for k in TRANSACTION_FIELDS if k in op}
+    if "type_" in op:
+        fields["type"] = op["type_"]
+    if create:
+        missing = [k for k in REQUIRED_TRANSACTION_FIELDS if fields.get(k) is None]
+        if missing:
+            raise ValueError(f"Missing {', '.join(missing)}")
+    elif not fields:
+        raise ValueError("Nothing to update")
+    if "date" in fields:
+        fields["date"] = _iso_date(fields["date"], "date")
+    if "amount" in fields:
+        fields["amount"] = float(fields["amount"])
+    if "currency" in fields:
+        fields["currency"] = normalize_currency(fields["currency"])
+    return fields
+
+# Changes of a single-transaction update ("type_" is accepted for "type"). An
+# empty currency stays None here: the caller records it in the base currency.
+def transaction_updates(updates):
+    updates = dict(updates)
+    if "type_" in updates:
+        updates["type"] = updates.pop("type_")
+    if "currency" in updates:
+        updates["currency"] = normalize_currency(updates["currency"])
+    return updates
+
+def budget_fields(op, create):
+    if op.get("budget") is None:
+        raise ValueError("Missing budget")
+    return {"budget": float(op["budget"])}
+
+# Split a batch into creates, updates grouped by identical changes (one
+# statement per group) and deletes. Returns (plan, results): results has one
+# entry per operation, already failed for invalid ones.
+def plan_batch(operations, parse_fields):
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f"A batch may hold at most {MAX_BATCH_OPERATIONS} operations")
+    plan = {"creates": [], "updates": {}, "deletes": []}
+    results, seen = [], set()
+    for index, op in enumerate(operations):
+        entry = {"Index": index, "Op": op.get("op"), "Id": op.get("id")}
+        results.append(entry)
+        try:
+            kind = op.get("op")
+            if kind not in BATCH_OPERATIONS:
+                raise ValueError(f"op must be one of {', '.join(BATCH_OPERATIONS)}")
+            if kind == "create":
+                plan["creates"].append((entry, parse_fields(op, True)))
+                continue
+            row_id = op.get("id")
+            if row_id is None:
+                raise ValueError("id is required for update and delete")
+            if row_id in seen:
+                raise ValueError(f"id {row_id} appears more than once in the batch")
+            seen.add(row_id)
+            if kind == "update":
+                changes = tuple(sorted(parse_fields(op, False).items()))
+                plan["updates"].setdefault(changes, []).append((entry, row_id))
+            else:
+                plan["deletes"].append((entry, row_id))
+        except (ValueError, TypeError) as e:
+            entry.update({"Success": False, "Message": str(e)})
+    return plan, results
+
+# Arguments for db.apply_*_batch: creates, [(changes, ids)], ids
+def batch_arguments(plan):
+    return ([fields for _, fields in plan["creates"]],
+            [(dict(changes), [row_id for _, row_id in group]) for changes, group in plan["updates"].items()],
+            [row_id for _, row_id in plan["deletes"]])
+
+# Budget variant: creates and updates carry just the amount
+def budget_batch_arguments(plan):
+    creates, updates, deletes = batch_arguments(plan)
+    return [c["budget"] for c in creates], [(changes["budget"], ids) for changes, ids in updates], deletes
+
+def has_work(plan):
+    return bool(plan["creates"] or plan["updates"] or plan["deletes"])
+
+# Fill in each operation's result from the rows the database returned
+def finish_batch(plan, results, outcome, noun):
+    for (entry, _), row in zip(plan["creates"], outcome["created"]):
+        entry.update({"Id": row["id"], "Success": True, "Data": row})
+    updated = {row["id"]: row for row in outcome["updated"]}
+    deleted = {row["id"] for row in outcome["deleted"]}
+    for group in plan["updates"].values():
+        for entry, row_id in group:
+            found = row_id in updated
+            entry.update({"Success": True, "Data": updated[row_id]} if found else
+                         {"Success": False, "Message": f"{noun} not found"})
+    for entry, row_id in plan["deletes"]:
+        entry.update({"Success": True} if row_id in deleted else {"Success": False, "Message": f"{noun} not found"})
+    applied = sum(1 for entry in results if entry["Success"])
+    return {"Success": True, "Message": f"{applied} of {len(results)} operations applied", "Data": results}
+
+EMPTY_BATCH = {"created": [], "updated": [], "deleted": []}
+
+# Creates without a currency are recorded in the user's current base currency
+def fill_currency(plan, currency):
+    for _, fields in plan["creates"]:
+        fields["currency"] = fields.get("currency") or currency
+
+# =========================
+# PROFILES AND RESULTS
+# =========================
+# Profile as returned to clients: never include the password hash
+def public_profile(user):
+    return {k: v for k, v in user.items() if k != "password"}
+
+# The profile a login matched: a username match wins over someone else's email
+# that happens to be equal
+def login_user(rows, username_or_email):
+    return next((u for u in rows if u["username"] == username_or_email), rows[0])
+
+# Base currency and the currencies the exchange-rate table knows
+def currencies_data(base):
+    return {"base_currency": base, "currencies": fx_rates.table().currencies()}
+
+# Result for a service's catch-all error branch; counted in /metrics
+def error_result(service, operation, error):
+    record_service_error(service, operation, error)
+    return {"Success": False, "Message": f"Error: {str(error)}"}
@@ -0,0 +1,55 @@
+# src/sessions.py
+# Signed, expiring session tokens issued by /login. A token is
+# base64(payload).base64(hmac-sha256(payload)); checking one is a single HMAC,
+# and tokens already verified are remembered in memory so repeat requests skip
+# even that. bcrypt only ever runs on /login.
+import os
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from src.cache import LRUCache
+
+# Set SESSION_SECRET in .env when running more than one worker, otherwise each
+# process signs with its own random secret.
+SESSION_SECRET = (os.getenv("SESSION_SECRET") or secrets.token_hex(32)).encode()
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(12 * 3600)))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+
+_verified = LRUCache(max_entries=SESSION_CACHE_SIZE, ttl=300)
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(payload):
+    return hmac.new(SESSION_SECRET, payload.encode(), hashlib.sha256).digest()
+
+def issue_token(user_id, ttl=SESSION_TTL_SECONDS):
+    payload = _b64encode(json.dumps({"uid": user_id, "exp": int(time.time()) + ttl}).encode())
+    return f"{payload}.{_b64encode(_sign(payload))}"
+
+# user_id for a valid, unexpired token, otherwise None
+def verify_token(token):
+    if not token:
+        return None
+    now = time.time()
+    hit, entry = _verified.get(("session", token))
+    if hit:
+        user_id, expires = entry
+        return user_id if expires > now else None
+    try:
+        payload, signature = token.split(".")
+        if not hmac.compare_digest(_b64decode(signature), _sign(payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    if claims.get("exp", 0) <= now:
+        return None
+    _verified.set(("session", token), (claims["uid"], claims["exp"]))
+    return claims["uid"]
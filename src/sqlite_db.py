@@ -0,0 +1,570 @@
+# src/sqlite_db.py
+# Embedded storage backend (STORAGE_BACKEND=sqlite): the same functions as
+# src/db.py on a local SQLite database in WAL mode, so single-node deployments
+# and tests need no external service. Readers never block the writer in WAL,
+# every query is parameterized SQL from a fixed set (sqlite3 keeps the compiled
+# statements per connection), and monthly rollups are kept by triggers, so a
+# write and its rollup change commit together.
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from src.passwords import hash_password
+from src.cache import cached, invalidate_user, invalidate_rows
+from src.metrics import timed
+from src.currency import BASE_CURRENCY
+
+SQLITE_PATH = os.getenv("SQLITE_PATH", "expense_tracker.db")
+STATEMENT_CACHE_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL UNIQUE,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    email TEXT UNIQUE,
+    password TEXT,
+    base_currency TEXT
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER REFERENCES profiles(id),
+    category TEXT,
+    type TEXT,
+    date TEXT,
+    amount REAL,
+    description TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    currency TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_user_date ON transactions (user_id, date, id);
+DROP INDEX IF EXISTS transactions_user_category;
+CREATE INDEX IF NOT EXISTS transactions_user_category_date ON transactions (user_id, category, date);
+CREATE INDEX IF NOT EXISTS transactions_user_amount ON transactions (user_id, amount, id);
+CREATE TABLE IF NOT EXISTS budget (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER REFERENCES profiles(id),
+    budget REAL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS budget_user_created ON budget (user_id, created_at);
+CREATE TABLE IF NOT EXISTS recurring_transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER REFERENCES profiles(id),
+    category TEXT,
+    type TEXT,
+    amount REAL,
+    description TEXT,
+    frequency TEXT NOT NULL,
+    every INTEGER NOT NULL DEFAULT 1,
+    start_date TEXT NOT NULL,
+    end_date TEXT,
+    materialized_through TEXT NOT NULL,
+    exceptions TEXT NOT NULL DEFAULT '',
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS recurring_transactions_user ON recurring_transactions (user_id);
+"""
+
+# Monthly running totals per (user_id, month, category, type, currency), as on
+# Supabase. Triggers apply each transaction write to its buckets inside the
+# writing statement; a database that predates the table gets it filled from
+# its transactions, in the same write transaction that creates it.
+ROLLUP_SCHEMA = """
+BEGIN IMMEDIATE;
+CREATE TABLE IF NOT EXISTS transaction_rollups (
+    user_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    category TEXT NOT NULL DEFAULT '',
+    type TEXT NOT NULL DEFAULT '',
+    currency TEXT NOT NULL DEFAULT '',
+    total REAL NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, month, category, type, currency)
+) WITHOUT ROWID;
+INSERT INTO transaction_rollups (user_id, month, category, type, currency, total, count)
+    SELECT user_id, substr(date, 1, 7), coalesce(category, ''), coalesce(type, ''), coalesce(currency, ''),
+           coalesce(sum(amount), 0), count(*)
+    FROM transactions WHERE NOT EXISTS (SELECT 1 FROM transaction_rollups)
+    GROUP BY 1, 2, 3, 4, 5;
+CREATE TRIGGER IF NOT EXISTS transactions_rollup_insert AFTER INSERT ON transactions BEGIN
+    INSERT INTO transaction_rollups (user_id, month, category, type, currency, total, count)
+    VALUES (NEW.user_id, substr(NEW.date, 1, 7), coalesce(NEW.category, ''), coalesce(NEW.type, ''),
+            coalesce(NEW.currency, ''), coalesce(NEW.amount, 0), 1)
+    ON CONFLICT (user_id, month, category, type, currency) DO UPDATE
+        SET total = total + excluded.total, count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_rollup_delete AFTER DELETE ON transactions BEGIN
+    UPDATE transaction_rollups SET total = total - coalesce(OLD.amount, 0), count = count - 1
+    WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category = coalesce(OLD.category, '')
+      AND type = coalesce(OLD.type, '') AND currency = coalesce(OLD.currency, '');
+    DELETE FROM transaction_rollups WHERE user_id = OLD.user_id AND count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_rollup_update
+AFTER UPDATE OF user_id, date, category, type, amount, currency ON transactions BEGIN
+    UPDATE transaction_rollups SET total = total - coalesce(OLD.amount, 0), count = count - 1
+    WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category = coalesce(OLD.category, '')
+      AND type = coalesce(OLD.type, '') AND currency = coalesce(OLD.currency, '');
+    INSERT INTO transaction_rollups (user_id, month, category, type, currency, total, count)
+    VALUES (NEW.user_id, substr(NEW.date, 1, 7), coalesce(NEW.category, ''), coalesce(NEW.type, ''),
+            coalesce(NEW.currency, ''), coalesce(NEW.amount, 0), 1)
+    ON CONFLICT (user_id, month, category, type, currency) DO UPDATE
+        SET total = total + excluded.total, count = count + 1;
+    DELETE FROM transaction_rollups WHERE user_id = OLD.user_id AND count <= 0;
+END;
+COMMIT;
+"""
+
+# Columns added after a table was first released: (table, column, type), added
+# to existing databases when the schema is set up
+ADDED_COLUMNS = (
+    ("profiles", "base_currency", "TEXT"),
+    ("transactions", "currency", "TEXT"),
+)
+
+# Columns callers may update (update dicts are turned into SET clauses)
+PROFILE_COLUMNS = {"username", "email", "password", "created_at", "base_currency"}
+TRANSACTION_COLUMNS = {"category", "type", "date", "amount", "description", "created_at", "currency"}
+RECURRING_COLUMNS = {"category", "type", "amount", "description", "frequency", "every", "start_date", "end_date",
+                     "materialized_through", "exceptions", "created_at"}
+SORT_COLUMNS = {"date", "amount"}
+
+# Query result with the same shape as a postgrest response
+class QueryResult:
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+# =================
+# CONNECTIONS
+# =================
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+_schema_ready = False
+
+def _connect():
+    if SQLITE_PATH == ":memory:":
+        # one shared in-memory database for every thread of this process
+        conn = sqlite3.connect("file:expense_tracker?mode=memory&cache=shared", uri=True,
+                               check_same_thread=False, isolation_level=None,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+    else:
+        conn = sqlite3.connect(SQLITE_PATH, check_same_thread=False, isolation_level=None,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+# This thread's connection, opened (and the schema created) on first use
+def get_connection():
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = _connect()
+        with _connections_lock:
+            _connections.append(conn)
+            if not _schema_ready:
+                conn.executescript(SCHEMA)
+                _add_columns(conn)
+                conn.executescript(ROLLUP_SCHEMA)
+                _schema_ready = True
+    return conn
+
+def _add_columns(conn):
+    for table, column, type_ in ADDED_COLUMNS:
+        if column not in {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {type_}")
+
+def close_connections():
+    global _schema_ready
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+        _schema_ready = False
+    _local.__dict__.clear()
+
+def _rows(cursor):
+    return [dict(row) for row in cursor.fetchall()]
+
+def _query(sql, params=()):
+    return QueryResult(_rows(get_connection().execute(sql, params)))
+
+def _date(value):
+    return str(value)[:10] if value else value
+
+def _set_clause(updates, columns):
+    unknown = set(updates) - columns
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(sorted(unknown))}")
+    names = sorted(updates)
+    return ", ".join(f"{name} = ?" for name in names), [updates[name] for name in names]
+
+# Inclusive date bounds as separate conditions, so the (user_id, date) index serves the range
+def _date_range(sql, params, start_date=None, end_date=None):
+    if start_date:
+        sql, params = sql + " AND date >= ?", params + [_date(start_date)]
+    if end_date:
+        sql, params = sql + " AND date <= ?", params + [_date(end_date)]
+    return sql, params
+
+def _owned(sql, params, user_id):
+    return (sql + " AND user_id = ?", params + [user_id]) if user_id is not None else (sql, params)
+
+# Ids split to stay well inside SQLite's bound-parameter limit
+ID_CHUNK_SIZE = 500
+
+def _id_chunks(ids):
+    ids = list(ids)
+    return [ids[i:i + ID_CHUNK_SIZE] for i in range(0, len(ids), ID_CHUNK_SIZE)]
+
+def _placeholders(values):
+    return ", ".join("?" * len(values))
+
+# Run fn(conn) inside one write transaction and return its result
+def _atomic(fn):
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        result = fn(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return result
+
+# SQLite's UNIQUE constraint failure, e.g. a duplicate username/email on insert
+def is_unique_violation(error):
+    return isinstance(error, sqlite3.IntegrityError) and "UNIQUE" in str(error)
+
+# =================
+# PROFILES TABLE
+# =================
+
+@timed
+def create_profile(username, email=None, password=None):
+    hashed_pw = hash_password(password) if password else None
+    return _query("INSERT INTO profiles (username, email, password, created_at) VALUES (?, ?, ?, ?) RETURNING *",
+                  (username, email, hashed_pw, datetime.utcnow().isoformat()))
+
+@timed
+def get_all_profiles():
+    return _query("SELECT * FROM profiles ORDER BY created_at")
+
+@cached("profile")
+@timed
+def get_profile(profile_id):
+    rows = _query("SELECT * FROM profiles WHERE id = ?", (profile_id,)).data
+    if len(rows) != 1:
+        raise LookupError("Profile not found")
+    return QueryResult(rows[0])
+
+@timed
+def get_profile_by_username(username):
+    return _query("SELECT * FROM profiles WHERE username = ?", (username,))
+
+@timed
+def get_profile_by_email(email):
+    return _query("SELECT * FROM profiles WHERE email = ?", (email,))
+
+@timed
+def get_profile_by_login(username_or_email):
+    return _query("SELECT * FROM profiles WHERE username = ? OR email = ? LIMIT 2",
+                  (username_or_email, username_or_email))
+
+@timed
+def update_profile(profile_id, updates: dict):
+    updates["created_at"] = datetime.utcnow().isoformat()
+    assignments, params = _set_clause(updates, PROFILE_COLUMNS)
+    result = _query(f"UPDATE profiles SET {assignments} WHERE id = ? RETURNING *", params + [profile_id])
+    invalidate_user(profile_id, "profile")
+    return result
+
+@timed
+def delete_profile(profile_id):
+    result = _query("DELETE FROM profiles WHERE id = ? RETURNING *", (profile_id,))
+    invalidate_user(profile_id, "profile", "transactions", "budget")
+    return result
+
+# =====================
+# TRANSACTIONS TABLE
+# =====================
+@timed
+def create_transaction(user_id, category, type_, date, amount, description=None, currency=None):
+    result = _query(
+        "INSERT INTO transactions (user_id, category, type, date, amount, description, created_at, currency) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) RETURNING *",
+        (user_id, category, type_, _date(date), amount, description, datetime.utcnow().isoformat(), currency))
+    invalidate_rows(result.data, "transactions")
+    return result
+
+# Multi-row insert in one write transaction. returning=True gives back the
+# inserted rows, in input order (one RETURNING statement per row, same commit).
+@timed
+def create_transactions(rows, returning=False):
+    now = datetime.utcnow().isoformat()
+    sql = ("INSERT INTO transactions (user_id, category, type, date, amount, description, created_at, currency) "
+           "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+    params = [(r["user_id"], r.get("category"), r.get("type"), _date(r.get("date")), r.get("amount"),
+               r.get("description"), now, r.get("currency")) for r in rows]
+
+    def run(conn):
+        if not returning:
+            conn.executemany(sql, params)
+            return []
+        return [row for p in params for row in _rows(conn.execute(sql + " RETURNING *", p))]
+
+    inserted = _atomic(run)
+    invalidate_rows(rows, "transactions")
+    return QueryResult(inserted)
+
+@cached("transactions")
+@timed
+def get_transactions(user_id):
+    return _query("SELECT * FROM transactions WHERE user_id = ? ORDER BY date, id", (user_id,))
+
+# Filters for transaction listings as SQL conditions; see the indexes in SCHEMA
+def _filter_transactions(sql, params, start_date=None, end_date=None, categories=None, type_=None,
+                         min_amount=None, max_amount=None, search=None):
+    sql, params = _date_range(sql, params, start_date, end_date)
+    if categories:
+        sql += f" AND category IN ({', '.join('?' * len(categories))})"
+        params = params + list(categories)
+    if type_:
+        sql, params = sql + " AND type = ? COLLATE NOCASE", params + [type_]
+    if min_amount is not None:
+        sql, params = sql + " AND amount >= ?", params + [min_amount]
+    if max_amount is not None:
+        sql, params = sql + " AND amount <= ?", params + [max_amount]
+    if search:
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        sql, params = sql + " AND description LIKE ? ESCAPE '\\'", params + [f"%{escaped}%"]
+    return sql, params
+
+# Keyset page of a user's transactions, filtered and ordered by (sort, id)
+@cached("transactions")
+@timed
+def get_transactions_page(user_id, after_value=None, after_id=None, limit=100, sort="date", descending=False,
+                          **filters):
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"Cannot sort by {sort}")
+    sql, params = _filter_transactions("SELECT * FROM transactions WHERE user_id = ?", [user_id], **filters)
+    if after_value is not None and after_id is not None:
+        sql += f" AND ({sort}, id) {'<' if descending else '>'} (?, ?)"
+        params = params + [after_value, after_id]
+    direction = "DESC" if descending else "ASC"
+    return _query(f"{sql} ORDER BY {sort} {direction}, id {direction} LIMIT ?", params + [limit])
+
+@cached("transactions")
+@timed
+def get_transaction_totals(user_id, start_date=None, end_date=None):
+    sql, params = _date_range("SELECT date, category, type, amount, currency FROM transactions WHERE user_id = ?",
+                              [user_id], start_date, end_date)
+    return _query(sql, params)
+
+@timed
+def update_transaction(transaction_id, updates: dict, user_id=None):
+    if "type_" in updates:
+        updates["type"] = updates.pop("type_")
+    if "date" in updates:
+        updates["date"] = _date(updates["date"])
+    updates["created_at"] = datetime.utcnow().isoformat()
+    assignments, params = _set_clause(updates, TRANSACTION_COLUMNS)
+    sql, params = _owned(f"UPDATE transactions SET {assignments} WHERE id = ?", params + [transaction_id], user_id)
+    result = _query(sql + " RETURNING *", params)
+    invalidate_rows(result.data, "transactions")
+    return result
+
+@timed
+def delete_transaction(transaction_id, user_id=None):
+    sql, params = _owned("DELETE FROM transactions WHERE id = ?", [transaction_id], user_id)
+    result = _query(sql + " RETURNING *", params)
+    invalidate_rows(result.data, "transactions")
+    return result
+
+# Creates, updates ([(changes, ids)]) and deletes of one user's transactions,
+# all in one write transaction: either every statement applies or none does
+@timed
+def apply_transaction_batch(user_id, creates=(), updates=(), deletes=()):
+    now = datetime.utcnow().isoformat()
+
+    def run(conn):
+        created, updated, deleted = [], [], []
+        for row in creates:
+            created += _rows(conn.execute(
+                "INSERT INTO transactions (user_id, category, type, date, amount, description, created_at, currency) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) RETURNING *",
+                (user_id, row.get("category"), row.get("type"), _date(row.get("date")), row.get("amount"),
+                 row.get("description"), now, row.get("currency"))))
+        for changes, ids in updates:
+            changes = {**changes, "created_at": now}
+            if "date" in changes:
+                changes["date"] = _date(changes["date"])
+            assignments, params = _set_clause(changes, TRANSACTION_COLUMNS)
+            for chunk in _id_chunks(ids):
+                updated += _rows(conn.execute(
+                    f"UPDATE transactions SET {assignments} WHERE user_id = ? AND id IN ({_placeholders(chunk)}) "
+                    "RETURNING *", params + [user_id] + chunk))
+        for chunk in _id_chunks(deletes):
+            deleted += _rows(conn.execute(
+                f"DELETE FROM transactions WHERE user_id = ? AND id IN ({_placeholders(chunk)}) RETURNING *",
+                [user_id] + chunk))
+        return {"created": created, "updated": updated, "deleted": deleted}
+
+    result = _atomic(run)
+    invalidate_user(user_id, "transactions")
+    return result
+
+@cached("transactions")
+@timed
+def get_rollups(user_id, start_month=None, end_month=None):
+    sql, params = "SELECT * FROM transaction_rollups WHERE user_id = ?", [user_id]
+    if start_month:
+        sql, params = sql + " AND month >= ?", params + [start_month]
+    if end_month:
+        sql, params = sql + " AND month <= ?", params + [end_month]
+    return _query(sql + " ORDER BY month", params)
+
+# ====================
+# BUDGET TABLE CRUD
+# ====================
+@timed
+def create_budget(user_id, budget):
+    result = _query("INSERT INTO budget (user_id, budget, created_at) VALUES (?, ?, ?) RETURNING *",
+                    (user_id, budget, datetime.utcnow().isoformat()))
+    invalidate_user(user_id, "budget")
+    return result
+
+@cached("budget")
+@timed
+def get_budget(user_id):
+    return _query("SELECT * FROM budget WHERE user_id = ? ORDER BY created_at LIMIT 1", (user_id,))
+
+@timed
+def update_budget(budget_id, new_budget, user_id=None):
+    sql, params = _owned("UPDATE budget SET budget = ?, created_at = ? WHERE id = ?",
+                         [new_budget, datetime.utcnow().isoformat(), budget_id], user_id)
+    result = _query(sql + " RETURNING *", params)
+    invalidate_rows(result.data, "budget")
+    return result
+
+@timed
+def delete_budget(budget_id, user_id=None):
+    sql, params = _owned("DELETE FROM budget WHERE id = ?", [budget_id], user_id)
+    result = _query(sql + " RETURNING *", params)
+    invalidate_rows(result.data, "budget")
+    return result
+
+# Budget creates, updates ([(new_budget, ids)]) and deletes in one write transaction
+@timed
+def apply_budget_batch(user_id, creates=(), updates=(), deletes=()):
+    now = datetime.utcnow().isoformat()
+
+    def run(conn):
+        created, updated, deleted = [], [], []
+        for budget in creates:
+            created += _rows(conn.execute(
+                "INSERT INTO budget (user_id, budget, created_at) VALUES (?, ?, ?) RETURNING *",
+                (user_id, budget, now)))
+        for new_budget, ids in updates:
+            for chunk in _id_chunks(ids):
+                updated += _rows(conn.execute(
+                    f"UPDATE budget SET budget = ?, created_at = ? "
+                    f"WHERE user_id = ? AND id IN ({_placeholders(chunk)}) RETURNING *",
+                    [new_budget, now, user_id] + chunk))
+        for chunk in _id_chunks(deletes):
+            deleted += _rows(conn.execute(
+                f"DELETE FROM budget WHERE user_id = ? AND id IN ({_placeholders(chunk)}) RETURNING *",
+                [user_id] + chunk))
+        return {"created": created, "updated": updated, "deleted": deleted}
+
+    result = _atomic(run)
+    invalidate_user(user_id, "budget")
+    return result
+
+# =====================
+# BUDGET MONITORING
+# =====================
+# Budget (earliest row, as in get_budget) and month expense total from the
+# rollups for the next `limit` users with a budget after after_user_id, in one
+# query. SQLite's min() picks the budget from the row holding the earliest
+# created_at. `spent` covers expenses in the user's base currency (or without
+# one) and currency_rows counts the others, whose spend the monitor converts.
+@timed
+def get_budget_status_page(month, after_user_id=0, limit=1000):
+    expenses = ("FROM transaction_rollups r WHERE r.user_id = b.user_id AND r.month = ? "
+                "AND lower(r.type) = 'expense' AND r.currency")
+    base = "('', coalesce(p.base_currency, ?))"
+    bounds = (month, BASE_CURRENCY)
+    return _query(
+        f"SELECT b.user_id, b.budget, coalesce((SELECT sum(r.total) {expenses} IN {base}), 0.0) AS spent, "
+        f"coalesce((SELECT sum(r.count) {expenses} NOT IN {base}), 0) AS currency_rows, "
+        "coalesce(p.base_currency, ?) AS base_currency "
+        "FROM (SELECT user_id, budget, min(created_at) FROM budget WHERE user_id > ? "
+        "GROUP BY user_id ORDER BY user_id LIMIT ?) b LEFT JOIN profiles p ON p.id = b.user_id ORDER BY b.user_id",
+        bounds + bounds + (BASE_CURRENCY, after_user_id, limit))
+
+# =========================
+# RECURRING TRANSACTIONS
+# =========================
+@timed
+def create_recurring(user_id, rule: dict):
+    rule = {**rule, "user_id": user_id, "created_at": datetime.utcnow().isoformat()}
+    _set_clause(rule, RECURRING_COLUMNS | {"user_id"})
+    names = sorted(rule)
+    result = _query(f"INSERT INTO recurring_transactions ({', '.join(names)}) VALUES ({_placeholders(names)}) "
+                    "RETURNING *", [rule[name] for name in names])
+    invalidate_user(user_id, "recurring")
+    return result
+
+@cached("recurring")
+@timed
+def get_recurring(user_id):
+    return _query("SELECT * FROM recurring_transactions WHERE user_id = ? ORDER BY id", (user_id,))
+
+# expected: column values the rule must still have (compare-and-set); when it
+# no longer does, nothing is updated and .data is empty
+@timed
+def update_recurring(rule_id, updates: dict, user_id=None, expected=None):
+    assignments, params = _set_clause(updates, RECURRING_COLUMNS)
+    sql, params = _owned(f"UPDATE recurring_transactions SET {assignments} WHERE id = ?", params + [rule_id], user_id)
+    if expected:
+        _set_clause(expected, RECURRING_COLUMNS)
+        names = sorted(expected)
+        sql, params = sql + "".join(f" AND {name} = ?" for name in names), params + [expected[n] for n in names]
+    result = _query(sql + " RETURNING *", params)
+    invalidate_rows(result.data, "recurring")
+    return result
+
+@timed
+def delete_recurring(rule_id, user_id=None):
+    sql, params = _owned("DELETE FROM recurring_transactions WHERE id = ?", [rule_id], user_id)
+    result = _query(sql + " RETURNING *", params)
+    invalidate_rows(result.data, "recurring")
+    return result
+
+# =====================
+# BATCH SCANS
+# =====================
+# Page of every user's transactions after the given row, in (user_id, date, id)
+# order: a walk of the transactions_user_date index from the row-value bound
+@timed
+def get_transaction_scan_page(after_user_id=None, after_date=None, after_id=None, limit=1000):
+    sql, params = "SELECT id, user_id, category, type, date, amount, currency FROM transactions", []
+    if after_user_id is not None:
+        sql, params = sql + " WHERE (user_id, date, id) > (?, ?, ?)", [after_user_id, _date(after_date), after_id]
+    return _query(sql + " ORDER BY user_id, date, id LIMIT ?", params + [limit])
+
+# {profile id: base_currency or None} for the given profiles (the owners of a scanned batch)
+@timed
+def get_base_currencies(user_ids):
+    currencies = {}
+    for chunk in _id_chunks(user_ids):
+        rows = _query(f"SELECT id, base_currency FROM profiles WHERE id IN ({_placeholders(chunk)})", chunk).data
+        currencies.update((r["id"], r.get("base_currency")) for r in rows)
+    return currencies
@@ -0,0 +1,49 @@
+# src/storage.py
+# Storage backend selection. STORAGE_BACKEND in .env picks the modules that
+# implement the data-access functions used by the services:
+#   supabase (default)  src/db.py + src/async_db.py          hosted PostgREST
+#   sqlite              src/sqlite_db.py + src/async_sqlite_db.py   embedded, WAL
+# Every backend provides the functions in FUNCTIONS with the same signatures;
+# reads return an object whose `.data` is a list of row dicts (a single dict
+# for get_profile), like a postgrest response.
+import os
+import importlib
+from dotenv import load_dotenv
+
+load_dotenv()
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+
+BACKENDS = {
+    "supabase": ("src.db", "src.async_db"),
+    "sqlite": ("src.sqlite_db", "src.async_sqlite_db"),
+}
+
+FUNCTIONS = (
+    "create_profile", "get_all_profiles", "get_profile", "get_profile_by_username", "get_profile_by_email",
+    "get_profile_by_login", "update_profile", "delete_profile", "is_unique_violation",
+    "create_transaction", "create_transactions", "get_transactions", "get_transactions_page",
+    "get_transaction_totals", "update_transaction", "delete_transaction", "apply_transaction_batch", "get_rollups",
+    "create_budget", "get_budget", "update_budget", "delete_budget", "apply_budget_batch",
+    "get_budget_status_page", "create_recurring", "get_recurring", "update_recurring", "delete_recurring",
+    "get_transaction_scan_page", "get_base_currencies",
+)
+
+def _load(name, extra=()):
+    module = importlib.import_module(name)
+    missing = [fn for fn in FUNCTIONS + extra if not hasattr(module, fn)]
+    if missing:
+        raise ImportError(f"{name} does not implement {', '.join(missing)}")
+    return module
+
+def _modules():
+    if STORAGE_BACKEND not in BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND must be one of {', '.join(BACKENDS)}, got {STORAGE_BACKEND!r}")
+    return BACKENDS[STORAGE_BACKEND]
+
+# Module with the sync functions (used by src/logic.py)
+def sync_backend():
+    return _load(_modules()[0])
+
+# Module with the async functions and close_client() (used by src/async_logic.py and the API)
+def async_backend():
+    return _load(_modules()[1], ("close_client",))
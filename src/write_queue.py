@@ -0,0 +1,85 @@
+# src/write_queue.py
+# Optional write coalescing for single transaction inserts. Concurrent
+# POST /transactions calls put their row on an in-process queue; the queue is
+# flushed as one multi-row insert when it reaches WRITE_QUEUE_MAX_BATCH rows or
+# WRITE_QUEUE_MAX_WAIT_MS after the first queued row, whichever comes first.
+# Every caller awaits its own row: if a batch insert fails, its rows are
+# retried one by one so only the offending rows report an error.
+import os
+import asyncio
+
+WRITE_QUEUE_ENABLED = os.getenv("WRITE_QUEUE_ENABLED", "0") == "1"
+WRITE_QUEUE_MAX_BATCH = int(os.getenv("WRITE_QUEUE_MAX_BATCH", "200"))
+WRITE_QUEUE_MAX_WAIT_MS = float(os.getenv("WRITE_QUEUE_MAX_WAIT_MS", "5"))
+
+class InsertQueue:
+    # insert_many(rows) -> inserted rows in input order; insert_one(row) -> inserted row
+    def __init__(self, insert_many, insert_one, max_batch=WRITE_QUEUE_MAX_BATCH, max_wait_ms=WRITE_QUEUE_MAX_WAIT_MS):
+        self.insert_many = insert_many
+        self.insert_one = insert_one
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = []      # (row, future)
+        self._timer = None
+        self._flushes = set()
+        self._batches = 0
+        self._rows = 0
+        self._retried = 0
+
+    # Queue a row and wait until it is written; returns the inserted row or raises its error
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((row, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch):
+        self._batches += 1
+        self._rows += len(batch)
+        if len(batch) > 1:
+            try:
+                inserted = await self.insert_many([row for row, _ in batch])
+            except Exception:
+                # retry row by row so each caller gets its own result
+                self._retried += len(batch)
+            else:
+                for (_, future), row in zip(batch, inserted):
+                    if not future.done():
+                        future.set_result(row)
+                for _, future in batch[len(inserted):]:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Batch insert returned fewer rows than were queued"))
+                return
+        for row, future in batch:
+            try:
+                inserted = await self.insert_one(row)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(inserted)
+
+    # Write everything queued and wait for in-flight batches (call on shutdown)
+    async def drain(self):
+        while self._pending or self._flushes:
+            self._flush()
+            if self._flushes:
+                await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self):
+        return {"pending": len(self._pending), "in_flight": len(self._flushes), "batches": self._batches,
+                "rows": self._rows, "retried_rows": self._retried}
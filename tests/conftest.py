@@ -0,0 +1,74 @@
+# tests/conftest.py
+# Tests run on the embedded SQLite backend (src/sqlite_db.py) in a temporary
+# directory, with the read cache off and no exchange-rate file, so they need
+# neither a Supabase project nor the tracked .env. Settings are fixed here,
+# before any src module reads them at import.
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STUB_PORT = 54398
+
+_WORKDIR = tempfile.mkdtemp(prefix="expense-tracker-tests-")
+os.environ.update({
+    "STORAGE_BACKEND": "sqlite",
+    "SQLITE_PATH": os.path.join(_WORKDIR, "expense_tracker.db"),
+    "CACHE_ENABLED": "0",
+    "FX_RATES_PATH": os.path.join(_WORKDIR, "fx_rates.csv"),
+    "BUDGET_ALERTS_ENABLED": "0",
+    "BUDGET_ALERTS_PATH": os.path.join(_WORKDIR, "budget_alerts.db"),
+    "ANOMALY_FLAGS_PATH": os.path.join(_WORKDIR, "anomalies.db"),
+    "WRITE_QUEUE_ENABLED": "0",
+    "BCRYPT_ROUNDS": "4",
+})
+
+# A fresh SQLite database per test. The async backend's worker threads keep
+# their own connections, so its pool is closed (with every connection) too.
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    from src import sqlite_db, async_sqlite_db
+    asyncio.run(async_sqlite_db.close_client())
+    monkeypatch.setattr(sqlite_db, "SQLITE_PATH", str(tmp_path / "expense_tracker.db"))
+    yield sqlite_db
+    asyncio.run(async_sqlite_db.close_client())
+
+# Profile ids for `count` users of the fresh database
+@pytest.fixture
+def users(sqlite_db):
+    def create(count=1):
+        return [sqlite_db.create_profile(f"user{i}", f"user{i}@example.com").data[0]["id"] for i in range(count)]
+    return create
+
+# The supabase backend (src/db.py) talking to an empty local PostgREST stand-in
+@pytest.fixture
+def stub_db(monkeypatch):
+    from supabase import create_client
+    from benchmarks.postgrest_stub import PostgrestStub, FAKE_KEY
+    from src import db
+    stub = PostgrestStub(latency_ms=0)
+    monkeypatch.setattr(db, "_client", create_client(stub.start(port=STUB_PORT), FAKE_KEY))
+    yield stub
+    stub.stop()
+
+# The API on the fresh database; leaving the client runs the app's shutdown,
+# which closes the SQLite worker pool and its connections
+@pytest.fixture
+def api(sqlite_db):
+    from fastapi.testclient import TestClient
+    from api.main import app
+    with TestClient(app) as client:
+        yield client
+
+# Request headers carrying a session token for the user
+@pytest.fixture
+def auth():
+    from src.sessions import issue_token
+    def headers(user_id, ttl=3600):
+        return {"Authorization": f"Bearer {issue_token(user_id, ttl)}"}
+    return headers
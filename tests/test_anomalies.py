@@ -0,0 +1,91 @@
+# tests/test_anomalies.py
+# Spending anomalies: known outliers flagged by the robust z-score and known
+# category jumps by the EWMA, ordinary variation left alone, and the offline
+# job persisting each user's flags in place of the previous run's.
+from datetime import date
+
+import numpy as np
+import pytest
+
+from src.anomalies import AnomalyStore, detect, run_job
+from src.ledger import to_days
+
+TODAY = date(2024, 6, 30)
+NAMES = np.array(["Food", "Rent", "Travel", "Fun"])
+
+# detect() on (user_id, category, date, amount) tuples; ids are positions + 1
+def flags_for(rows, today=TODAY):
+    users, categories, dates, amounts = zip(*rows)
+    codes = {name: i for i, name in enumerate(NAMES)}
+    return detect(np.array(users, dtype=np.int64), np.arange(1, len(rows) + 1, dtype=np.int64), to_days(dates),
+                  np.array([codes[c] for c in categories], dtype=np.int32), np.array(amounts, dtype=float),
+                  NAMES, today)
+
+FOOD = [20, 22, 19, 21, 20, 23, 18, 20, 160, 21, 22, 50, 20]    # one 8x spike, one 2.5x expense
+RENT = [1000] * 8 + [1300]
+TRAVEL = [900, 50, 55, 60, 52]                                 # too little history to judge the 900
+
+def ledger(user=1):
+    return ([(user, "Food", f"2024-05-{i + 1:02d}", a) for i, a in enumerate(FOOD)]
+            + [(user, "Rent", f"2023-{i + 10:02d}-01" if i < 3 else f"2024-{i - 2:02d}-01", a)
+               for i, a in enumerate(RENT)]
+            + [(user, "Travel", f"2024-04-{i + 1:02d}", a) for i, a in enumerate(TRAVEL)])
+
+def test_only_the_spike_is_an_outlier():
+    (flag,) = [f for f in flags_for(ledger()) if f["kind"] == "outlier"]
+    assert flag == {"user_id": 1, "kind": "outlier", "transaction_id": FOOD.index(160) + 1, "category": "Food",
+                    "period": "2024-05-09", "amount": 160.0, "expected": 20.0, "score": flag["score"]}
+    assert flag["score"] > 3.5
+
+def test_outliers_are_judged_within_each_user():
+    rows = ledger(1) + [(2, "Food", f"2024-05-{i + 1:02d}", a * 10) for i, a in enumerate(FOOD)]
+    rows = [rows[i] for i in np.random.default_rng(3).permutation(len(rows))]
+    outliers = [f for f in flags_for(rows) if f["kind"] == "outlier"]
+    assert sorted((f["user_id"], f["amount"]) for f in outliers) == [(1, 160.0), (2, 1600.0)]
+
+def test_category_jump_is_a_shift():
+    # one 100 expense a month for a year, then four in a month: no single
+    # expense is unusual, the month's total is
+    rows = [(1, "Fun", f"2023-{m:02d}-15", 100) for m in range(1, 13)]
+    rows += [(1, "Fun", f"2024-01-{d:02d}", 100) for d in (3, 10, 17, 24)]
+    rows += [(1, "Food", f"2023-{m:02d}-15", 100 + m) for m in range(1, 13)]
+    flags = flags_for(rows)
+    assert [(f["kind"], f["category"], f["period"], f["amount"], f["expected"]) for f in flags] == [
+        ("category_shift", "Fun", "2024-01", 400.0, 100.0)]
+
+def test_only_recent_periods_are_flagged():
+    assert flags_for(ledger(), today=date(2030, 1, 1)) == []
+    assert detect(*(np.array([], dtype=np.int64),) * 5, NAMES) == []
+
+@pytest.fixture
+def store(tmp_path):
+    return AnomalyStore(str(tmp_path / "anomalies.db"))
+
+def test_job_persists_flags_per_user(sqlite_db, users, store):
+    alice, bob, carol = users(3)
+    for user, spike in ((alice, 160), (bob, 20), (carol, 400)):
+        sqlite_db.create_transactions([{"user_id": user, "category": "Food", "type": "Expense",
+                                        "date": f"2024-05-{i + 1:02d}", "amount": spike if i == 8 else a}
+                                       for i, a in enumerate(FOOD)])
+    sqlite_db.create_transaction(alice, "Salary", "Income", "2024-05-20", 5000.0)   # income is never judged
+
+    stats = run_job(sqlite_db, store, today=TODAY)
+    assert stats["users"] == 3 and stats["transactions"] == 3 * len(FOOD) + 1 and stats["flags"] == 2
+    assert [f["amount"] for f in store.for_user(alice)["flags"]] == [160.0]
+    assert store.for_user(bob)["flags"] == [] and store.for_user(bob)["computed_at"]
+    assert [f["amount"] for f in store.for_user(carol)["flags"]] == [400.0]
+
+    # a run replaces the previous flags instead of adding to them
+    sqlite_db.delete_transaction(store.for_user(alice)["flags"][0]["transaction_id"])
+    assert run_job(sqlite_db, store, today=TODAY)["flags"] == 1
+    assert store.for_user(alice)["flags"] == []
+    assert len(store.for_user(carol)["flags"]) == 1
+
+def test_refresh_over_the_api(api, users, auth, sqlite_db):
+    (user,) = users(1)
+    today = date.today().isoformat()[:7]
+    sqlite_db.create_transactions([{"user_id": user, "category": "Food", "type": "Expense",
+                                    "date": f"{today}-{i + 1:02d}", "amount": a} for i, a in enumerate(FOOD)])
+    data = api.get("/anomalies", params={"refresh": "true"}, headers=auth(user)).json()["Data"]
+    assert data["computed_at"]
+    assert [(f["kind"], f["amount"]) for f in data["flags"]] == [("outlier", 160.0)]
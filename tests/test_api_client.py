@@ -0,0 +1,55 @@
+# tests/test_api_client.py
+# The Streamlit app's HTTP client against the real app (through TestClient):
+# reads are cached until a write moves the user's generation, and error
+# responses such as a 401 for an expired token are never cached.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend"))
+import api_client  # noqa: E402
+from src.sessions import issue_token  # noqa: E402
+
+@pytest.fixture
+def client_for(api, monkeypatch):
+    monkeypatch.setattr(api_client, "_session", lambda: api)
+    api_client._cached_get.clear()
+    api_client._shared.clear()
+    yield lambda user_id, ttl=3600: api_client.ApiClient(user_id, issue_token(user_id, ttl))
+    api_client._cached_get.clear()
+
+def test_reads_are_cached_until_a_write(client_for, users, sqlite_db):
+    (user,) = users(1)
+    client = client_for(user)
+    assert client.transactions({})["Data"] == []
+    sqlite_db.create_transaction(user, "Food", "Expense", "2024-01-05", 10.0)     # behind the client's back
+    assert client.transactions({})["Data"] == []
+    assert client.add_transaction({"category": "Food", "type_": "Expense", "date": "2024-01-06", "amount": 5})
+    assert len(client.transactions({})["Data"]) == 2
+
+def test_expired_session_errors_are_not_cached(client_for, users):
+    (user,) = users(1)
+    expired = client_for(user, ttl=-1)
+    assert "Data" not in expired.transactions({})
+    assert "Data" not in expired.budgets()
+    # logging in again gets a new token for the same user: its reads must not
+    # be served the 401s cached under the same key
+    fresh = client_for(user)
+    assert fresh.transactions({})["Success"] and fresh.budgets()["Success"]
+
+def test_failed_reads_are_not_cached(client_for, users, monkeypatch):
+    (user,) = users(1)
+    client = client_for(user)
+    calls = []
+    request = api_client._request
+
+    def counting(method, path, *args, **kwargs):
+        calls.append(path)
+        return request(method, path, *args, **kwargs)
+
+    monkeypatch.setattr(api_client, "_request", counting)
+    for _ in range(2):
+        assert client.transactions({"sort": "password"})["Success"] is False
+        assert client.transactions({})["Success"]
+    assert calls == ["/transactions", "/transactions", "/transactions"]
@@ -0,0 +1,103 @@
+# tests/test_batch.py
+# Batch mutations: planning a list of operations into a few statements,
+# per-operation validation, and mapping the database outcome back to one
+# result per operation, in request order.
+import pytest
+
+from src.services import (
+    plan_batch, transaction_fields, budget_fields, batch_arguments, budget_batch_arguments, finish_batch, has_work,
+    MAX_BATCH_OPERATIONS
+)
+
+def test_plan_groups_identical_updates():
+    plan, results = plan_batch([
+        {"op": "create", "category": "Food", "type_": "Expense", "date": "2024-01-05T10:00:00", "amount": "12.5"},
+        {"op": "update", "id": 1, "amount": 3},
+        {"op": "update", "id": 2, "amount": 3.0},
+        {"op": "update", "id": 3, "category": "Rent"},
+        {"op": "delete", "id": 4},
+    ], transaction_fields)
+    assert [r["Index"] for r in results] == [0, 1, 2, 3, 4]
+    assert not any("Success" in r for r in results)       # nothing has failed validation
+    creates, updates, deletes = batch_arguments(plan)
+    assert creates == [{"category": "Food", "type": "Expense", "date": "2024-01-05", "amount": 12.5}]
+    assert sorted(updates, key=lambda u: u[1]) == [({"amount": 3.0}, [1, 2]), ({"category": "Rent"}, [3])]
+    assert deletes == [4]
+
+def test_invalid_operations_fail_on_their_own():
+    plan, results = plan_batch([
+        {"op": "upsert", "id": 1},
+        {"op": "create", "category": "Food", "type": "Expense", "date": "2024-01-05"},
+        {"op": "update", "amount": 1},
+        {"op": "update", "id": 2},
+        {"op": "update", "id": 3, "date": "05/01/2024"},
+        {"op": "delete", "id": 5},
+        {"op": "update", "id": 5, "amount": 1},
+        {"op": "create", "category": "Food", "type": "Expense", "date": "2024-01-05", "amount": "x"},
+    ], transaction_fields)
+    messages = [r.get("Message") for r in results]
+    assert messages[0] == "op must be one of create, update, delete"
+    assert messages[1] == "Missing amount"
+    assert messages[2] == "id is required for update and delete"
+    assert messages[3] == "Nothing to update"
+    assert messages[4] == "date must be a YYYY-MM-DD date"
+    assert messages[5] is None
+    assert messages[6] == "id 5 appears more than once in the batch"
+    assert "could not convert" in messages[7]
+    assert batch_arguments(plan) == ([], [], [5])
+
+def test_batch_size_is_capped():
+    with pytest.raises(ValueError):
+        plan_batch([{"op": "delete", "id": i} for i in range(MAX_BATCH_OPERATIONS + 1)], transaction_fields)
+
+def test_budget_plan_carries_only_amounts():
+    plan, results = plan_batch([{"op": "create", "budget": "100"}, {"op": "update", "id": 9, "budget": 50},
+                                {"op": "update", "id": 8}], budget_fields)
+    assert budget_batch_arguments(plan) == ([100.0], [(50.0, [9])], [])
+    assert results[2]["Message"] == "Missing budget"
+
+def test_finish_batch_reports_each_operation():
+    plan, results = plan_batch([
+        {"op": "create", "category": "Food", "type": "Expense", "date": "2024-01-05", "amount": 1},
+        {"op": "update", "id": 10, "amount": 2},
+        {"op": "update", "id": 11, "amount": 2},
+        {"op": "delete", "id": 12},
+        {"op": "delete", "id": 13},
+        {"op": "bogus"},
+    ], transaction_fields)
+    outcome = {"created": [{"id": 20, "amount": 1.0}], "updated": [{"id": 10, "amount": 2.0}],
+               "deleted": [{"id": 13}]}
+    payload = finish_batch(plan, results, outcome, "Transaction")
+    assert payload["Message"] == "3 of 6 operations applied"
+    by_index = {r["Index"]: r for r in payload["Data"]}
+    assert by_index[0]["Id"] == 20 and by_index[0]["Data"] == {"id": 20, "amount": 1.0}
+    assert by_index[1]["Success"] and by_index[1]["Data"]["amount"] == 2.0
+    assert by_index[2] == {"Index": 2, "Op": "update", "Id": 11, "Success": False,
+                           "Message": "Transaction not found"}
+    assert not by_index[3]["Success"] and by_index[4]["Success"]
+    assert not by_index[5]["Success"]
+
+def test_empty_plan_has_no_work():
+    plan, _ = plan_batch([{"op": "nope"}], transaction_fields)
+    assert not has_work(plan)
+
+def test_apply_batch_on_sqlite_touches_only_the_callers_rows(sqlite_db, users):
+    from src.logic import TransactionService
+    me, other = users(2)
+    mine = sqlite_db.create_transaction(me, "Food", "Expense", "2024-01-05", 10.0).data[0]["id"]
+    theirs = [sqlite_db.create_transaction(other, "Food", "Expense", "2024-01-05", 10.0).data[0]["id"]
+              for _ in range(2)]
+    result = TransactionService().apply_batch(me, [
+        {"op": "create", "category": "Rent", "type": "Expense", "date": "2024-01-06", "amount": 500},
+        {"op": "update", "id": mine, "amount": 11, "currency": "usd"},
+        {"op": "update", "id": theirs[0], "amount": 11},
+        {"op": "delete", "id": theirs[1]},
+    ])
+    assert result["Success"]
+    assert [r.get("Message") for r in result["Data"][2:]] == ["Transaction not found"] * 2
+    assert [r["Success"] for r in result["Data"]] == [True, True, False, False]
+    created = result["Data"][0]["Data"]
+    assert created["currency"] == "USD"         # creates without one get the base currency
+    assert result["Data"][1]["Data"]["currency"] == "USD"
+    assert [r["amount"] for r in sqlite_db.get_transactions(other).data] == [10.0, 10.0]
+    assert sorted(r["amount"] for r in sqlite_db.get_transactions(me).data) == [11.0, 500.0]
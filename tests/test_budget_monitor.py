@@ -0,0 +1,105 @@
+# tests/test_budget_monitor.py
+# Budget monitoring: which threshold a month's spend crosses, one outbox alert
+# per (user, month, threshold) however often it is evaluated, and a pass that
+# runs out of time resuming from its saved cursor.
+import pytest
+
+from src import budget_monitor
+from src.budget_monitor import AlertOutbox, crossed_thresholds, evaluate, run_pass, evaluate_user
+
+MONTH = "2024-03"
+
+@pytest.fixture
+def outbox(tmp_path):
+    return AlertOutbox(str(tmp_path / "alerts.db"))
+
+def test_highest_crossed_threshold():
+    levels = crossed_thresholds([100, 100, 100, 100, 100, 0, 50], [0, 79.99, 80, 99, 250, 10, 50], (0.8, 1.0))
+    assert levels.tolist() == [-1, -1, 0, 0, 1, -1, 1]
+
+def test_evaluate_builds_one_alert_per_crossing_user():
+    alerts = evaluate([{"user_id": 1, "budget": 100, "spent": 85}, {"user_id": 2, "budget": 100, "spent": 10},
+                       {"user_id": 3, "budget": None, "spent": 500}, {"user_id": 4, "budget": 100, "spent": 100}],
+                      MONTH, (0.8, 1.0))
+    assert [(a["user_id"], a["threshold"], a["spent"]) for a in alerts] == [(1, 0.8, 85.0), (4, 1.0, 100.0)]
+    assert evaluate([], MONTH) == [] and evaluate([{"user_id": 1, "budget": 1, "spent": 9}], MONTH, ()) == []
+
+def test_outbox_records_each_crossing_once(outbox):
+    alert = evaluate([{"user_id": 1, "budget": 100, "spent": 85}], MONTH, (0.8, 1.0))
+    assert outbox.record(alert) == 1
+    assert outbox.record(alert) == 0
+    assert outbox.record(evaluate([{"user_id": 1, "budget": 100, "spent": 90}], MONTH, (0.8, 1.0))) == 0
+    assert outbox.record(evaluate([{"user_id": 1, "budget": 100, "spent": 120}], MONTH, (0.8, 1.0))) == 1
+    assert outbox.record(evaluate([{"user_id": 1, "budget": 100, "spent": 85}], "2024-04", (0.8, 1.0))) == 1
+    assert [a["threshold"] for a in outbox.for_user(1)] == [0.8, 1.0, 0.8]
+
+    pending = outbox.undelivered()
+    outbox.mark_delivered([pending[0]["id"]])
+    assert [a["id"] for a in outbox.undelivered()] == [a["id"] for a in pending[1:]]
+
+def seed(db, users, budgets_and_spend):
+    ids = users(len(budgets_and_spend))
+    for user, (budget, spent) in zip(ids, budgets_and_spend):
+        db.create_budget(user, budget)
+        db.create_transaction(user, "Food", "Expense", f"{MONTH}-10", spent)
+        db.create_transaction(user, "Salary", "Income", f"{MONTH}-01", 10_000.0)    # income never counts
+        db.create_transaction(user, "Food", "Expense", "2024-02-10", 10_000.0)     # nor other months
+    return ids
+
+def test_pass_alerts_each_user_once_per_month(sqlite_db, users, outbox):
+    ids = seed(sqlite_db, users, [(100, 50), (100, 85), (100, 150), (0, 20)])
+    stats = run_pass(sqlite_db, outbox, month=MONTH, page_size=3, thresholds=(0.8, 1.0))
+    assert stats["complete"] and stats["users"] == 4 and stats["pages"] == 2 and stats["alerts"] == 2
+    assert {(a["user_id"], a["threshold"]) for a in outbox.undelivered()} == {(ids[1], 0.8), (ids[2], 1.0)}
+    assert run_pass(sqlite_db, outbox, month=MONTH, page_size=3, thresholds=(0.8, 1.0))["alerts"] == 0
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+# The backend, with every status page taking one second of the clock
+class SlowPages:
+    def __init__(self, db, clock):
+        self.db, self.clock, self.starts = db, clock, []
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def get_budget_status_page(self, month, after_user_id=0, limit=1000):
+        self.starts.append(after_user_id)
+        self.clock.now += 1.0
+        return self.db.get_budget_status_page(month, after_user_id, limit)
+
+def test_pass_out_of_time_resumes_from_its_cursor(sqlite_db, users, outbox, monkeypatch):
+    ids = seed(sqlite_db, users, [(100, 90)] * 7)
+    clock = Clock()
+    monkeypatch.setattr(budget_monitor.time, "monotonic", clock.monotonic)
+    db = SlowPages(sqlite_db, clock)
+
+    first = run_pass(db, outbox, time_budget=1.5, page_size=2, month=MONTH)
+    assert not first["complete"] and first["pages"] == 2 and first["users"] == 4
+    assert outbox.get_state("cursor") == f"{MONTH}|{ids[3]}"
+
+    second = run_pass(db, outbox, time_budget=1.5, page_size=2, month=MONTH)
+    assert second["complete"] and second["started_after_user"] == ids[3] and second["users"] == 3
+    assert db.starts == [0, ids[1], ids[3], ids[5]]
+    assert sorted(a["user_id"] for a in outbox.undelivered()) == ids
+
+    # the next pass starts over; a cursor from another month is ignored
+    outbox.set_state("cursor", f"2024-02|{ids[5]}")
+    assert run_pass(db, outbox, time_budget=100, page_size=2, month=MONTH)["started_after_user"] == 0
+
+def test_write_time_check_counts_due_recurring_occurrences(sqlite_db, users, outbox):
+    from src.recurring import rule_fields
+    (user,) = users(1)
+    sqlite_db.create_budget(user, 100)
+    sqlite_db.create_transaction(user, "Food", "Expense", f"{MONTH}-02", 50.0)
+    assert evaluate_user(sqlite_db, user, outbox, month=MONTH) == []
+    sqlite_db.create_recurring(user, rule_fields(True, type_="Expense", amount=15.0, frequency="weekly",
+                                                 start_date=f"{MONTH}-01", end_date=f"{MONTH}-20"))
+    (alert,) = evaluate_user(sqlite_db, user, outbox, month=MONTH)
+    assert alert["spent"] == 50.0 + 3 * 15.0 and alert["threshold"] == 0.8
+    assert len(outbox.for_user(user)) == 1
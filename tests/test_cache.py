@@ -0,0 +1,124 @@
+# tests/test_cache.py
+# Read-through cache: LRU/TTL bookkeeping, per-user invalidation by namespace,
+# the generation check that drops a value loaded across an invalidation, and
+# the per-user data versions behind the API's ETags.
+import asyncio
+
+import pytest
+
+from src import cache as cache_module
+from src.cache import LRUCache, cached, acached, invalidate_user, invalidate_rows, versions
+
+@pytest.fixture
+def cache(monkeypatch):
+    fresh = LRUCache(max_entries=100, ttl=60)
+    monkeypatch.setattr(cache_module, "cache", fresh)
+    monkeypatch.setattr(cache_module, "CACHE_ENABLED", True)
+    return fresh
+
+def test_hit_after_set():
+    lru = LRUCache()
+    key = ("budget", 1, "get_budget", (), ())
+    assert lru.get(key) == (False, None)
+    lru.set(key, "value")
+    assert lru.get(key) == (True, "value")
+    assert (lru.hits, lru.misses) == (1, 1)
+
+def test_expired_entries_miss():
+    lru = LRUCache(ttl=-1)
+    key = ("budget", 1, "get_budget", (), ())
+    lru.set(key, "value")
+    assert lru.get(key) == (False, None)
+    assert lru.expirations == 1
+    assert lru.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    lru = LRUCache(max_entries=2)
+    a, b, c = (("t", user, "f", (), ()) for user in (1, 2, 3))
+    lru.set(a, "a")
+    lru.set(b, "b")
+    lru.get(a)          # b is now the oldest
+    lru.set(c, "c")
+    assert lru.get(b) == (False, None)
+    assert lru.get(a) == (True, "a")
+    assert lru.evictions == 1
+
+def test_invalidate_drops_only_that_users_namespaces():
+    lru = LRUCache()
+    mine = ("transactions", 1, "get_transactions", (), ())
+    my_budget = ("budget", 1, "get_budget", (), ())
+    theirs = ("transactions", 2, "get_transactions", (), ())
+    for key in (mine, my_budget, theirs):
+        lru.set(key, key)
+    lru.invalidate(1, "transactions")
+    assert lru.get(mine) == (False, None)
+    assert lru.get(my_budget)[0]
+    assert lru.get(theirs)[0]
+    assert lru.invalidations == 1
+
+def test_value_loaded_across_an_invalidation_is_not_stored():
+    lru = LRUCache()
+    key = ("transactions", 1, "get_transactions", (), ())
+    generation = lru.generation(key)
+    lru.invalidate(1, "transactions")      # a write lands while the read is in flight
+    lru.set(key, "stale", generation)
+    assert lru.get(key) == (False, None)
+    lru.set(key, "fresh", lru.generation(key))
+    assert lru.get(key) == (True, "fresh")
+
+def test_cached_reads_through_until_the_user_is_invalidated(cache):
+    calls = []
+
+    @cached("budget")
+    def get_budget(user_id):
+        calls.append(user_id)
+        return f"budget {len(calls)}"
+
+    assert get_budget(1) == get_budget(1) == "budget 1"
+    assert get_budget.uncached(1) == "budget 2"     # bulk scans skip the cache
+    invalidate_user(1, "budget")
+    assert get_budget(1) == "budget 3"
+    assert calls == [1, 1, 1]
+
+def test_read_racing_a_write_is_not_cached(cache):
+    @cached("transactions")
+    def get_transactions(user_id):
+        invalidate_user(user_id, "transactions")    # the write commits mid-read
+        return "stale"
+
+    assert get_transactions(5) == "stale"
+    assert cache.stats()["entries"] == 0
+
+def test_acached_shares_the_cache(cache):
+    calls = []
+
+    @acached("profile")
+    async def get_profile(profile_id):
+        calls.append(profile_id)
+        return {"id": profile_id}
+
+    async def read_twice():
+        return await get_profile(3), await get_profile(3)
+
+    assert asyncio.run(read_twice()) == ({"id": 3}, {"id": 3})
+    assert calls == [3]
+
+def test_disabled_cache_always_loads(cache, monkeypatch):
+    monkeypatch.setattr(cache_module, "CACHE_ENABLED", False)
+    calls = []
+
+    @cached("budget")
+    def get_budget(user_id):
+        calls.append(user_id)
+
+    get_budget(1)
+    get_budget(1)
+    assert calls == [1, 1]
+
+def test_versions_move_forward_on_every_invalidation(cache):
+    before = {user: versions.get(user) for user in (11, 12, 13)}
+    invalidate_user(11, "transactions")
+    invalidate_rows([{"user_id": 12}, {"user_id": 12}, {"user_id": None}, {"id": 4}], "transactions")
+    assert versions.get(11) == before[11] + 1
+    assert versions.get(12) == before[12] + 1     # once per owner, not per row
+    assert versions.get(13) == before[13]
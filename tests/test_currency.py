@@ -0,0 +1,98 @@
+# tests/test_currency.py
+# Exchange rates: the rate in force on a day (before the first rate, on and
+# after a change, repeated days), conversion into quote and non-quote targets,
+# and the rate store keeping its last good table when the file is malformed.
+import os
+
+import numpy as np
+import pytest
+
+from src.currency import RateTable, RateStore, load_rates, currency_code, normalize_currency, with_currency, NATIVE
+
+def days(*values):
+    return np.array(values, dtype="datetime64[D]").astype(np.int64)
+
+def table(quote="USD"):
+    # EUR changes on Mar 1, GBP's Mar 1 rate is given twice (the later row wins)
+    return RateTable([currency_code(c) for c in ("EUR", "EUR", "GBP", "GBP", "GBP")],
+                     days("2024-01-01", "2024-03-01", "2024-01-01", "2024-03-01", "2024-03-01"),
+                     [1.10, 1.20, 1.25, 1.30, 1.35], quote)
+
+def test_rate_in_force_on_each_day():
+    eur = currency_code("EUR")
+    rates = table().rates_on([eur] * 5, days("2023-06-01", "2024-01-01", "2024-02-29", "2024-03-01", "2030-01-01"))
+    # before the first rate, the first rate applies
+    assert rates.tolist() == [1.10, 1.10, 1.10, 1.20, 1.20]
+
+def test_repeated_day_keeps_the_later_row():
+    gbp = currency_code("GBP")
+    assert table().rates_on([gbp, gbp], days("2024-02-01", "2024-03-01")).tolist() == [1.25, 1.35]
+
+def test_first_rate_of_a_currency_never_borrows_its_neighbours():
+    # a day before a currency's first rate must not land on the previous currency's last rate
+    gbp, usd = currency_code("GBP"), currency_code("USD")
+    assert table().rates_on([gbp, usd], days("2000-01-01", "2000-01-01")).tolist() == [1.25, 1.0]
+
+def test_convert_into_the_quote_and_other_currencies():
+    t = table()
+    codes = np.array([currency_code(c) for c in ("EUR", "GBP", "USD")] + [NATIVE], np.int64)
+    when = days("2024-03-05", "2024-03-05", "2024-03-05", "2024-03-05")
+    amounts = np.array([10.0, 10.0, 10.0, 10.0])
+    assert t.convert(amounts, codes, when, "USD") == pytest.approx([12.0, 13.5, 10.0, 10.0])
+    # a non-quote target divides by the target's own rate that day
+    assert t.convert(amounts, codes, when, "EUR") == pytest.approx([10.0, 13.5 / 1.2, 10.0 / 1.2, 10.0])
+    assert t.convert(amounts, codes[2:], when[2:], "USD") is amounts
+
+def test_convert_rows_rejects_unknown_currencies():
+    rows = [{"currency": "JPY", "date": "2024-01-01", "amount": 1.0}]
+    with pytest.raises(ValueError, match="No exchange rates for JPY"):
+        table().convert_rows(rows, "USD")
+    assert table().convert_rows([{"currency": None, "date": "2024-01-01", "amount": 3.0}], "EUR").tolist() == [3.0]
+
+def test_quote_currency_is_always_one():
+    t = RateTable([currency_code("USD"), currency_code("EUR")], days("2024-01-01", "2024-01-01"), [2.0, 1.1])
+    assert t.rates_on([currency_code("USD")], days("2024-06-01")).tolist() == [1.0]
+    assert t.currencies() == ["EUR", "USD"]
+
+def test_with_currency_fills_only_missing_currencies():
+    assert with_currency([{"currency": "EUR"}, {"currency": None}, {}], "USD") == [
+        {"currency": "EUR"}, {"currency": "USD"}, {"currency": "USD"}]
+
+def test_normalize_currency():
+    assert normalize_currency("  ") is None
+    assert normalize_currency("usd ") == "USD"
+    with pytest.raises(ValueError):
+        normalize_currency("dollars")
+
+def write(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+def test_load_rates_reports_the_bad_line(tmp_path):
+    path = tmp_path / "fx.csv"
+    path.write_text("date,currency,rate\n2024-01-01,EUR,1.1\n2024-01-02,EUR,-1\n")
+    with pytest.raises(ValueError, match=r"fx.csv:3"):
+        load_rates(str(path))
+    assert load_rates(str(tmp_path / "missing.csv")).currencies() == ["USD"]
+
+def test_rate_store_keeps_the_last_good_table(tmp_path):
+    path = tmp_path / "fx.csv"
+    write(path, "date,currency,rate\n2024-01-01,EUR,1.1\n", 1_000_000)
+    store = RateStore(str(path), reload_seconds=0)
+    good = store.table()
+    assert good.knows("EUR") and store.error is None
+
+    write(path, "date,currency,rate\n2024-01-01,EUR,oops\n", 2_000_000)
+    assert store.table() is good
+    assert "fx.csv:2" in store.stats()["error"]
+
+    write(path, "date,currency,rate\n2024-01-01,EUR,1.1\n2024-01-01,GBP,1.3\n", 3_000_000)
+    assert store.table().knows("GBP")
+    assert store.error is None and store.table().version == 3_000_000
+
+def test_rate_store_starts_empty_when_the_first_file_is_bad(tmp_path):
+    path = tmp_path / "fx.csv"
+    write(path, "currency\nEUR\n", 1_000_000)
+    store = RateStore(str(path), reload_seconds=0)
+    assert store.table().currencies() == ["USD"]
+    assert store.error
@@ -0,0 +1,104 @@
+# tests/test_export.py
+# Streaming export: the CSV, NDJSON and Parquet encoders, base-currency
+# amounts per chunk, encoding off the event loop, and an export returning the
+# same rows as the listing for the same filters.
+import asyncio
+import csv
+import io
+import json
+import threading
+
+import pyarrow.parquet as pq
+import pytest
+
+from src.export import export_chunks, aexport_chunks, encoder_for, EXPORT_COLUMNS
+
+ROWS = [{"id": i, "date": f"2024-01-{i:02d}T08:00:00", "category": "Food" if i % 2 else None, "type": "Expense",
+         "amount": float(i), "description": f"row {i}, \"quoted\"" if i == 3 else None,
+         "currency": "USD" if i % 3 else None} for i in range(1, 8)]
+
+def export(fmt, rows=ROWS, chunk_rows=3):
+    return b"".join(export_chunks(iter(rows), encoder_for(fmt), chunk_rows, currency="USD"))
+
+def test_csv():
+    records = list(csv.reader(io.StringIO(export("csv").decode())))
+    assert tuple(records[0]) == EXPORT_COLUMNS
+    assert len(records) == 8
+    assert records[3] == ["3", "2024-01-03", "Food", "Expense", "3.0", 'row 3, "quoted"', "USD", "3.0"]
+    assert records[1][5] == "" and records[1][6] == "USD"      # no currency: the base currency
+
+def test_ndjson():
+    lines = export("ndjson").decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == list(range(1, 8))
+    assert json.loads(lines[0]) == {"id": 1, "date": "2024-01-01", "category": "Food", "type": "Expense",
+                                    "amount": 1.0, "description": None, "currency": "USD", "base_amount": 1.0}
+
+def test_parquet_has_one_row_group_per_chunk():
+    parquet = pq.ParquetFile(io.BytesIO(export("parquet")))
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column_names == list(EXPORT_COLUMNS)
+    assert table.column("id").to_pylist() == list(range(1, 8))
+    assert str(table.column("date")[0]) == "2024-01-01"
+
+def test_empty_exports_are_still_valid_files():
+    assert export("csv", []).decode().splitlines() == [",".join(EXPORT_COLUMNS)]
+    assert export("ndjson", []) == b""
+    assert pq.ParquetFile(io.BytesIO(export("parquet", []))).metadata.num_rows == 0
+
+def test_unknown_format():
+    with pytest.raises(ValueError, match="Format must be one of"):
+        encoder_for("xlsx")
+
+def test_unknown_currency_fails_the_chunk():
+    with pytest.raises(ValueError, match="No exchange rates for JPY"):
+        export("csv", [{**ROWS[0], "currency": "JPY"}])
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson", "parquet"])
+def test_async_export_encodes_off_the_event_loop(fmt, monkeypatch):
+    encoder = encoder_for(fmt)
+    threads = []
+    encode = encoder.encode
+
+    def recording(rows):
+        threads.append(threading.current_thread())
+        return encode(rows)
+
+    monkeypatch.setattr(encoder, "encode", recording)
+
+    async def rows():
+        for row in ROWS:
+            yield row
+
+    async def run():
+        loop_thread = threading.current_thread()
+        chunks = [chunk async for chunk in aexport_chunks(rows(), encoder, 3, currency="USD")]
+        return loop_thread, b"".join(chunks)
+
+    loop_thread, data = asyncio.run(run())
+    assert len(threads) == 3 and loop_thread not in threads
+    assert data == export(fmt)
+
+def test_export_matches_the_listing_for_the_same_filters(api, users, auth, sqlite_db):
+    (user,) = users(1)
+    headers = auth(user)
+    sqlite_db.create_transactions([
+        {"user_id": user, "category": ["Food", "Rent", "Fun"][i % 3], "type": "Expense" if i % 4 else "Income",
+         "date": f"2024-01-{1 + i % 28:02d}", "amount": float(i), "description": f"row {i}"} for i in range(60)])
+    rule = {"category": "Food", "type_": "Expense", "amount": 15.0, "frequency": "weekly", "start_date": "2024-01-01",
+            "end_date": "2024-01-31"}
+    assert api.post("/recurring", json=rule, headers=headers).json()["Success"]
+
+    for params in ({}, {"category": ["Food", "Fun"], "type": "expense"}, {"min_amount": 10, "max_amount": 40},
+                   {"start_date": "2024-01-10", "end_date": "2024-01-20", "sort": "-amount"}, {"q": "row 1"}):
+        listed, cursor = [], None
+        while True:
+            page = api.get("/transactions", params={**params, "limit": 7, "cursor": cursor}, headers=headers).json()
+            listed += [r["id"] for r in page["Data"]]
+            cursor = page["NextCursor"]
+            if cursor is None:
+                break
+        exported = api.get("/transactions/export", params={**params, "format": "ndjson"}, headers=headers)
+        assert exported.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line)["id"] for line in exported.text.splitlines()] == listed, params
+        assert listed
@@ -0,0 +1,95 @@
+# tests/test_filters.py
+# Listing filters pushed down to the database: validation, the PostgREST
+# query each filter becomes, and the same rows coming back from SQLite, the
+# supabase path (against the local PostgREST stand-in) and the in-memory
+# matcher used for generated recurring rows.
+import pytest
+
+from src.db import filter_transactions, like_literal
+from src.recurring import matches
+from src.services import transaction_filters, parse_sort
+
+ROWS = [
+    {"category": "Food", "type": "Expense", "date": "2024-01-05", "amount": 12.5, "description": "Lunch"},
+    {"category": "Food", "type": "expense", "date": "2024-01-20", "amount": 40.0, "description": "50% off dinner"},
+    {"category": "Rent", "type": "EXPENSE", "date": "2024-02-01", "amount": 900.0, "description": None},
+    {"category": "Salary", "type": "Income", "date": "2024-02-25", "amount": 3000.0, "description": "pay_feb"},
+    {"category": "Travel", "type": "Exp_nse", "date": "2024-03-10", "amount": 40.0, "description": "payXfeb"},
+    {"category": None, "type": "Expense", "date": "2024-03-31", "amount": 7.25, "description": "Coffee"},
+]
+
+FILTERS = [
+    {},
+    {"type_": "expense"},
+    {"type_": "Exp_nse"},
+    {"categories": ["Food", "Travel"]},
+    {"start_date": "2024-01-20", "end_date": "2024-03-10"},
+    {"min_amount": 40, "max_amount": 900},
+    {"search": "50%"},
+    {"search": "PAY_"},
+    {"type_": "EXPENSE", "categories": ["Food"], "min_amount": 20},
+]
+
+class RecordingQuery:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def record(*args):
+            self.calls.append((name, *args))
+            return self
+        return record
+
+def test_filters_are_validated_and_normalised():
+    assert transaction_filters("2024-01-05T10:00:00", None, [" Food", "", "Rent", "Food"], " expense ", 5, None,
+                               "  lunch ") == {"start_date": "2024-01-05", "categories": ("Food", "Rent"),
+                                               "type_": "expense", "min_amount": 5.0, "search": "lunch"}
+    for bad in ({"start_date": "05/01/2024"}, {"start_date": "2024-02-01", "end_date": "2024-01-01"},
+                {"min_amount": 10, "max_amount": 5}):
+        with pytest.raises(ValueError):
+            transaction_filters(**bad)
+    assert parse_sort("-amount") == ("amount", True)
+    with pytest.raises(ValueError):
+        parse_sort("category")
+
+def test_like_literal_escapes_wildcards():
+    assert like_literal("50%_off\\") == "50\\%\\_off\\\\"
+
+def test_postgrest_query_for_each_filter():
+    query = filter_transactions(RecordingQuery(), **transaction_filters(
+        "2024-01-01", "2024-01-31", ["Food"], "Exp_nse", 1, 2, "50%"))
+    assert query.calls == [
+        ("gte", "date", "2024-01-01"), ("lte", "date", "2024-01-31"), ("in_", "category", ["Food"]),
+        ("ilike", "type", "Exp\\_nse"), ("gte", "amount", 1.0), ("lte", "amount", 2.0),
+        ("ilike", "description", "%50\\%%"),
+    ]
+
+def expected(rows, filters, sort="date"):
+    column, descending = parse_sort(sort)
+    kept = [r for r in rows if matches(r, **filters)]
+    return [r["id"] for r in sorted(kept, key=lambda r: (r[column], r["id"]), reverse=descending)]
+
+@pytest.mark.parametrize("sort", ["date", "-amount"])
+def test_backends_and_the_in_memory_matcher_agree(sqlite_db, users, stub_db, sort):
+    from src import db
+    (user,) = users(1)
+    rows = sqlite_db.create_transactions([{"user_id": user, **r} for r in ROWS], returning=True).data
+    stub_db.seed("transactions", rows)
+    column, descending = parse_sort(sort)
+    for raw in FILTERS:
+        filters = transaction_filters(**raw)
+        want = expected(rows, filters, sort)
+        assert want, raw        # every case selects something
+        for backend in (sqlite_db, db):
+            page = backend.get_transactions_page.uncached(user, None, None, 100, column, descending, **filters)
+            assert [r["id"] for r in page.data] == want, (backend.__name__, raw)
+
+def test_type_filter_is_not_a_pattern(sqlite_db, users, stub_db):
+    from src import db
+    (user,) = users(1)
+    rows = sqlite_db.create_transactions([{"user_id": user, **r} for r in ROWS], returning=True).data
+    stub_db.seed("transactions", rows)
+    for backend in (sqlite_db, db):
+        page = backend.get_transactions_page.uncached(user, type_="Exp_nse")
+        assert [r["type"] for r in page.data] == ["Exp_nse"]
+        assert len(backend.get_transactions_page.uncached(user, type_="%").data) == 0
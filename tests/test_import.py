@@ -0,0 +1,114 @@
+# tests/test_import.py
+# CSV import: reading an upload chunk by chunk, mapping records onto
+# transaction fields, batched inserts with per-row error reporting, and the
+# owner of every imported row being the caller from the session token.
+import asyncio
+import io
+
+import pytest
+
+from src.importer import read_upload_lines, iter_csv_records, normalize_header, record_to_payload
+
+class Upload:
+    def __init__(self, data):
+        self.file = io.BytesIO(data)
+
+    async def read(self, size):
+        return self.file.read(size)
+
+async def collect(agen):
+    return [item async for item in agen]
+
+def records(data, chunk_size=7):
+    return asyncio.run(collect(iter_csv_records(read_upload_lines(Upload(data), chunk_size))))
+
+def upload(api, headers, text, **params):
+    return api.post("/transactions/import", headers=headers, params=params,
+                    files={"file": ("statement.csv", text.encode(), "text/csv")}).json()
+
+def test_lines_survive_any_chunk_boundary():
+    data = "\ufeffdate,amount\n2024-01-01,1\r\n2024-01-02,2".encode()
+    for chunk_size in (1, 3, 7, 1024):
+        assert records(data, chunk_size) == [(1, ["date", "amount"]), (2, ["2024-01-01", "1"]),
+                                             (3, ["2024-01-02", "2"])]
+
+def test_quoted_fields_may_span_lines_and_blank_lines_are_skipped():
+    data = b'date,description\n\n2024-01-01,"rent,\nMarch"\n2024-01-02,x\n'
+    assert records(data) == [(1, ["date", "description"]), (3, ["2024-01-01", "rent,\nMarch"]),
+                             (5, ["2024-01-02", "x"])]
+
+def test_payload_keeps_only_transaction_fields():
+    header = normalize_header(["Transaction Date", " Kind", "Value", "Memo", "user_id", "id", "category"])
+    assert header == ["date", "type_", "amount", "description", "user_id", "id", "category"]
+    payload = record_to_payload(header, ["2024-01-05", "Expense", " 1,250.00 ", "", "2", "99", "Rent"], 7)
+    assert payload == {"date": "2024-01-05", "type_": "Expense", "amount": "1250.00", "description": None,
+                       "category": "Rent", "user_id": 7}
+
+def import_rows(user, text, batch_size):
+    from api.main import TransactionCreate
+    from src.async_logic import AsyncTransactionService
+    lines = read_upload_lines(Upload(text.encode()))
+    return asyncio.run(AsyncTransactionService().import_transactions(
+        user, lines, lambda payload: TransactionCreate(**payload), batch_size))
+
+def statement(count, bad=()):
+    lines = ["date,category,type,amount"]
+    for i in range(count):
+        amount = "not a number" if i in bad else str(i + 1)
+        lines.append(f"2024-01-{1 + i % 28:02d},Food,Expense,{amount}")
+    return "\n".join(lines) + "\n"
+
+@pytest.mark.parametrize("batch_size,inserts", [(1, [1] * 5), (2, [2, 2, 1]), (500, [5]), (0, [5])])
+def test_rows_are_inserted_in_batches(sqlite_db, users, monkeypatch, batch_size, inserts):
+    from src import async_logic
+    (user,) = users(1)
+    sizes, insert = [], async_logic.db.create_transactions
+
+    async def recording(rows, *args, **kwargs):
+        sizes.append(len(rows))
+        return await insert(rows, *args, **kwargs)
+
+    monkeypatch.setattr(async_logic.db, "create_transactions", recording)
+    result = import_rows(user, statement(5), batch_size)
+    assert result["Data"] == {"imported": 5, "failed": 0, "errors": []}
+    assert sizes == inserts
+    assert sorted(r["amount"] for r in sqlite_db.get_transactions(user).data) == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert {r["currency"] for r in sqlite_db.get_transactions(user).data} == {"USD"}
+
+def test_bad_rows_are_reported_by_line(sqlite_db, users):
+    (user,) = users(1)
+    text = (statement(4, bad={1}).replace("amount\n", "amount,currency\n", 1)
+            + "2024-02-01,Food,Expense,5,EUR\n2024-02-02,Food\n")
+    result = import_rows(user, text, 2)
+    assert result["Message"] == "Imported 3 of 6 rows"
+    errors = result["Data"]["errors"]
+    assert [e["Row"] for e in errors] == [3, 6, 7]
+    assert "amount" in errors[0]["Error"]
+    assert "No exchange rates for EUR" in errors[1]["Error"]
+
+def test_failed_batch_fails_only_its_rows(sqlite_db, users, monkeypatch):
+    from src import async_logic
+    (user,) = users(1)
+    insert = async_logic.db.create_transactions
+
+    async def failing(rows, *args, **kwargs):
+        if any(r["amount"] == 3.0 for r in rows):
+            raise RuntimeError("connection reset")
+        return await insert(rows, *args, **kwargs)
+
+    monkeypatch.setattr(async_logic.db, "create_transactions", failing)
+    result = import_rows(user, statement(6), 2)
+    assert result["Data"]["imported"] == 4
+    assert result["Data"]["errors"] == [{"Row": 4, "Error": "Batch insert failed: connection reset"},
+                                        {"Row": 5, "Error": "Batch insert failed: connection reset"}]
+
+def test_uploaded_user_id_column_is_ignored(api, users, auth, sqlite_db):
+    alice, bob = users(2)
+    result = upload(api, auth(alice), f"user_id,date,category,type,amount\n{bob},2024-01-05,Food,Expense,12.5\n")
+    assert result["Data"]["imported"] == 1
+    assert sqlite_db.get_transactions(bob).data == []
+    assert [r["amount"] for r in sqlite_db.get_transactions(alice).data] == [12.5]
+
+def test_import_needs_a_session(api):
+    response = api.post("/transactions/import", files={"file": ("s.csv", b"date\n", "text/csv")})
+    assert response.status_code == 401
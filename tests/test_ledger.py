@@ -0,0 +1,145 @@
+# tests/test_ledger.py
+# Columnar ledger: category/type encoding, both insert paths, updates and
+# deletes on immutable snapshots, and aggregations checked against the
+# row-by-row summary (services.summarize_transactions).
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from src.ledger import Ledger, LedgerStore, INSERT_SORT_THRESHOLD, UNCATEGORIZED
+from src.services import summarize_transactions
+
+CATEGORIES = ["Food", "Rent", "Travel", None, "Fun"]
+
+def make_rows(count, seed=1, first_id=1):
+    rng = random.Random(seed)
+    return [{"id": first_id + i, "user_id": 1, "category": rng.choice(CATEGORIES),
+             "type": rng.choice(["Expense", "Income", "expense", "transfer", None]),
+             "date": f"2024-{rng.randint(1, 6):02d}-{rng.randint(1, 28):02d}",
+             "amount": round(rng.uniform(1, 300), 2)} for i in range(count)]
+
+def assert_sorted(ledger):
+    keys = list(zip(ledger.days.tolist(), ledger.ids.tolist()))
+    assert keys == sorted(keys)
+
+def test_encoding():
+    ledger = Ledger.from_rows([
+        {"id": 2, "date": "2024-01-02", "category": None, "type": "INCOME", "amount": None},
+        {"id": 1, "date": "2024-01-02T08:00:00", "category": "Food", "type": "Expense", "amount": 4.5},
+        {"id": 3, "date": "2024-01-01", "category": "Food", "type": "refund", "amount": 1.0},
+    ])
+    assert ledger.ids.tolist() == [3, 1, 2]
+    assert ledger.days.astype("datetime64[D]").astype(str).tolist() == ["2024-01-01", "2024-01-02", "2024-01-02"]
+    assert ledger.amounts.tolist() == [1.0, 4.5, 0.0]
+    assert ledger.types.tolist() == [0, 2, 1]
+    assert [ledger.names[c] for c in ledger.categories] == ["Food", "Food", UNCATEGORIZED]
+
+@pytest.mark.parametrize("batch", [3, INSERT_SORT_THRESHOLD + 1])
+def test_inserts_keep_day_id_order(batch):
+    base = Ledger.from_rows(make_rows(200))
+    added = make_rows(batch, seed=2, first_id=1000)
+    ledger = base.with_rows(added)
+    assert len(ledger) == 200 + batch and len(base) == 200     # snapshots are immutable
+    assert_sorted(ledger)
+    expected = Ledger.from_rows(make_rows(200) + added)
+    assert ledger.ids.tolist() == expected.ids.tolist()
+    assert ledger.amounts.tolist() == expected.amounts.tolist()
+
+def test_updates_and_deletes():
+    rows = make_rows(50)
+    ledger = Ledger.from_rows(rows)
+    moved = {**rows[0], "date": "2024-12-31", "amount": 1.0, "category": "New"}
+    updated = ledger.with_updates([moved]).without_ids([rows[1]["id"], 9999])
+    assert len(updated) == 49
+    assert_sorted(updated)
+    assert updated.ids[-1] == rows[0]["id"] and updated.amounts[-1] == 1.0
+    assert rows[1]["id"] not in updated.ids
+    assert ledger.without_ids([]) is ledger
+
+def test_categories_are_shared_by_snapshots():
+    ledger = Ledger.from_rows(make_rows(10))
+    later = ledger.with_rows([{"id": 500, "date": "2024-01-01", "category": "Brand new", "type": "Expense",
+                               "amount": 1.0}])
+    assert later.names is ledger.names
+    assert later.names[later.categories[0]] == "Brand new"
+
+def test_concurrent_snapshots_never_share_a_category_code():
+    ledger = Ledger.from_rows(make_rows(5))
+    barrier = threading.Barrier(8)
+
+    def add(worker):
+        barrier.wait()
+        for i in range(50):
+            ledger.with_rows([{"id": 10_000 + worker * 100 + i, "date": "2024-01-01",
+                               "category": f"c{i}", "type": "Expense", "amount": 1.0}])
+
+    threads = [threading.Thread(target=add, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(ledger.names) == len(set(ledger.names)) == len(ledger.codes)
+    assert all(ledger.names[code] == name for name, code in ledger.codes.items())
+
+@pytest.mark.parametrize("granularity", ["day", "week", "month"])
+@pytest.mark.parametrize("window", [(None, None), ("2024-02-10", "2024-04-30"), ("2024-07-01", None)])
+def test_summary_matches_the_row_by_row_summary(granularity, window):
+    rows = make_rows(400)
+    start, end = window
+    inside = [r for r in rows if (start is None or r["date"] >= start) and (end is None or r["date"] <= end)]
+    expected = summarize_transactions(inside, granularity)
+    actual = Ledger.from_rows(rows).summary(start, end, granularity)
+    assert actual["count"] == expected["count"]
+    for key in ("income", "expense", "net"):
+        assert actual[key] == pytest.approx(expected[key])
+    assert [c["category"] for c in actual["categories"]] == [c["category"] for c in expected["categories"]]
+    assert np.allclose([c["amount"] for c in actual["categories"]], [c["amount"] for c in expected["categories"]])
+    assert [p["period"] for p in actual["periods"]] == [p["period"] for p in expected["periods"]]
+    assert np.allclose([p["net"] for p in actual["periods"]], [p["net"] for p in expected["periods"]])
+
+def test_top_categories_and_running_balance():
+    ledger = Ledger.from_rows([
+        {"id": 1, "date": "2024-01-01", "category": "Salary", "type": "Income", "amount": 100.0},
+        {"id": 2, "date": "2024-01-01", "category": "Food", "type": "Expense", "amount": 10.0},
+        {"id": 3, "date": "2024-01-03", "category": "Rent", "type": "Expense", "amount": 50.0},
+        {"id": 4, "date": "2024-01-04", "category": "Food", "type": "Expense", "amount": 45.0},
+    ])
+    assert ledger.by_category(top=1) == [{"category": "Food", "amount": 55.0}]
+    assert ledger.by_category(kind=1) == [{"category": "Salary", "amount": 100.0}]
+    assert ledger.running_balance() == [{"date": "2024-01-01", "balance": 90.0},
+                                        {"date": "2024-01-03", "balance": 40.0},
+                                        {"date": "2024-01-04", "balance": -5.0}]
+    # the balance carries what came before the window
+    assert ledger.running_balance("2024-01-02") == [{"date": "2024-01-03", "balance": 40.0},
+                                                    {"date": "2024-01-04", "balance": -5.0}]
+    assert ledger.running_balance("2025-01-01") == []
+
+def test_store_skips_a_load_that_raced_a_write():
+    store = LedgerStore(max_users=10, ttl=60)
+    generation = store.generation(1)
+    store.inserted([{"id": 1, "user_id": 1, "date": "2024-01-01", "category": "Food", "type": "Expense",
+                     "amount": 1.0}])
+    store.install(1, Ledger.empty(), generation)
+    assert store.get(1) is None
+    store.install(1, Ledger.empty(), store.generation(1))
+    assert len(store.get(1)) == 0
+
+def test_store_applies_batch_outcomes_to_loaded_ledgers():
+    store = LedgerStore(max_users=10, ttl=60)
+    rows = make_rows(3)
+    store.install(1, Ledger.from_rows(rows), store.generation(1))
+    store.applied({"created": [{**make_rows(1, seed=5, first_id=50)[0]}],
+                   "updated": [{**rows[0], "amount": 0.5}], "deleted": [rows[1]]})
+    ledger = store.get(1)
+    assert sorted(ledger.ids.tolist()) == [rows[0]["id"], rows[2]["id"], 50]
+    assert ledger.amounts[ledger.ids == rows[0]["id"]].tolist() == [0.5]
+
+def test_store_evicts_the_least_recently_used_user():
+    store = LedgerStore(max_users=2, ttl=60)
+    for user in (1, 2):
+        store.install(user, Ledger.empty(), store.generation(user))
+    store.get(1)
+    store.install(3, Ledger.empty(), store.generation(3))
+    assert store.get(2) is None and store.get(1) is not None
@@ -0,0 +1,111 @@
+# tests/test_login.py
+# Login and registration: one lookup by username or email, duplicates rejected
+# by the database's unique constraints (SQLite IntegrityError, PostgREST
+# 23505), and bcrypt running on its own worker pool, off the event loop.
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src import passwords
+from src.services import login_user
+
+def test_username_match_wins_over_an_equal_email():
+    rows = [{"id": 1, "username": "bob@example.com", "email": "x@example.com"},
+            {"id": 2, "username": "alice", "email": "bob@example.com"}]
+    assert login_user(rows, "bob@example.com")["id"] == 1
+    assert login_user(rows[1:], "bob@example.com")["id"] == 2
+
+def test_hash_and_verify():
+    hashed = passwords.hash_password("s3cret")
+    assert hashed.startswith("$2") and hashed != "s3cret"
+    assert passwords.verify_password("s3cret", hashed)
+    assert not passwords.verify_password("wrong", hashed)
+    assert not passwords.verify_password("s3cret", "not a bcrypt hash")
+    assert not passwords.verify_password("s3cret", None)
+
+def test_login_is_one_query(sqlite_db, monkeypatch):
+    from src.logic import ProfileService, db
+    service = ProfileService()
+    assert service.add_profile("alice", "alice@example.com", "pw")["Success"]
+    calls = []
+    for name in ("get_profile", "get_profile_by_username", "get_profile_by_email", "get_profile_by_login"):
+        original = getattr(db, name)
+        monkeypatch.setattr(db, name, lambda *args, _name=name, _fn=original: calls.append(_name) or _fn(*args))
+
+    for login in ("alice", "alice@example.com"):
+        result = service.login(login, "pw")
+        assert result["Success"] and result["Data"]["username"] == "alice"
+        assert "password" not in result["Data"]
+    assert service.login("alice", "nope") == {"Success": False, "Message": "Incorrect password"}
+    assert not service.login("nobody", "pw")["Success"]
+    assert calls == ["get_profile_by_login"] * 4
+
+@pytest.mark.parametrize("username,email", [("alice", "other@example.com"), ("other", "alice@example.com")])
+def test_duplicate_registration_on_sqlite(sqlite_db, username, email):
+    from src.logic import ProfileService
+    from src.async_logic import AsyncProfileService
+    assert ProfileService().add_profile("alice", "alice@example.com", "pw")["Success"]
+    expected = {"Success": False, "Message": "User already exists"}
+    assert ProfileService().add_profile(username, email, "pw") == expected
+    assert asyncio.run(AsyncProfileService().add_profile(username, email, "pw")) == expected
+    assert len(sqlite_db.get_all_profiles().data) == 1
+
+def test_duplicate_registration_on_supabase(stub_db, monkeypatch):
+    from src import db, logic
+    monkeypatch.setattr(logic, "db", db)
+    service = logic.ProfileService()
+    assert service.add_profile("alice", "alice@example.com", "pw")["Success"]
+    assert service.add_profile("alice", "new@example.com", "pw") == {"Success": False,
+                                                                     "Message": "User already exists"}
+    assert service.login("alice@example.com", "pw")["Success"]
+    assert len(stub_db.tables["profiles"]) == 1
+
+def test_register_and_login_over_the_api(api):
+    body = {"username": "alice", "email": "alice@example.com", "password": "pw"}
+    assert api.post("/register", json=body).json()["Success"]
+    assert api.post("/register", json=body).json() == {"Success": False, "Message": "User already exists"}
+    login = api.post("/login", json={"username": "alice", "password": "pw"}).json()
+    assert login["Success"] and login["Token"] and login["ExpiresIn"] > 0
+    assert api.post("/login", json={"username": "alice", "password": "x"}).json()["Success"] is False
+
+def test_bcrypt_runs_on_the_capped_pool_off_the_event_loop(monkeypatch):
+    hashed = passwords.hash_password("pw")
+    running, peak, threads = [0], [0], set()
+    lock = threading.Lock()
+    verify = passwords._verify
+
+    def slow_verify(password, stored):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            threads.add(threading.current_thread().name)
+        time.sleep(0.02)
+        try:
+            return verify(password, stored)
+        finally:
+            with lock:
+                running[0] -= 1
+
+    monkeypatch.setattr(passwords, "_verify", slow_verify)
+
+    async def storm():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(ticker())
+        results = await asyncio.gather(*(passwords.averify_password("pw", hashed) for _ in range(16)))
+        task.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(storm())
+    assert all(results)
+    assert 1 <= peak[0] <= passwords.AUTH_WORKERS
+    assert all(name.startswith("bcrypt") for name in threads)
+    assert ticks > 10       # the loop kept running while the hashes were checked
@@ -0,0 +1,107 @@
+# tests/test_recurring.py
+# Recurring rules: occurrence dates per frequency, the unstored occurrences of
+# a window, virtual ids, and closing a month with a compare-and-set claim so
+# two readers store its occurrences once.
+from datetime import date
+
+import pytest
+
+from src.recurring import (
+    rule_fields, occurrence_date, first_occurrence, occurrences, virtual_id, is_virtual, split_virtual_id,
+    pending_rows, closed_through, close_period, closing_rules, claim, detach_target
+)
+
+def rule(frequency, start, every=1, rule_id=7, **extra):
+    fields = rule_fields(True, category="Rent", type_="Expense", amount=10.0, frequency=frequency, every=every,
+                         start_date=start)
+    return {"id": rule_id, "user_id": 1, **fields, **extra}
+
+def test_monthly_dates_clamp_to_short_months():
+    monthly = rule("monthly", "2024-01-31")
+    assert [occurrence_date(monthly, n) for n in range(4)] == [
+        date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+    assert occurrence_date(monthly, 13) == date(2025, 2, 28)
+    assert occurrence_date(rule("monthly", "2024-11-15", every=3), 1) == date(2025, 2, 15)
+
+def test_daily_and_weekly_steps():
+    assert occurrence_date(rule("daily", "2024-01-30", every=2), 2) == date(2024, 2, 3)
+    assert occurrence_date(rule("weekly", "2024-01-01", every=2), 3) == date(2024, 2, 12)
+
+@pytest.mark.parametrize("frequency,every", [("daily", 3), ("weekly", 2), ("monthly", 1), ("monthly", 5)])
+def test_first_occurrence_is_the_first_on_or_after_the_day(frequency, every):
+    r = rule(frequency, "2024-01-31", every)
+    for day in (date(2023, 12, 1), date(2024, 1, 31), date(2024, 3, 1), date(2024, 6, 30), date(2025, 2, 28)):
+        n = first_occurrence(r, day)
+        assert occurrence_date(r, n) >= day
+        assert n == 0 or occurrence_date(r, n - 1) < day
+
+def test_occurrences_skip_stored_days_exceptions_and_the_end():
+    r = rule("monthly", "2024-01-10", materialized_through="2024-02-10", end_date="2024-06-01")
+    r["exceptions"] = "3"
+    assert list(occurrences(r, date(2024, 1, 1), date(2024, 12, 31))) == [
+        (2, date(2024, 3, 10)), (4, date(2024, 5, 10))]
+    assert list(occurrences(r, date(2024, 3, 11), date(2024, 5, 9))) == []
+
+def test_rule_fields_validate():
+    with pytest.raises(ValueError):
+        rule_fields(True, type_="Expense", amount=1, frequency="yearly", start_date="2024-01-01")
+    with pytest.raises(ValueError):
+        rule_fields(True, type_="Expense", amount=1, frequency="daily", start_date="2024-01-02",
+                    end_date="2024-01-01")
+    with pytest.raises(ValueError):
+        rule_fields(False)
+    assert rule("daily", "2024-01-01")["materialized_through"] == "2023-12-31"
+
+def test_virtual_ids_round_trip():
+    tid = virtual_id(42, 17)
+    assert is_virtual(tid) and not is_virtual(5) and not is_virtual(None)
+    assert split_virtual_id(tid) == (42, 17)
+
+def test_pending_rows_are_capped_at_today_and_ordered():
+    rows = pending_rows([rule("weekly", "2024-03-01", rule_id=2), rule("monthly", "2024-03-01", rule_id=1)],
+                        "2024-03-01", today=date(2024, 3, 15))
+    assert [(r["date"], r["recurring_id"]) for r in rows] == [
+        ("2024-03-01", 2), ("2024-03-01", 1), ("2024-03-08", 2), ("2024-03-15", 2)]
+    assert rows[1]["id"] == virtual_id(1, 0)       # virtual ids are negative
+
+def test_close_period_stores_closed_months_and_keeps_later_exceptions():
+    today = date(2024, 4, 15)
+    assert closed_through(today) == date(2024, 3, 31)
+    r = rule("monthly", "2024-01-05", exceptions="1,4")
+    updates, rows = close_period(r, today)
+    assert updates == {"materialized_through": "2024-03-31", "exceptions": "4"}
+    assert [row["date"] for row in rows] == ["2024-01-05", "2024-03-05"]
+    assert "id" not in rows[0]
+    closed = {**r, **updates}
+    assert close_period(closed, today) is None
+    assert closing_rules([r, closed], today) == [(r, (updates, rows))]
+
+def test_detach_target_only_for_due_unstored_occurrences():
+    r = rule("daily", "2024-01-01", materialized_through="2024-01-31", exceptions="40")
+    assert detach_target([r], virtual_id(7, 35)) == (r, 35, date(2024, 2, 5), {"exceptions": "35,40"})
+    assert detach_target([r], virtual_id(7, 10)) is None       # already stored
+    assert detach_target([r], virtual_id(7, 40)) is None       # already detached
+    assert detach_target([r], virtual_id(8, 35)) is None       # another user's rule
+    assert detach_target([r], virtual_id(7, 10 ** 5)) is None  # not due yet
+
+def test_a_stale_claim_loses_the_compare_and_set(sqlite_db, users):
+    (user,) = users(1)
+    stored = sqlite_db.create_recurring(user, rule_fields(True, type_="Expense", amount=5.0, frequency="monthly",
+                                                          start_date="2024-01-01")).data[0]
+    updates, _ = close_period(stored, date(2024, 3, 1))
+    assert sqlite_db.update_recurring(stored["id"], updates, user, claim(stored)).data
+    # a second reader that read the rule before the first claim
+    assert sqlite_db.update_recurring(stored["id"], updates, user, claim(stored)).data == []
+    assert sqlite_db.get_recurring(user).data[0]["materialized_through"] == "2024-02-29"
+
+def test_closing_a_month_stores_its_occurrences_once(sqlite_db, users):
+    from src.logic import store_occurrences
+    (user,) = users(1)
+    stored = sqlite_db.create_recurring(user, rule_fields(True, type_="Expense", amount=5.0, frequency="monthly",
+                                                          start_date="2024-01-01")).data[0]
+    updates, rows = close_period(stored, date(2024, 3, 1))
+    first = store_occurrences(stored, updates, rows)
+    assert store_occurrences(stored, updates, rows) == []
+    assert [r["date"] for r in first] == ["2024-01-01", "2024-02-01"]
+    assert {r["currency"] for r in first} == {"USD"}
+    assert len(sqlite_db.get_transactions(user).data) == 2
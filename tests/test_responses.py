@@ -0,0 +1,124 @@
+# tests/test_responses.py
+# Conditional reads and compression: a per-user read answers a matching
+# If-None-Match with an empty 304 until one of the user's writes changes the
+# ETag, and larger bodies are brotli- or gzip-encoded as the client accepts.
+import gzip
+import json
+
+import pytest
+
+from src import responses
+from src.responses import _matches, _choose_encoding
+
+CONDITIONAL_ROUTES = ["/transactions", "/recurring", "/summary", "/analytics", "/budgets"]
+
+def seed(sqlite_db, user, count=200):
+    sqlite_db.create_transactions([{"user_id": user, "category": "Food", "type": "Expense",
+                                    "date": f"2024-01-{1 + i % 28:02d}", "amount": float(i),
+                                    "description": f"row {i}"} for i in range(count)])
+
+def test_if_none_match_comparison():
+    tag = 'W/"abc-1"'
+    assert _matches('W/"abc-1"', tag) and _matches('"abc-1"', tag) and _matches('"x", W/"abc-1"', tag)
+    assert _matches("*", tag)
+    assert not _matches(None, tag) and not _matches('W/"abc-2"', tag) and not _matches('"abc"', tag)
+
+@pytest.mark.parametrize("path", CONDITIONAL_ROUTES)
+def test_unchanged_read_is_a_304(api, users, auth, sqlite_db, path):
+    (user,) = users(1)
+    seed(sqlite_db, user, 5)
+    first = api.get(path, headers=auth(user))
+    assert first.status_code == 200 and first.json()["Success"]
+    tag = first.headers["etag"]
+    assert tag.startswith('W/"') and first.headers["cache-control"] == "private, no-cache"
+
+    again = api.get(path, headers={**auth(user), "If-None-Match": tag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == tag
+    assert api.get(path, headers={**auth(user), "If-None-Match": 'W/"stale"'}).status_code == 200
+
+def test_writes_change_the_etag(api, users, auth, sqlite_db):
+    alice, bob = users(2)
+    headers = auth(alice)
+    tag = api.get("/transactions", headers=headers).headers["etag"]
+
+    # another user's writes leave alice's copy current
+    body = {"category": "Food", "type_": "Expense", "date": "2024-01-05", "amount": 10}
+    assert api.post("/transactions", json=body, headers=auth(bob)).json()["Success"]
+    assert api.get("/transactions", headers={**headers, "If-None-Match": tag}).status_code == 304
+
+    writes = [lambda: api.post("/transactions", json=body, headers=headers),
+              lambda: api.put(f"/transactions/{sqlite_db.get_transactions(alice).data[0]['id']}",
+                              json={"amount": 12}, headers=headers),
+              lambda: api.post("/budgets", json={"budget": 500}, headers=headers),
+              lambda: api.post("/recurring", json={"category": "Rent", "type_": "Expense", "amount": 900,
+                                                   "frequency": "monthly", "start_date": "2024-01-01"},
+                               headers=headers),
+              lambda: api.delete(f"/transactions/{sqlite_db.get_transactions(alice).data[0]['id']}",
+                                 headers=headers)]
+    for write in writes:
+        assert write().json()["Success"]
+        response = api.get("/transactions", headers={**headers, "If-None-Match": tag})
+        assert response.status_code == 200 and response.headers["etag"] != tag
+        tag = response.headers["etag"]
+    assert api.get("/budgets", headers={**headers, "If-None-Match": tag}).status_code == 304
+
+def test_failed_reads_carry_no_etag(api, users, auth):
+    (user,) = users(1)
+    response = api.get("/transactions", params={"sort": "password"}, headers=auth(user))
+    assert response.json()["Success"] is False
+    assert "etag" not in response.headers
+
+def test_encoding_negotiation():
+    assert _choose_encoding("gzip, deflate") == "gzip"
+    assert _choose_encoding("GZIP;q=0.5") == "gzip"
+    assert _choose_encoding("gzip;q=0, deflate") is None
+    assert _choose_encoding("identity") is None and _choose_encoding("") is None
+    assert _choose_encoding("br, gzip") == ("br" if responses.brotli is not None else "gzip")
+
+def test_large_bodies_are_gzipped(api, users, auth, sqlite_db):
+    (user,) = users(1)
+    seed(sqlite_db, user)
+    params = {"limit": 200}
+    plain = api.get("/transactions", params=params, headers={**auth(user), "Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+    packed = api.get("/transactions", params=params, headers={**auth(user), "Accept-Encoding": "gzip"})
+    assert packed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in packed.headers["vary"]
+    assert int(packed.headers["content-length"]) < len(plain.content) / 3
+    assert packed.content == plain.content          # decoded by the client
+
+    # small bodies and 304s go out as they are
+    small = api.get("/budgets", headers={**auth(user), "Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    not_modified = api.get("/transactions", params=params, headers={**auth(user), "Accept-Encoding": "gzip",
+                                                                     "If-None-Match": packed.headers["etag"]})
+    assert not_modified.status_code == 304 and "content-encoding" not in not_modified.headers
+
+def test_streamed_bodies_are_gzipped_chunk_by_chunk(api, users, auth, sqlite_db):
+    (user,) = users(1)
+    seed(sqlite_db, user, 3000)
+    with api.stream("GET", "/transactions/stream", headers={**auth(user), "Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    rows = [json.loads(line) for line in gzip.decompress(raw).decode().splitlines()]
+    assert len(rows) == 3000
+
+def test_parquet_exports_are_not_recompressed(api, users, auth, sqlite_db):
+    (user,) = users(1)
+    seed(sqlite_db, user)
+    response = api.get("/transactions/export", params={"format": "parquet"},
+                       headers={**auth(user), "Accept-Encoding": "gzip"})
+    assert response.status_code == 200 and "content-encoding" not in response.headers
+
+def test_brotli_when_installed(api, users, auth, sqlite_db):
+    brotli = pytest.importorskip("brotli")
+    (user,) = users(1)
+    seed(sqlite_db, user)
+    with api.stream("GET", "/transactions", params={"limit": 200},
+                    headers={**auth(user), "Accept-Encoding": "br, gzip"}) as response:
+        assert response.headers["content-encoding"] == "br"
+        body = brotli.decompress(b"".join(response.iter_raw()))
+    assert len(json.loads(body)["Data"]) == 200
@@ -0,0 +1,100 @@
+# tests/test_rollups.py
+# Monthly transaction rollups: the signed deltas used by the supabase path and
+# the SQLite triggers that keep transaction_rollups equal to a GROUP BY of
+# transactions through every write, in the same transaction as the write.
+import pytest
+
+from src.db import rollup_key, rollup_deltas
+
+GROUP_BY = ("SELECT user_id, substr(date, 1, 7) AS month, coalesce(category, '') AS category, "
+            "coalesce(type, '') AS type, coalesce(currency, '') AS currency, round(sum(amount), 6) AS total, "
+            "count(*) AS count FROM transactions GROUP BY 1, 2, 3, 4, 5 ORDER BY 1, 2, 3, 4, 5")
+ROLLUPS = ("SELECT user_id, month, category, type, currency, round(total, 6) AS total, count "
+           "FROM transaction_rollups ORDER BY 1, 2, 3, 4, 5")
+
+def rollups(db):
+    return db._query(ROLLUPS).data
+
+def assert_consistent(db):
+    assert rollups(db) == db._query(GROUP_BY).data
+
+def test_rollup_key_blanks_missing_columns():
+    row = {"user_id": 1, "date": "2024-03-05T10:00:00", "category": None, "type": "Expense", "amount": 5.0}
+    assert rollup_key(row) == (1, "2024-03", "", "Expense", "")
+
+def test_rollup_deltas_are_signed_and_grouped():
+    rows = [
+        {"user_id": 1, "date": "2024-03-05", "category": "Food", "type": "Expense", "amount": 5.0},
+        {"user_id": 1, "date": "2024-03-20", "category": "Food", "type": "Expense", "amount": 2.5},
+        {"user_id": 1, "date": "2024-03-20", "category": "Food", "type": "Expense", "amount": None,
+         "currency": "EUR"},
+    ]
+    assert rollup_deltas(rows, 1) == {
+        (1, "2024-03", "Food", "Expense", ""): [7.5, 2],
+        (1, "2024-03", "Food", "Expense", "EUR"): [0.0, 1],
+    }
+    assert rollup_deltas(rows[:1], -1) == {(1, "2024-03", "Food", "Expense", ""): [-5.0, -1]}
+    assert rollup_deltas(None, 1) == {}
+
+def test_triggers_follow_inserts_updates_and_deletes(sqlite_db, users):
+    first, second = users(2)
+    a = sqlite_db.create_transaction(first, "Food", "Expense", "2024-01-05", 10.0).data[0]["id"]
+    sqlite_db.create_transaction(first, "Food", "Expense", "2024-01-20", 5.0)
+    sqlite_db.create_transactions([
+        {"user_id": second, "category": None, "type": "Income", "date": "2024-02-01", "amount": 100.0},
+        {"user_id": second, "category": "Rent", "type": "Expense", "date": "2024-02-03", "amount": 40.0,
+         "currency": "EUR"},
+    ])
+    assert_consistent(sqlite_db)
+    assert {"user_id": first, "month": "2024-01", "category": "Food", "type": "Expense", "currency": "",
+            "total": 15.0, "count": 2} in rollups(sqlite_db)
+
+    # moving a row to another month leaves the old bucket with the remaining row
+    sqlite_db.update_transaction(a, {"date": "2024-03-01", "amount": 7.0})
+    assert_consistent(sqlite_db)
+    sqlite_db.update_transaction(a, {"currency": "GBP"})
+    assert_consistent(sqlite_db)
+    # a change to a column outside the bucket key leaves the rollups alone
+    sqlite_db.update_transaction(a, {"description": "lunch"})
+    assert_consistent(sqlite_db)
+
+    # the last row of a bucket removes the bucket
+    sqlite_db.delete_transaction(a)
+    assert_consistent(sqlite_db)
+    assert not [r for r in rollups(sqlite_db) if r["month"] == "2024-03"]
+
+def test_batch_and_its_rollups_commit_together(sqlite_db, users):
+    (user,) = users(1)
+    ids = [r["id"] for r in sqlite_db.create_transactions([
+        {"user_id": user, "category": "Food", "type": "Expense", "date": f"2024-04-0{day}", "amount": float(day)}
+        for day in range(1, 6)], returning=True).data]
+    sqlite_db.apply_transaction_batch(user, creates=[{"category": "Fun", "type": "Expense", "date": "2024-05-01",
+                                                      "amount": 3.0}],
+                                      updates=[({"amount": 1.0}, ids[:2])], deletes=ids[2:4])
+    assert_consistent(sqlite_db)
+    before = rollups(sqlite_db)
+
+    # an update naming an unknown column fails the batch after its create ran
+    with pytest.raises(ValueError):
+        sqlite_db.apply_transaction_batch(user, creates=[{"category": "Fun", "type": "Expense",
+                                                          "date": "2024-05-02", "amount": 9.0}],
+                                          updates=[({"bogus": 1}, ids[4:])])
+    assert rollups(sqlite_db) == before
+    assert_consistent(sqlite_db)
+
+def test_get_rollups_filters_by_month(sqlite_db, users):
+    (user,) = users(1)
+    for month in ("01", "02", "03"):
+        sqlite_db.create_transaction(user, "Food", "Expense", f"2024-{month}-10", 1.0)
+    months = [r["month"] for r in sqlite_db.get_rollups(user, "2024-02", "2024-03").data]
+    assert months == ["2024-02", "2024-03"]
+
+def test_empty_rollup_table_is_backfilled(sqlite_db, users):
+    (user,) = users(1)
+    sqlite_db.create_transaction(user, "Food", "Expense", "2024-01-05", 10.0)
+    sqlite_db.create_transaction(user, None, "Income", "2024-02-01", 50.0, currency="EUR")
+    conn = sqlite_db.get_connection()
+    conn.execute("DELETE FROM transaction_rollups")
+    conn.executescript(sqlite_db.ROLLUP_SCHEMA)
+    assert len(rollups(sqlite_db)) == 2
+    assert_consistent(sqlite_db)
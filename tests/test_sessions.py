@@ -0,0 +1,84 @@
+# tests/test_sessions.py
+# Session tokens and the API's use of them: every per-user route takes the
+# user from the token alone, rejects a missing, forged or expired one with
+# 401, and never reaches another user's profile or rows.
+import base64
+import json
+
+import pytest
+
+from src import sessions
+from src.sessions import issue_token, verify_token
+
+def forge(token, **claims):
+    payload, signature = token.split(".")
+    data = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    data.update(claims)
+    forged = base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+    return f"{forged}.{signature}"
+
+def test_token_round_trip():
+    token = issue_token(42)
+    assert verify_token(token) == 42
+    assert verify_token(token) == 42        # served from the verified-token cache
+
+@pytest.mark.parametrize("token", [None, "", "garbage", "a.b.c", "bm90.anNvbg"])
+def test_malformed_tokens_are_rejected(token):
+    assert verify_token(token) is None
+
+def test_tampered_tokens_are_rejected():
+    token = issue_token(1)
+    assert verify_token(forge(token, uid=2)) is None
+    assert verify_token(forge(token, exp=2 ** 40)) is None
+    payload, signature = token.split(".")
+    assert verify_token(f"{payload}.{signature[:-2]}AA") is None
+
+def test_token_signed_with_another_secret_is_rejected(monkeypatch):
+    token = issue_token(1)
+    monkeypatch.setattr(sessions, "SESSION_SECRET", b"another secret")
+    assert verify_token(issue_token(1)) == 1
+    monkeypatch.setattr(sessions, "_verified", sessions.LRUCache())
+    assert verify_token(token) is None
+
+def test_expired_tokens_are_rejected(monkeypatch):
+    assert verify_token(issue_token(1, ttl=-1)) is None
+    token = issue_token(1, ttl=60)
+    assert verify_token(token) == 1
+    # a token remembered as valid still expires on time
+    now = sessions.time.time()
+    monkeypatch.setattr(sessions.time, "time", lambda: now + 61)
+    assert verify_token(token) is None
+
+ROUTES = [("get", "/profiles"), ("get", "/profiles/1"), ("get", "/transactions"), ("get", "/summary"),
+          ("get", "/budgets"), ("get", "/currency"), ("get", "/transactions/export"),
+          ("delete", "/transactions/1"), ("post", "/transactions/batch")]
+
+@pytest.mark.parametrize("method,path", ROUTES)
+def test_routes_need_a_valid_session(api, method, path):
+    for headers in ({}, {"Authorization": "Bearer nope"}, {"Authorization": f"Basic {issue_token(1)}"},
+                    {"Authorization": f"Bearer {issue_token(1, ttl=-1)}"}):
+        response = api.request(method.upper(), path, headers=headers)
+        assert response.status_code == 401, (path, headers)
+        assert response.headers["www-authenticate"] == "Bearer"
+
+def test_profile_routes_are_limited_to_the_caller(api, users, auth, sqlite_db):
+    alice, bob = users(2)
+    assert api.get(f"/profiles/{alice}", headers=auth(alice)).json()["Data"]["id"] == alice
+    assert [p["id"] for p in api.get("/profiles", headers=auth(alice)).json()["Data"]] == [alice]
+    for method in ("GET", "DELETE"):
+        assert api.request(method, f"/profiles/{bob}", headers=auth(alice)).status_code == 403
+    assert api.put(f"/profiles/{bob}", json={"username": "mallory"}, headers=auth(alice)).status_code == 403
+    assert sqlite_db.get_profile(bob).data["username"] == "user1"
+
+def test_transactions_of_another_user_are_not_found(api, users, auth, sqlite_db):
+    alice, bob = users(2)
+    body = {"category": "Food", "type_": "Expense", "date": "2024-01-05", "amount": 10, "user_id": bob}
+    assert api.post("/transactions", json=body, headers=auth(alice)).json()["Success"]
+    assert sqlite_db.get_transactions(bob).data == []       # the body's user_id is ignored
+    (mine,) = sqlite_db.get_transactions(alice).data
+
+    assert api.get("/transactions", headers=auth(bob)).json()["Data"] == []
+    not_found = {"Success": False, "Message": "Transaction not found"}
+    assert api.put(f"/transactions/{mine['id']}", json={"amount": 1}, headers=auth(bob)).json() == not_found
+    assert api.delete(f"/transactions/{mine['id']}", headers=auth(bob)).json() == not_found
+    assert sqlite_db.get_transactions(alice).data == [mine]
@@ -0,0 +1,100 @@
+# tests/test_write_queue.py
+# Write-coalescing insert queue: each caller gets its own inserted row, a
+# failed batch is retried row by row so only the bad rows fail, and drain()
+# writes whatever is still queued before shutdown.
+import asyncio
+
+from src.write_queue import InsertQueue
+
+class Table:
+    def __init__(self, bad=()):
+        self.rows, self.batches, self.bad = [], [], set(bad)
+
+    def _insert(self, row):
+        if row["amount"] in self.bad:
+            raise ValueError(f"bad amount {row['amount']}")
+        stored = {**row, "id": len(self.rows) + 1}
+        self.rows.append(stored)
+        return stored
+
+    async def insert_many(self, rows):
+        await asyncio.sleep(0)
+        if any(r["amount"] in self.bad for r in rows):
+            raise ValueError("batch failed")
+        self.batches.append(len(rows))
+        return [self._insert(r) for r in rows]
+
+    async def insert_one(self, row):
+        await asyncio.sleep(0)
+        self.batches.append(1)
+        return self._insert(row)
+
+def submit_all(queue, amounts):
+    async def run():
+        return await asyncio.gather(*(queue.submit({"amount": a}) for a in amounts), return_exceptions=True)
+    return asyncio.run(run())
+
+def test_each_caller_gets_its_own_row():
+    table = Table()
+    queue = InsertQueue(table.insert_many, table.insert_one, max_batch=4, max_wait_ms=50)
+    results = submit_all(queue, range(10))
+    assert [r["amount"] for r in results] == list(range(10))
+    assert len({r["id"] for r in results}) == 10
+    assert table.batches == [4, 4, 2]       # two full batches, then the timer flushes the rest
+    assert queue.stats() == {"pending": 0, "in_flight": 0, "batches": 3, "rows": 10, "retried_rows": 0}
+
+def test_failed_batch_fails_only_the_bad_rows():
+    table = Table(bad={2, 5})
+    queue = InsertQueue(table.insert_many, table.insert_one, max_batch=4, max_wait_ms=50)
+    results = submit_all(queue, range(8))
+    failed = [i for i, r in enumerate(results) if isinstance(r, Exception)]
+    assert failed == [2, 5]
+    assert str(results[2]) == "bad amount 2"
+    assert sorted(r["amount"] for r in table.rows) == [0, 1, 3, 4, 6, 7]
+    assert queue.stats()["retried_rows"] == 8
+
+def test_short_batch_result_fails_the_unmatched_callers():
+    async def insert_many(rows):
+        return [{**r, "id": 1} for r in rows[:1]]
+
+    queue = InsertQueue(insert_many, None, max_batch=2, max_wait_ms=50)
+    first, second = submit_all(queue, [1, 2])
+    assert first["id"] == 1
+    assert isinstance(second, RuntimeError)
+
+def test_drain_writes_queued_rows_before_shutdown():
+    table = Table()
+    queue = InsertQueue(table.insert_many, table.insert_one, max_batch=100, max_wait_ms=60_000)
+
+    async def run():
+        callers = [asyncio.create_task(queue.submit({"amount": a})) for a in range(5)]
+        await asyncio.sleep(0)
+        assert queue.stats()["pending"] == 5      # the timer would not fire for a minute
+        await queue.drain()
+        assert all(task.done() for task in callers)
+        return [task.result()["amount"] for task in callers]
+
+    assert asyncio.run(run()) == list(range(5))
+    assert table.batches == [5]
+
+def test_concurrent_api_inserts_are_coalesced(users, auth, sqlite_db, monkeypatch):
+    from src import async_logic
+    queue = InsertQueue(async_logic._insert_rows, async_logic._insert_row, max_batch=50, max_wait_ms=20)
+    monkeypatch.setattr(async_logic, "WRITE_QUEUE_ENABLED", True)
+    monkeypatch.setattr(async_logic, "insert_queue", queue)
+    (user,) = users(1)
+
+    async def post_all():
+        import httpx
+        from api.main import app
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/transactions", headers=auth(user), json={
+                "category": "Food", "type_": "Expense", "date": "2024-01-05", "amount": i}) for i in range(20)))
+
+    responses = asyncio.run(post_all())
+    assert all(r.json()["Success"] for r in responses)
+    assert queue.stats()["batches"] < 20
+    rows = sqlite_db.get_transactions(user).data
+    assert sorted(r["amount"] for r in rows) == [float(i) for i in range(20)]
+    assert {r["currency"] for r in rows} == {"USD"}